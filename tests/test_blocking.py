@@ -0,0 +1,94 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Pockets and channels of the NumPy pocket blocking.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import math
+
+import numpy as np
+import pytest
+
+from water_isotherm_workchains.blocking import label_components, find_channels, block_pockets, \
+    block_file_content
+
+LENGTH = 20.0
+SHELL_RADIUS = 5.0
+
+
+def shell_cif(number_atoms=400):
+    """Closed spherical shell of carbon atoms in the middle of an otherwise empty cubic cell."""
+    lines = [
+        'data_shell',
+        '_cell_length_a {}'.format(LENGTH),
+        '_cell_length_b {}'.format(LENGTH),
+        '_cell_length_c {}'.format(LENGTH),
+        '_cell_angle_alpha 90',
+        '_cell_angle_beta 90',
+        '_cell_angle_gamma 90',
+        'loop_',
+        '_atom_site_label',
+        '_atom_site_type_symbol',
+        '_atom_site_fract_x',
+        '_atom_site_fract_y',
+        '_atom_site_fract_z',
+    ]
+    golden_angle = math.pi * (3 - math.sqrt(5))
+    for i in range(number_atoms):
+        z = 1 - 2 * (i + 0.5) / number_atoms
+        r = math.sqrt(1 - z * z)
+        phi = golden_angle * i
+        position = np.array([r * math.cos(phi), r * math.sin(phi), z])
+        fract = 0.5 + SHELL_RADIUS * position / LENGTH
+        lines.append('C{} C {:.6f} {:.6f} {:.6f}'.format(i, *fract))
+    return '\n'.join(lines) + '\n'
+
+
+@pytest.fixture
+def shell(tmpdir):
+    cif_path = str(tmpdir.join('shell.cif'))
+    with open(cif_path, 'w') as fh:
+        fh.write(shell_cif())
+    radii_path = str(tmpdir.join('radii.rad'))
+    with open(radii_path, 'w') as fh:
+        fh.write('C 1.7\n')
+    return cif_path, radii_path
+
+
+def test_channel_and_pocket_labels():
+    mask = np.zeros((8, 8, 8), dtype=bool)
+    # channel along a, through the periodic boundary
+    mask[:, 1, 1] = True
+    # closed cavity
+    mask[4:6, 4:6, 4:6] = True
+    labels = label_components(mask)
+    assert len(set(labels[mask])) == 2
+    channels = find_channels(labels)
+    assert channels == set([labels[0, 1, 1]])
+    assert labels[4, 4, 4] not in channels
+
+
+def test_wrapping_blob_is_not_a_channel():
+    mask = np.zeros((8, 8, 8), dtype=bool)
+    # a pocket cut by the cell boundary is one component across the faces, not a channel
+    mask[7, 3, 3] = mask[0, 3, 3] = True
+    assert find_channels(label_components(mask)) == set()
+
+
+def test_closed_cavity_is_blocked(shell):
+    cif_path, radii_path = shell
+    spheres = block_pockets(cif_path, radii_path, 1.3, spacing=0.5)
+    assert spheres
+    for x, y, z, radius in spheres:
+        center = np.array([x, y, z]) - 0.5
+        # inside the shell and not reaching the channel outside of it
+        assert np.linalg.norm(center * LENGTH) + radius < SHELL_RADIUS + 1.0
+    assert block_file_content(spheres).splitlines()[0] == str(len(spheres))
@@ -0,0 +1,51 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Detection of the equilibrated part of a loading series.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import random
+
+import pytest
+
+from water_isotherm_workchains.equilibration import statistical_inefficiency, detect_equilibration, \
+    is_equilibrated
+
+
+def noise(n, seed=0):
+    rng = random.Random(seed)
+    return [10.0 + rng.gauss(0.0, 0.1) for _ in range(n)]
+
+
+def test_uncorrelated_series():
+    assert statistical_inefficiency(noise(200)) == pytest.approx(1.0,
+                                                                 abs=0.5)
+    assert statistical_inefficiency([1.0, 1.0, 1.0]) == 1.0
+    assert statistical_inefficiency([1.0]) == 1.0
+
+
+def test_correlated_series():
+    # every value repeated five times
+    series = [x for x in noise(40) for _ in range(5)]
+    assert statistical_inefficiency(series) > 3.0
+
+
+def test_drift_is_discarded():
+    drift = [float(i) for i in range(10)]
+    t0, _, _ = detect_equilibration(drift + noise(40))
+    assert 8 <= t0 <= 12
+
+
+def test_is_equilibrated():
+    assert is_equilibrated(noise(20), 10) == (True, pytest.approx(0, abs=3))
+    # the stationary part is too short
+    assert is_equilibrated([float(i) for i in range(20)] + noise(5), 10)[0] is False
+    assert is_equilibrated(noise(5), 10) == (False, None)
@@ -0,0 +1,64 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Order of adoption and cache lookup for the first GCMC of a restarted workchain.
+"""
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+from water_isotherm_workchains.first_gcmc_cache import reuse_first_gcmc
+
+
+class Restart(object):
+    """Adoptable steps of a failed workchain, adopted in order like the workchains do."""
+
+    def __init__(self, adoptable, cache):
+        self.adoptable = list(adoptable)
+        self.cache = cache
+        self.cache_lookups = 0
+
+    def adopt(self, label):
+        if not self.adoptable:
+            return None
+        adopted_label, pk = self.adoptable[0]
+        if adopted_label != label:
+            self.adoptable = []
+            return None
+        self.adoptable = self.adoptable[1:]
+        return pk
+
+    def find_cached(self):
+        self.cache_lookups += 1
+        return self.cache
+
+
+def test_adoption_before_cache_hit():
+    # the cache finds the first GCMC of the failed workchain itself
+    restart = Restart([('run_first_loading_raspa', 10),
+                       ('run_loading_raspa', 11), ('run_loading_raspa', 12)],
+                      cache=10)
+    source, reused = reuse_first_gcmc(
+        lambda: restart.adopt('run_first_loading_raspa'), restart.find_cached)
+    assert (source, reused) == ('adopted', 10)
+    assert restart.cache_lookups == 0
+    # the finished segments are still adopted
+    assert restart.adopt('run_loading_raspa') == 11
+    assert restart.adopt('run_loading_raspa') == 12
+
+
+def test_cache_hit_without_adoptable_steps():
+    restart = Restart([], cache=10)
+    assert reuse_first_gcmc(
+        lambda: restart.adopt('run_first_loading_raspa'),
+        restart.find_cached) == ('cached', 10)
+
+
+def test_nothing_to_reuse():
+    restart = Restart([], cache=None)
+    assert reuse_first_gcmc(
+        lambda: restart.adopt('run_first_loading_raspa'),
+        restart.find_cached) == (None, None)
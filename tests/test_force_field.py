@@ -0,0 +1,140 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Reading and checking of the RASPA force field definitions.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import pytest
+
+from water_isotherm_workchains.force_field import read_mixing_rules, lennard_jones, pseudo_atom_name, \
+    check_force_field, parse_cached
+
+MIXING_RULES = """# general rule for shifted vs truncated
+shifted
+# general rule tailcorrections
+no
+# number of defined interactions
+4
+# type interaction, parameters
+O_     lennard-jones  50.0  3.0
+O_w    lennard-jones  90.0  3.1
+Ow     none
+Zr_    lennard-jones  34.7  2.78
+# general mixing rule for Lennard-Jones
+Lorentz-Berthelot
+"""
+
+PSEUDO_ATOMS = """#number of pseudo atoms
+3
+#type print as chem oxidation mass charge polarization B-factor radii connectivity anisotropic anisotropic-type tinker-type
+Ow   yes  O  O  0  15.9994  0.0     0.0  1.0  1.0  0  0  relative  0
+Hw   yes  H  H  0  1.008    0.5564  0.0  1.0  1.0  0  0  relative  0
+Lw   yes  L  -  0  0.0     -1.1128  0.0  1.0  1.0  0  0  relative  0
+"""
+
+MOLECULE = """# critical constants: Temperature [T], Pressure [Pa], and Acentric factor [-]
+647.096
+22064000.0
+0.3443
+#Number Of Atoms
+4
+# Number of groups
+1
+# tip4p-group
+rigid
+# number of atoms
+4
+# atomic positions
+0 Ow 0.0 0.0 0.0
+1 Hw 0.75695 0.58588 0.0
+2 Hw -0.75695 0.58588 0.0
+3 Lw 0.0 0.1546 0.0
+"""
+
+CIF = """data_x
+_cell_length_a 10
+_cell_length_b 10
+_cell_length_c 10
+_cell_angle_alpha 90
+_cell_angle_beta 90
+_cell_angle_gamma 90
+loop_
+_atom_site_label
+_atom_site_type_symbol
+_atom_site_fract_x
+_atom_site_fract_y
+_atom_site_fract_z
+Zr1 Zr 0.0 0.0 0.0
+O12 O 0.5 0.5 0.5
+Cu3 Cu 0.2 0.2 0.2
+"""
+
+
+def write(path, content):
+    with open(path, 'w') as fh:
+        fh.write(content)
+    return path
+
+
+@pytest.fixture
+def force_field_dir(tmpdir):
+    write(str(tmpdir.join('force_field_mixing_rules.def')), MIXING_RULES)
+    write(str(tmpdir.join('pseudo_atoms.def')), PSEUDO_ATOMS)
+    return str(tmpdir)
+
+
+def test_wildcard_precedence(force_field_dir):
+    mixing_rules = read_mixing_rules(force_field_dir)
+    assert mixing_rules['shifted'] and not mixing_rules['tail_corrections']
+    # the later, more specific match overrides the wildcard
+    assert lennard_jones(mixing_rules, 'O_w') == (90.0, 3.1)
+    assert lennard_jones(mixing_rules, 'O_w1') == (50.0, 3.0)
+    assert lennard_jones(mixing_rules, 'O') == (50.0, 3.0)
+    assert lennard_jones(mixing_rules, 'Ox') == (50.0, 3.0)
+    # an exact name without wildcard
+    assert lennard_jones(mixing_rules, 'Ow') == (0.0, 0.0)
+    assert lennard_jones(mixing_rules, 'Cu') is None
+
+
+def test_pseudo_atom_name():
+    assert pseudo_atom_name('Zr12') == 'Zr'
+    assert pseudo_atom_name('O_w') == 'O_w'
+
+
+def test_check_force_field(force_field_dir, tmpdir):
+    cif_path = write(str(tmpdir.join('framework.cif')), CIF)
+    molecule_path = write(str(tmpdir.join('tip4p.def')), MOLECULE)
+    problems = check_force_field(force_field_dir, [cif_path], [molecule_path])
+    assert problems == [
+        'framework.cif: no interactions for Cu',
+        'tip4p.def: no interactions for Hw, Lw',
+    ]
+
+    charged = write(str(tmpdir.join('charged.def')),
+                    MOLECULE.replace('3 Lw', '3 Hw'))
+    problems = check_force_field(force_field_dir, [], [charged])
+    assert 'charged.def: net charge 1.6692 e' in problems
+
+
+def test_parse_cached_by_content(tmpdir):
+    calls = []
+
+    def parser(path):
+        calls.append(path)
+        return len(calls)
+
+    first = write(str(tmpdir.join('a.def')), 'same')
+    second = write(str(tmpdir.join('b.def')), 'same')
+    assert parse_cached(first, parser) == parse_cached(second, parser)
+    assert len(calls) == 1
+    write(first, 'changed')
+    parse_cached(first, parser)
+    assert len(calls) == 2
@@ -0,0 +1,55 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Reconstruction of the hybrid MC/MD segments from a synthetic RASPA output.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import pytest
+
+from water_isotherm_workchains.hybrid import parse_segment_loading
+
+
+def raspa_output(segment_loading, segment_cycles):
+    """Periodic output of a run with the given segment averages, printed every segment_cycles cycles
+    except after the last cycle (as RASPA does)."""
+    number_cycles = segment_cycles * len(segment_loading)
+    lines = []
+    total = 0.0
+    for i, loading in enumerate(segment_loading):
+        cycle = i * segment_cycles
+        average = total / cycle if cycle else 0.0
+        lines += [
+            'Current cycle: {} out of {}'.format(cycle, number_cycles),
+            '========================================',
+            'Component 0 (water)',
+            '\tabsolute adsorption:  {:.5f} (avg. {:.5f}) [mol/uc],'
+            ' 0.0000000000 (avg. 0.0000000000) [mol/kg]'.format(
+                loading, average),
+            'Component 1 (methane)',
+            '\tabsolute adsorption:  0.00000 (avg. 99.00000) [mol/uc],'
+            ' 0.0000000000 (avg. 0.0000000000) [mol/kg]',
+        ]
+        total += loading * segment_cycles
+    return '\n'.join(lines) + '\n', total / number_cycles
+
+
+def test_all_segments():
+    segment_loading = [4.0, 6.0, 5.0, 11.0]
+    output, final_average = raspa_output(segment_loading, 100)
+    segments = parse_segment_loading(output, 100, len(segment_loading),
+                                     final_average)
+    assert segments == pytest.approx(segment_loading)
+
+
+def test_single_segment():
+    output, final_average = raspa_output([3.0], 50)
+    assert parse_segment_loading(output, 50, 1,
+                                 final_average) == pytest.approx([3.0])
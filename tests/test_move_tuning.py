@@ -0,0 +1,81 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Tuning of the MC move probabilities from acceptance and CPU time.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import pytest
+
+from water_isotherm_workchains.move_tuning import get_moves, extract_acceptance, parse_move_timings, \
+    tune_move_probabilities
+
+OUTPUT = """
+Current cycle: 1000 out of 1000
+Translation move total:          12.5 [s]
+Swap move total:                 40.0 [s]
+"""
+
+
+def test_both_swap_moves_are_kept():
+    component = {
+        'TranslationProbability': 1.0,
+        'SwapProbability': 1.0,
+        'CFCMC_CBMC_SwapProbability': 0.5,
+        'RotationProbability': 0.0,
+    }
+    moves = get_moves(component)
+    assert [key for _, key in moves] == [
+        'TranslationProbability', 'SwapProbability',
+        'CFCMC_CBMC_SwapProbability'
+    ]
+    timings = parse_move_timings(OUTPUT, moves)
+    assert timings == {
+        'TranslationProbability': 12.5,
+        'SwapProbability': 40.0,
+        'CFCMC_CBMC_SwapProbability': 40.0,
+    }
+
+
+def test_acceptance_in_percent():
+    statistics = {'Translation': {'acceptance': 0.8}, 'Swap': {'acceptance': 40}}
+    # no guessing from the magnitude: 0.8 % stays 0.008
+    assert extract_acceptance(statistics, 'Translation') == pytest.approx(0.008)
+    assert extract_acceptance(statistics, 'Swap') == pytest.approx(0.4)
+    assert extract_acceptance(statistics, 'Rotation') is None
+
+
+def test_tuning_keeps_the_total():
+    probabilities = {'a': 1.0, 'b': 1.0, 'c': 2.0}
+    acceptance = {'a': 0.5, 'b': 0.01}
+    timings = {'a': 1.0, 'b': 1.0}
+    tuned = tune_move_probabilities(probabilities, acceptance, timings)
+    assert sum(tuned.values()) == pytest.approx(4.0)
+    # the move with the higher acceptance at the same cost gains
+    assert tuned['a'] > tuned['b']
+    # the move without statistics keeps about its share
+    assert tuned['c'] == pytest.approx(2.0, rel=0.2)
+
+
+def test_floor():
+    probabilities = {'a': 1.0, 'b': 1.0}
+    acceptance = {'a': 1.0, 'b': 0.0}
+    timings = {'a': 1.0, 'b': 1000.0}
+    tuned = tune_move_probabilities(probabilities,
+                                    acceptance,
+                                    timings,
+                                    damping=0.0,
+                                    floor=0.1)
+    assert tuned['b'] / sum(tuned.values()) >= 0.09
+
+
+def test_nothing_known():
+    probabilities = {'a': 1.0, 'b': 3.0}
+    assert tune_move_probabilities(probabilities, {}, {}) == probabilities
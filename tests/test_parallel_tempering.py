@@ -0,0 +1,79 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Swap acceptance, pair selection and exchange of configurations of the parallel tempering.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import random
+
+import pytest
+
+from water_isotherm_workchains.parallel_tempering import swap_acceptance, attempt_swaps, \
+    apply_swaps
+
+
+class FixedRandom(object):
+    """random.Random stand-in returning a fixed number."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def random(self):
+        return self.value
+
+
+def test_acceptance_limits():
+    # moving the larger configuration to the higher pressure is always accepted
+    assert swap_acceptance(100.0, 200.0, 10, 5) == 1.0
+    assert swap_acceptance(100.0, 200.0, 5, 10) == pytest.approx(0.5**5)
+    # identical loadings or pressures always swap
+    assert swap_acceptance(100.0, 200.0, 7, 7) == 1.0
+    assert swap_acceptance(100.0, 100.0, 3, 9) == 1.0
+
+
+def test_acceptance_symmetry():
+    for pressure_i, pressure_j, molecules_i, molecules_j in [
+        (100.0, 300.0, 4, 9), (1000.0, 50.0, 2, 1), (10.0, 20.0, 30, 0)
+    ]:
+        forward = swap_acceptance(pressure_i, pressure_j, molecules_i,
+                                  molecules_j)
+        # the same swap seen from the other replica
+        assert swap_acceptance(pressure_j, pressure_i, molecules_j,
+                               molecules_i) == pytest.approx(forward)
+        # detailed balance with the swap back
+        backward = swap_acceptance(pressure_i, pressure_j, molecules_j,
+                                   molecules_i)
+        assert forward / backward == pytest.approx(
+            (pressure_i / pressure_j)**(molecules_j - molecules_i))
+
+
+def test_alternating_pairs():
+    pressures = [10.0, 20.0, 40.0, 80.0, 160.0]
+    molecules = [1, 2, 3, 4, 5]
+    even = attempt_swaps(pressures, molecules, 0, random.Random(0))
+    odd = attempt_swaps(pressures, molecules, 1, random.Random(0))
+    assert [(i, j) for i, j, _, _ in even] == [(0, 1), (2, 3)]
+    assert [(i, j) for i, j, _, _ in odd] == [(1, 2), (3, 4)]
+
+
+def test_accepted_with_probability():
+    attempts = attempt_swaps([100.0, 200.0], [5, 10], 0, FixedRandom(0.0))
+    assert attempts == [(0, 1, pytest.approx(0.5**5), True)]
+    attempts = attempt_swaps([100.0, 200.0], [5, 10], 0, FixedRandom(0.99))
+    assert attempts[0][3] is False
+
+
+def test_apply_swaps():
+    folders = ['a', 'b', 'c', 'd']
+    attempts = [(0, 1, 1.0, True), (2, 3, 0.1, False)]
+    assert apply_swaps(folders, attempts) == ['b', 'a', 'c', 'd']
+    # the input is not modified
+    assert folders == ['a', 'b', 'c', 'd']
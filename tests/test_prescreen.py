@@ -0,0 +1,39 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Selection of the frameworks with the largest prescreen uptake.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+from water_isotherm_workchains.prescreen import select_top, uptake_from_results
+
+
+def test_largest_first():
+    uptakes = {'a': 1.0, 'b': 3.0, 'c': 2.0, 'd': 0.5}
+    assert select_top(uptakes, 0.5) == ['b', 'c']
+    assert select_top(uptakes, 0.1, min_selected=3) == ['b', 'c', 'a']
+
+
+def test_failed_prescreens_not_counted():
+    uptakes = {'a': 1.0, 'b': 3.0, 'c': None, 'd': None}
+    # half of the two successful prescreens, not of all four structures
+    assert select_top(uptakes, 0.5) == ['b']
+    assert select_top({'a': None}, 1.0) == []
+
+
+def test_uptake_from_henry_regime():
+    result_dict = {
+        'loading_averages': {
+            'henry': 2.0
+        },
+        'conversion_factor_molec_uc_to_mol_kg': 0.5,
+    }
+    assert uptake_from_results(result_dict) == 1.0
+    assert uptake_from_results({'loading_averages': {}}) is None
@@ -0,0 +1,51 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Loading and uncertainty of the workchain results used to refine the pressure grid.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import math
+
+import pytest
+
+from water_isotherm_workchains.pressure_grid import loading_from_results
+
+
+def test_gcmc_runs():
+    mean, dev = loading_from_results({
+        'loading_averages': {
+            '0': 4.0,
+            '1': 6.0,
+            'md1': 100.0
+        }
+    })
+    assert mean == pytest.approx(5.0)
+    assert dev == pytest.approx(math.sqrt(2.0 / 2))
+
+
+def test_hybrid_segments():
+    mean, dev = loading_from_results({
+        'loading_averages': {
+            '-1': 20.0,
+            'hybrid': 5.0
+        },
+        'segment_loading_averages': {
+            'hybrid0': 4.0,
+            'hybrid1': 5.0,
+            'hybrid2': 6.0
+        },
+    })
+    assert mean == pytest.approx(5.0)
+    assert dev == pytest.approx(math.sqrt(1.0 / 3))
+
+
+def test_no_loading():
+    assert loading_from_results({}) == (None, None)
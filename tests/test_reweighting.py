@@ -0,0 +1,73 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Multiple-histogram reweighting of a Langmuir adsorbent with independent sites.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import math
+
+import numpy as np
+import pytest
+
+from water_isotherm_workchains.reweighting import multiple_histogram_reweighting, reweighted_loading, \
+    reweighted_isotherm, histograms_from_results
+
+SITES = 20
+K = 0.01
+
+
+def langmuir(pressure):
+    return SITES * K * pressure / (1 + K * pressure)
+
+
+def langmuir_histogram(pressure, samples=1e6):
+    """Expected counts of N for SITES independent sites with occupation probability K P / (1 + K P)."""
+    theta = K * pressure / (1 + K * pressure)
+    return np.array([
+        samples * math.factorial(SITES) /
+        (math.factorial(n) * math.factorial(SITES - n)) * theta**n *
+        (1 - theta)**(SITES - n) for n in range(SITES + 1)
+    ])
+
+
+def test_langmuir_recovery():
+    pressures = np.array([20.0, 100.0, 500.0])
+    histograms = np.array([langmuir_histogram(p) for p in pressures])
+    ln_omega = multiple_histogram_reweighting(pressures, histograms)
+    new_pressures = np.array([20.0, 50.0, 200.0, 500.0])
+    assert reweighted_loading(ln_omega, new_pressures) == pytest.approx(
+        [langmuir(p) for p in new_pressures], rel=1e-4)
+
+
+def test_bootstrap_errors():
+    pressures = np.array([50.0, 200.0])
+    # four identical segments per pressure, resampling them changes nothing
+    segments = [np.array([langmuir_histogram(p, 1e4)] * 4) for p in pressures]
+    loading, loading_dev = reweighted_isotherm(pressures, segments, [100.0],
+                                               number_bootstrap=5)
+    assert loading == pytest.approx([langmuir(100.0)], rel=1e-4)
+    assert loading_dev == pytest.approx([0.0], abs=1e-6)
+
+
+def test_histograms_from_results():
+    results = [
+        {
+            'pressure_pa': 10.0,
+            'number_of_molecules_histograms': {
+                '1': {'n': [0, 1], 'counts': [3, 1]},
+                '2': {'n': [1, 2], 'counts': [2, 2]},
+            }
+        },
+        {'pressure_pa': 20.0},
+    ]
+    pressures, segments = histograms_from_results(results)
+    assert list(pressures) == [10.0]
+    assert sorted(map(list, segments[0])) == [[0, 2, 2], [3, 1, 0]]
@@ -0,0 +1,75 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Cost prediction and longest-processing-time-first order of the study submission.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import pytest
+
+from water_isotherm_workchains.scheduling import total_cycles, estimate_cost, calibrate, \
+    predict_runtimes, lpt_order, makespan
+
+SPEC = {
+    'number_runs': 10,
+    'raspa_parameters_gcmc_0': {
+        'GeneralSettings': {
+            'NumberOfInitializationCycles': 1000,
+            'NumberOfCycles': 500
+        }
+    },
+    'raspa_parameters_gcmc': {
+        'GeneralSettings': {
+            'NumberOfCycles': 100
+        }
+    },
+    'raspa_parameters_md': {
+        'GeneralSettings': {
+            'NumberOfCycles': 50
+        }
+    },
+}
+
+
+def test_total_cycles():
+    assert total_cycles(SPEC, 'ResubmitGCMC') == 2500
+    assert total_cycles(SPEC, 'GCMCMD') == 3000
+
+
+def test_estimate_grows_with_pressure_and_size():
+    assert estimate_cost(100, 200, 2000.0) > estimate_cost(100, 200, 10.0)
+    assert estimate_cost(100, 400, 10.0) == pytest.approx(
+        2 * estimate_cost(100, 200, 10.0))
+
+
+def test_predict_runtimes():
+    estimates = {
+        ('GCMCMD', 'a', 100.0): 10.0,
+        ('GCMCMD', 'a', 1000.0): 20.0,
+        ('GCMCMD', 'b', 100.0): 30.0,
+    }
+    runtimes = {('GCMCMD', 'a', 100.0): 50.0}
+    assert calibrate(estimates, runtimes) == pytest.approx(5.0)
+    predictions = predict_runtimes(estimates, runtimes)
+    # measured
+    assert predictions[('GCMCMD', 'a', 100.0)] == 50.0
+    # same structure at another pressure, scaled with the heuristic
+    assert predictions[('GCMCMD', 'a', 1000.0)] == pytest.approx(100.0)
+    # calibrated heuristic
+    assert predictions[('GCMCMD', 'b', 100.0)] == pytest.approx(150.0)
+
+
+def test_lpt_shortens_the_makespan():
+    costs = {'a': 1.0, 'b': 1.0, 'c': 1.0, 'd': 1.0, 'e': 4.0}
+    jobs = sorted(costs)
+    ordered = lpt_order(jobs, costs)
+    assert ordered[0] == 'e'
+    assert makespan([costs[job] for job in ordered], 2) == 4.0
+    assert makespan([costs[job] for job in jobs], 2) == 6.0
@@ -0,0 +1,97 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Helium void fraction of a single atom against a brute-force sum over the grid.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import math
+import os
+
+import numpy as np
+import pytest
+
+from water_isotherm_workchains.void_fraction import helium_void_fraction, grid_points, \
+    HELIUM_EPSILON, HELIUM_SIGMA
+
+LENGTH = 12.0
+EPSILON = 120.0
+SIGMA = 3.4
+CUTOFF = 5.9
+SPACING = 0.75
+
+CIF = """data_single
+_cell_length_a {0}
+_cell_length_b {0}
+_cell_length_c {0}
+_cell_angle_alpha 90
+_cell_angle_beta 90
+_cell_angle_gamma 90
+loop_
+_atom_site_label
+_atom_site_type_symbol
+_atom_site_fract_x
+_atom_site_fract_y
+_atom_site_fract_z
+Ar1 Ar 0.3 0.4 0.5
+""".format(LENGTH)
+
+MIXING_RULES = """# general rule for shifted vs truncated
+truncated
+# general rule tailcorrections
+no
+# number of defined interactions
+1
+# type interaction, parameters
+Ar_ lennard-jones {} {}
+# general mixing rule for Lennard-Jones
+Lorentz-Berthelot
+""".format(EPSILON, SIGMA)
+
+
+@pytest.fixture
+def single_atom(tmpdir):
+    cif_path = str(tmpdir.join('single.cif'))
+    with open(cif_path, 'w') as fh:
+        fh.write(CIF)
+    with open(str(tmpdir.join('force_field_mixing_rules.def')), 'w') as fh:
+        fh.write(MIXING_RULES)
+    return cif_path, str(tmpdir)
+
+
+def brute_force(temperature=298.0):
+    epsilon = math.sqrt(EPSILON * HELIUM_EPSILON)
+    sigma = (SIGMA + HELIUM_SIGMA) / 2
+    matrix = np.eye(3) * LENGTH
+    delta = grid_points(matrix, SPACING) - np.array([0.3, 0.4, 0.5])
+    # minimum image, the cutoff is less than half the cell
+    delta -= np.round(delta)
+    r = np.linalg.norm(delta.dot(matrix), axis=1)
+    energy = np.where(r < CUTOFF,
+                      4 * epsilon * ((sigma / r)**12 - (sigma / r)**6), 0.0)
+    return np.mean(np.exp(-np.minimum(energy / temperature, 700.0)))
+
+
+def test_single_atom(single_atom):
+    cif_path, force_field_dir = single_atom
+    void_fraction = helium_void_fraction(cif_path,
+                                         force_field_dir,
+                                         spacing=SPACING,
+                                         cutoff=CUTOFF,
+                                         processes=1)
+    assert void_fraction == pytest.approx(brute_force(), rel=1e-10)
+    assert 0.9 < void_fraction < 1.1
+
+
+def test_process_pool(single_atom):
+    cif_path, force_field_dir = single_atom
+    assert helium_void_fraction(
+        cif_path, force_field_dir, spacing=SPACING, cutoff=CUTOFF,
+        processes=2) == pytest.approx(brute_force(), rel=1e-10)
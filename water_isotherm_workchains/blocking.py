@@ -0,0 +1,267 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Blocking of inaccessible pockets without zeo++.
+
+A grid point is accessible to the probe if its distance to every framework atom is larger than the atomic
+radius (from the zeo++ .rad file) plus the probe radius. The accessible points are labelled into connected
+components within the unit cell, components touching across the cell faces are joined with the shift of
+the periodic image they connect to. A periodic component that reaches one of its own images is a channel,
+all others are pockets. The pockets are covered greedily with spheres that do not reach into the channels,
+written as a RASPA block file (number of spheres, then fractional x y z and radius in A per line) like the
+one produced by `network -block`.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import itertools
+import math
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from water_isotherm_workchains.cif import read_cif, cell_matrix
+from water_isotherm_workchains.force_field import parse_cached
+from water_isotherm_workchains.void_fraction import perpendicular_widths
+
+SHIFTS = np.array(list(itertools.product([-1, 0, 1], repeat=3)))
+
+
+def read_radii(path):
+    """Read a zeo++ .rad file.
+
+    :return: dict element -> radius in A
+    """
+    radii = {}
+    with open(path) as fh:
+        for line in fh:
+            tokens = line.split()
+            if len(tokens) >= 2 and not tokens[0].startswith('#'):
+                radii[tokens[0]] = float(tokens[1])
+    return radii
+
+
+def grid_shape(matrix, spacing):
+    return tuple(
+        max(int(math.ceil(np.linalg.norm(vector) / spacing)), 1)
+        for vector in matrix)
+
+
+def clearance(fract, radii, matrix, shape, cutoff):
+    """Distance of every grid point to the closest atom surface, capped at the cutoff.
+
+    :param fract: fractional coordinates of the atoms
+    :param radii: radius of every atom in A
+    :param shape: number of grid points along a, b and c
+    """
+    shape = np.array(shape)
+    result = np.full(tuple(shape), cutoff)
+    extent = np.ceil(
+        (cutoff + np.max(radii)) / perpendicular_widths(matrix) * shape)
+    extent = np.minimum(extent, (shape - 1) // 2).astype(int)
+    for position, radius in zip(np.asarray(fract) % 1.0, radii):
+        center = np.floor(position * shape).astype(int)
+        axes = [
+            np.arange(c - e, c + e + 1) for c, e in zip(center, extent)
+        ]
+        index = np.stack(np.meshgrid(*axes, indexing='ij'),
+                         axis=-1).reshape(-1, 3)
+        delta = ((index + 0.5) / shape - position).dot(matrix)
+        distance = np.sqrt((delta * delta).sum(axis=1)) - radius
+        index = tuple((index % shape).T)
+        result[index] = np.minimum(result[index], distance)
+    return result
+
+
+def _find_roots(parent):
+    while True:
+        grandparent = parent[parent]
+        if np.array_equal(grandparent, parent):
+            return parent
+        parent = grandparent
+
+
+def label_components(mask):
+    """Connected components (6-neighbourhood) of a boolean grid, not periodic.
+
+    :return: labels (-1 outside the mask), the label of a component is the flat index of its first point
+    """
+    parent = np.arange(mask.size)
+    flat = mask.ravel()
+    edges = []
+    for axis in range(3):
+        index = np.arange(mask.size).reshape(mask.shape)
+        first = [slice(None)] * 3
+        second = [slice(None)] * 3
+        first[axis] = slice(0, -1)
+        second[axis] = slice(1, None)
+        u = index[tuple(first)].ravel()
+        v = index[tuple(second)].ravel()
+        both = flat[u] & flat[v]
+        edges.append((u[both], v[both]))
+    u = np.concatenate([edge[0] for edge in edges])
+    v = np.concatenate([edge[1] for edge in edges])
+    while True:
+        parent = _find_roots(parent)
+        pu, pv = parent[u], parent[v]
+        differ = pu != pv
+        if not differ.any():
+            break
+        # hook the larger root onto the smaller one
+        parent[np.maximum(pu[differ], pv[differ])] = np.minimum(
+            pu[differ], pv[differ])
+    return np.where(flat, parent, -1).reshape(mask.shape)
+
+
+def find_channels(labels):
+    """Components that connect to one of their own periodic images.
+
+    :return: set of the labels of all channel components
+    """
+    links = {}
+    for axis in range(3):
+        last = np.take(labels, -1, axis=axis).ravel()
+        first = np.take(labels, 0, axis=axis).ravel()
+        both = (last >= 0) & (first >= 0)
+        shift = tuple(int(i == axis) for i in range(3))
+        for a, b in set(zip(last[both], first[both])):
+            links.setdefault(a, []).append((b, shift))
+            links.setdefault(b, []).append((a, tuple(-s for s in shift)))
+
+    channels = set()
+    visited = {}
+    for start in links:
+        if start in visited:
+            continue
+        visited[start] = (0, 0, 0)
+        cluster = [start]
+        stack = [start]
+        percolating = False
+        while stack:
+            node = stack.pop()
+            for other, shift in links[node]:
+                image = tuple(s + t for s, t in zip(visited[node], shift))
+                if other not in visited:
+                    visited[other] = image
+                    cluster.append(other)
+                    stack.append(other)
+                elif visited[other] != image:
+                    percolating = True
+        if percolating:
+            channels.update(cluster)
+    return channels
+
+
+def _periodic_distance(point, points, matrix):
+    """Distances between a point and many points, all in fractional coordinates."""
+    delta = points - point
+    delta -= np.round(delta)
+    distances = [
+        np.linalg.norm((delta + shift).dot(matrix), axis=1)
+        for shift in SHIFTS
+    ]
+    return np.min(distances, axis=0)
+
+
+def cover_pockets(pocket, channel, depth, matrix, spacing):
+    """Cover the pocket points with spheres that stay clear of the channel points.
+
+    :param pocket: fractional coordinates of the pocket points
+    :param channel: fractional coordinates of the channel points
+    :param depth: clearance of the pocket points, the deepest uncovered point is the next center
+    :return: list of (x, y, z, radius)
+    """
+    spheres = []
+    uncovered = np.ones(len(pocket), dtype=bool)
+    while uncovered.any():
+        candidates = np.flatnonzero(uncovered)
+        center = pocket[candidates[np.argmax(depth[candidates])]]
+        if len(channel):
+            radius = _periodic_distance(center, channel,
+                                        matrix).min() - spacing
+        else:
+            radius = np.inf
+        distances = _periodic_distance(center, pocket[candidates], matrix)
+        radius = max(min(radius, distances.max() + spacing), spacing / 2)
+        uncovered[candidates[distances <= radius]] = False
+        spheres.append(tuple(float(x) for x in center) + (float(radius), ))
+    return spheres
+
+
+def block_pockets(cif_path, radii_path, probe_radius, spacing=0.25):
+    """Blocking spheres for the pockets of a framework that the probe cannot reach from a channel.
+
+    :param cif_path: path of the (P1) CIF file
+    :param radii_path: zeo++ .rad file with the atomic radii
+    :param probe_radius: in A
+    :param spacing: grid spacing in A
+    :return: list of (x, y, z, radius), fractional coordinates and radius in A
+    """
+    cif = parse_cached(cif_path, read_cif)
+    matrix = np.array(cell_matrix(cif['cell']))
+    radii_table = parse_cached(radii_path, read_radii)
+    try:
+        radii = [radii_table[atom['type']] for atom in cif['atoms']]
+    except KeyError as error:
+        raise ValueError('no radius for {} in {}'.format(
+            error.args[0], radii_path))
+
+    shape = grid_shape(matrix, spacing)
+    depth = clearance([atom['fract'] for atom in cif['atoms']], radii, matrix,
+                      shape, probe_radius + 2 * spacing)
+    labels = label_components(depth > probe_radius)
+    channels = find_channels(labels)
+
+    is_channel = np.isin(labels, list(channels))
+    # components that only touch a channel diagonally are connected to it through a gap the grid cannot
+    # resolve
+    touching = np.zeros_like(is_channel)
+    for shift in SHIFTS:
+        touching |= np.roll(is_channel, tuple(shift), axis=(0, 1, 2))
+    is_channel = np.isin(labels,
+                         list(channels | set(labels[touching & (labels >= 0)])))
+    is_pocket = (labels >= 0) & ~is_channel
+    if not is_pocket.any():
+        return []
+    axes = [(np.arange(n) + 0.5) / n for n in shape]
+    points = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1)
+    return cover_pockets(points[is_pocket], points[is_channel],
+                         depth[is_pocket], matrix, spacing)
+
+
+def block_file_content(spheres):
+    """Content of a RASPA block file."""
+    lines = ['{}'.format(len(spheres))]
+    lines += [
+        '{:.6f} {:.6f} {:.6f} {:.6f}'.format(*sphere) for sphere in spheres
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def write_block_file(spheres, path):
+    with open(path, 'w') as fh:
+        fh.write(block_file_content(spheres))
+
+
+def make_block_node(spheres):
+    """Stored SinglefileData with the block file, a drop-in for the block output of ZeoppCalculation."""
+    from aiida.orm import DataFactory
+    SinglefileData = DataFactory('singlefile')
+
+    folder = tempfile.mkdtemp()
+    try:
+        path = os.path.join(folder, 'out.block')
+        write_block_file(spheres, path)
+        node = SinglefileData(file=path)
+        node.store()
+    finally:
+        shutil.rmtree(folder)
+    return node
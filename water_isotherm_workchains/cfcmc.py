@@ -0,0 +1,62 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Helpers for continuous fractional component MC (CFCMC) insertions of the adsorbate. The biasing
+factors of the lambda histogram are flattened between segments from the histogram of the last one.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import math
+
+
+def cfcmc_parameters(parameters, number_bins, biasing_factors=None):
+    """Replace the swap move of the first component with a CFCMC swap.
+
+    :param parameters: RASPA parameter dictionary, changed in place
+    :param number_bins: number of bins of the lambda histogram
+    :param biasing_factors: list of biasing factors, one per bin, default no bias
+    """
+    component = parameters['Component'][0]
+    swap_probability = component.pop('SwapProbability', 1.0)
+    component['CFCMC_CBMC_SwapProbability'] = swap_probability
+    component['CFLambdaHistogramSize'] = number_bins
+    if biasing_factors is None:
+        biasing_factors = [0.0] * number_bins
+    set_biasing_factors(parameters, biasing_factors)
+    return parameters
+
+
+def set_biasing_factors(parameters, biasing_factors):
+    """Write the biasing factors into the first component."""
+    parameters['Component'][0]['CFBiasingFactors'] = ' '.join(
+        '{:.6f}'.format(x) for x in biasing_factors)
+    return parameters
+
+
+def update_biasing_factors(biasing_factors, histogram, max_change=2.0):
+    """Flat-histogram update w_i <- w_i - ln(H_i / <H>) of the biasing factors.
+
+    Changes are limited to max_change (in kT), which also takes care of empty bins.
+
+    :return: new list of biasing factors, the old ones if the histogram does not match
+    """
+    if len(histogram) != len(biasing_factors) or sum(histogram) == 0:
+        return list(biasing_factors)
+
+    mean = sum(histogram) / len(histogram)
+    updated = []
+    for factor, counts in zip(biasing_factors, histogram):
+        if counts > 0:
+            change = -math.log(counts / mean)
+        else:
+            change = max_change
+        updated.append(factor + max(-max_change, min(max_change, change)))
+    # only differences matter
+    return [x - updated[0] for x in updated]
@@ -0,0 +1,90 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Minimal reader for the P1 CIF files used in the study (cell parameters and the atom_site loop).
+"""
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import math
+import re
+
+CELL_KEYS = [
+    '_cell_length_a', '_cell_length_b', '_cell_length_c', '_cell_angle_alpha',
+    '_cell_angle_beta', '_cell_angle_gamma'
+]
+
+
+def _to_float(value):
+    # strip uncertainties like 1.234(5)
+    return float(re.sub(r'\(\d+\)$', '', value))
+
+
+def read_cif(path):
+    """Read cell and atoms of a P1 CIF file.
+
+    :return: dict with 'cell' (a, b, c, alpha, beta, gamma) and 'atoms', a list of dicts with
+             'label', 'type', 'fract' (x, y, z) and 'charge' (None if not given)
+    """
+    with open(path) as fh:
+        lines = [line.strip() for line in fh]
+
+    cell = {}
+    atoms = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        tokens = line.split()
+        if tokens and tokens[0] in CELL_KEYS:
+            cell[tokens[0]] = _to_float(tokens[1])
+        elif line == 'loop_':
+            keys = []
+            i += 1
+            while i < len(lines) and lines[i].startswith('_'):
+                keys.append(lines[i].split()[0])
+                i += 1
+            if '_atom_site_fract_x' in keys:
+                while i < len(lines) and lines[i] and not lines[i].startswith(
+                    ('_', 'loop_', 'data_', '#')):
+                    values = dict(zip(keys, lines[i].split()))
+                    label = values.get('_atom_site_label')
+                    atoms.append({
+                        'label':
+                        label,
+                        'type':
+                        values.get('_atom_site_type_symbol', label),
+                        'fract': [
+                            _to_float(values['_atom_site_fract_' + x])
+                            for x in 'xyz'
+                        ],
+                        'charge':
+                        _to_float(values['_atom_site_charge'])
+                        if '_atom_site_charge' in values else None,
+                    })
+                    i += 1
+            continue
+        i += 1
+
+    return {'cell': [cell[key] for key in CELL_KEYS], 'atoms': atoms}
+
+
+def cell_matrix(cell):
+    """Lattice vectors (rows) from the cell parameters, a along x and b in the xy plane."""
+    a, b, c, alpha, beta, gamma = cell
+    alpha, beta, gamma = [math.radians(x) for x in (alpha, beta, gamma)]
+    cx = c * math.cos(beta)
+    cy = c * (math.cos(alpha) - math.cos(beta) * math.cos(gamma)) / math.sin(
+        gamma)
+    cz = math.sqrt(max(c * c - cx * cx - cy * cy, 0.0))
+    return [[a, 0.0, 0.0], [b * math.cos(gamma), b * math.sin(gamma), 0.0],
+            [cx, cy, cz]]
+
+
+def cell_volume(cell):
+    """Volume of the cell in A^3."""
+    m = cell_matrix(cell)
+    return m[0][0] * m[1][1] * m[2][2]
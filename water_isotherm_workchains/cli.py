@@ -0,0 +1,533 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Command line launcher for isotherm studies, `water-isotherm submit study.json`.
+
+The study is described declaratively (see files_4_study/study.json): structures (glob patterns),
+pressures, workchains and parameter sets. Structures are deduplicated by content hash and existing
+CifData nodes are reused. Every submitted workchain is tagged with the study label, structure hash,
+pressure and workchain name, combinations that are running or finished successfully are skipped when
+the study is launched again. Submission is rate limited and waits while the number of active
+workchains is at the limit.
+"""
+from __future__ import print_function
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+
+STUDY_EXTRA = 'water_isotherm_study'
+
+PARAMETER_KEYS = [
+    'raspa_parameters_gcmc', 'raspa_parameters_gcmc_0', 'raspa_parameters_md'
+]
+
+WORKCHAINS = {
+    'ResubmitGCMC':
+    'water_isotherm_workchains.gcmc_restart_workchain',
+    'GCMCMD':
+    'water_isotherm_workchains.gcmc_md_workchain',
+    'GCMCMD2':
+    'water_isotherm_workchains.gcmc_md_cycle_dist_workchain',
+}
+
+
+def load_spec(path):
+    """Read a study specification (JSON, or YAML for .yml/.yaml files)."""
+    with open(path) as fh:
+        if path.endswith(('.yml', '.yaml')):
+            import yaml
+            spec = yaml.safe_load(fh)
+        else:
+            spec = json.load(fh)
+    spec.setdefault('base_dir', os.path.dirname(os.path.abspath(path)))
+    if isinstance(spec['workchains'], str):
+        spec['workchains'] = [spec['workchains']]
+    return spec
+
+
+def _file_md5(path):
+    with open(path, 'rb') as fh:
+        return hashlib.md5(fh.read()).hexdigest()
+
+
+def get_structure_files(spec):
+    """Structure files of the study, deduplicated by content hash.
+
+    :return: dict md5 -> path
+    """
+    structures = {}
+    for pattern in spec['structures']:
+        for path in sorted(
+                glob.glob(os.path.join(spec['base_dir'], pattern))):
+            structures.setdefault(_file_md5(path), path)
+    return structures
+
+
+def get_cif(md5, path):
+    """Existing CifData node with this content, a new one otherwise."""
+    from aiida.orm import DataFactory
+    CifData = DataFactory('cif')
+
+    existing = CifData.from_md5(md5)
+    if existing:
+        return existing[0]
+    return CifData(file=path).store()
+
+
+def study_key(label, md5, pressure, workchain):
+    """Extra that identifies a workchain in a study."""
+    return {
+        'label': label,
+        'structure': md5,
+        'pressure': float(pressure),
+        'workchain': workchain,
+    }
+
+
+def is_done(key):
+    """Check if the combination is running or finished successfully."""
+    from aiida.orm.calculation.work import WorkCalculation
+    from aiida.orm.querybuilder import QueryBuilder
+
+    qb = QueryBuilder()
+    qb.append(WorkCalculation,
+              filters={
+                  'extras.{}.{}'.format(STUDY_EXTRA, k): v
+                  for k, v in key.items()
+              })
+    for calc, in qb.iterall():
+        if not calc.is_sealed or calc.has_finished_ok():
+            return True
+    return False
+
+
+def find_failed(key):
+    """pk of the most recent failed workchain of the combination, None if there is none."""
+    from aiida.orm.calculation.work import WorkCalculation
+    from aiida.orm.querybuilder import QueryBuilder
+
+    qb = QueryBuilder()
+    qb.append(WorkCalculation,
+              filters={
+                  'extras.{}.{}'.format(STUDY_EXTRA, k): v
+                  for k, v in key.items()
+              },
+              tag='calc')
+    qb.order_by({'calc': {'ctime': 'desc'}})
+    for calc, in qb.iterall():
+        if calc.is_sealed and not calc.has_finished_ok():
+            return calc.pk
+    return None
+
+
+def get_finished(label):
+    """pks of the successfully finished workchains of a study."""
+    from aiida.orm.calculation.work import WorkCalculation
+    from aiida.orm.querybuilder import QueryBuilder
+
+    qb = QueryBuilder()
+    qb.append(WorkCalculation,
+              filters={'extras.{}.label'.format(STUDY_EXTRA): label})
+    return [calc.pk for calc, in qb.iterall() if calc.has_finished_ok()]
+
+
+def get_active(pks):
+    """The workchains among pks that are not finished yet.
+
+    Only the top-level workchains submitted by this command are counted, not their children, other
+    projects or workchains that were left unsealed by a crash of the daemon.
+    """
+    from aiida.orm import load_node
+    return [pk for pk in pks if not load_node(pk).is_sealed]
+
+
+def build_inputs(spec, workchain):
+    """Inputs shared by all workchains of the study, without structure and pressure."""
+    from aiida.common.example_helpers import test_and_get_code
+    from aiida.orm import DataFactory
+    from aiida.orm.data.base import Float
+    ParameterData = DataFactory('parameter')
+    SinglefileData = DataFactory('singlefile')
+
+    inputs = {
+        'zeopp_probe_radius':
+        Float(spec['zeopp_probe_radius']),
+        'number_runs':
+        Float(spec['number_runs']),
+        'zeopp_code':
+        test_and_get_code(spec['zeopp_code'],
+                          expected_code_type='zeopp.network'),
+        'raspa_code':
+        test_and_get_code(spec['raspa_code'], expected_code_type='raspa'),
+        '_zeopp_options':
+        spec.get('stage_options', {}).get('zeopp', spec['options']),
+        '_raspa_options':
+        spec['options'],
+        'raspa_parameters_gcmc':
+        ParameterData(dict=spec['raspa_parameters_gcmc']),
+        'raspa_parameters_gcmc_0':
+        ParameterData(dict=spec['raspa_parameters_gcmc_0']),
+    }
+    if workchain != 'ResubmitGCMC':
+        inputs['raspa_parameters_md'] = ParameterData(
+            dict=spec['raspa_parameters_md'])
+    for stage, options in spec.get('stage_options', {}).items():
+        if stage == 'zeopp' or (stage == 'md' and workchain == 'ResubmitGCMC'):
+            continue
+        inputs['_raspa_{}_options'.format(stage)] = options
+    if spec.get('zeopp_atomic_radii'):
+        inputs['zeopp_atomic_radii'] = SinglefileData(file=os.path.join(
+            spec['base_dir'], spec['zeopp_atomic_radii']))
+    for key, value in spec.get('workchain_inputs', {}).get(workchain,
+                                                          {}).items():
+        # numbers are Float nodes, flags stay plain bools like the other underscore inputs
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = Float(value)
+        inputs[key] = value
+    inputs.update(spec.get('workchain_options', {}))
+    return inputs
+
+
+def get_jobs(spec):
+    """All (workchain, md5, path, pressure) combinations of the study."""
+    structures = get_structure_files(spec)
+    return [(workchain, md5, path, pressure)
+            for workchain in spec['workchains']
+            for md5, path in sorted(structures.items())
+            for pressure in spec['pressures']]
+
+
+def get_runtimes(md5s):
+    """Wall times in s of finished workchains of any study, for the given structures.
+
+    :return: dict (workchain, md5, pressure) -> runtime of the most recent run
+    """
+    from aiida.orm.calculation.work import WorkCalculation
+    from aiida.orm.querybuilder import QueryBuilder
+
+    qb = QueryBuilder()
+    qb.append(WorkCalculation,
+              filters={
+                  'extras.{}.structure'.format(STUDY_EXTRA): {
+                      'in': list(md5s)
+                  }
+              },
+              tag='calc')
+    qb.order_by({'calc': {'ctime': 'asc'}})
+    runtimes = {}
+    for calc, in qb.iterall():
+        if not calc.has_finished_ok():
+            continue
+        key = calc.get_extra(STUDY_EXTRA)
+        runtimes[(key['workchain'], key['structure'],
+                  float(key['pressure']))] = (calc.mtime -
+                                              calc.ctime).total_seconds()
+    return runtimes
+
+
+def get_costs(spec, jobs, runtimes=None):
+    """Predicted cost of every job, from previous runtimes if available and the size of the
+    framework, pressure and number of cycles otherwise.
+
+    :return: dict job -> cost
+    """
+    from water_isotherm_workchains.cif import read_cif
+    from water_isotherm_workchains.scheduling import (estimate_cost,
+                                                      predict_runtimes,
+                                                      total_cycles)
+
+    number_atoms = {}
+    estimates = {}
+    for workchain, md5, path, pressure in jobs:
+        if md5 not in number_atoms:
+            number_atoms[md5] = len(read_cif(path)['atoms'])
+        estimates[(workchain, md5, float(pressure))] = estimate_cost(
+            total_cycles(spec, workchain), number_atoms[md5], pressure)
+
+    predictions = predict_runtimes(estimates, runtimes or {})
+    return {
+        job: predictions[(job[0], job[1], float(job[3]))]
+        for job in jobs
+    }
+
+
+def check_study(spec):
+    """Check the local copy of the force field (force_field_dir) against the structures and adsorbates
+    of the study before anything is submitted.
+
+    :return: list of problems, empty if everything is defined or the study has no force_field_dir
+    """
+    from water_isotherm_workchains.force_field import check_force_field
+
+    if not spec.get('force_field_dir'):
+        return []
+    force_field_dir = os.path.join(spec['base_dir'], spec['force_field_dir'])
+    definitions = spec.get('molecule_definitions', {})
+
+    problems = []
+    molecules = set()
+    for key in PARAMETER_KEYS:
+        if key not in spec:
+            continue
+        settings = spec[key]
+        forcefield = settings['GeneralSettings'].get('Forcefield')
+        if forcefield is not None and forcefield != os.path.basename(
+                os.path.normpath(force_field_dir)):
+            problems.append('{} uses the force field {}, not {}'.format(
+                key, forcefield, spec['force_field_dir']))
+        for component in settings.get('Component', []):
+            name = component['MoleculeName']
+            path = os.path.join(spec['base_dir'], definitions[name]) \
+                if name in definitions else os.path.join(
+                    force_field_dir, '{}.def'.format(name))
+            if os.path.isfile(path):
+                molecules.add(path)
+                continue
+            problem = 'no definition of the molecule {} ({})'.format(
+                name, path)
+            if problem not in problems:
+                problems.append(problem)
+
+    return problems + check_force_field(
+        force_field_dir,
+        sorted(get_structure_files(spec).values()), sorted(molecules))
+
+
+def get_helium_void_fraction(spec, path):
+    """Helium void fraction of a structure with the force field of the study (force_field_dir)."""
+    from water_isotherm_workchains.void_fraction import helium_void_fraction
+    return helium_void_fraction(
+        path,
+        os.path.join(spec['base_dir'], spec['force_field_dir']),
+        spacing=spec.get('helium_void_fraction_spacing', 0.5),
+        cutoff=spec['raspa_parameters_gcmc']['GeneralSettings'].get(
+            'CutOff', 12.0))
+
+
+def submit_study(spec, dry_run=False, restart_failed=True):
+    """Submit all combinations of the study that are not running or done yet.
+
+    With restart_failed a combination whose last workchain failed adopts the successful steps of that
+    workchain instead of starting from scratch.
+
+    With the default order 'lpt' the most expensive workchains are submitted first, such that the
+    study does not end with a few long workchains running alone. 'spec' keeps the order of the
+    specification.
+
+    With helium_void_fraction the helium void fraction of every structure is computed here once and
+    passed to the workchains, instead of POAV.
+    """
+    import importlib
+    from aiida.orm import load_node
+    from aiida.orm.data.base import Float
+    from aiida.work.run import submit
+    from water_isotherm_workchains.scheduling import lpt_order
+
+    submission = spec.get('submission', {})
+    interval = submission.get('interval', 5)
+    max_active = submission.get('max_active', None)
+    order = submission.get('order', 'lpt')
+
+    jobs = get_jobs(spec)
+    if order == 'lpt':
+        costs = get_costs(spec, jobs,
+                          get_runtimes(set(job[1] for job in jobs)))
+        jobs = lpt_order(jobs, costs)
+    elif order != 'spec':
+        raise ValueError('unknown submission order {}'.format(order))
+
+    inputs = {}
+    void_fractions = {}
+    active = []
+    submitted = 0
+    for workchain, md5, path, pressure in jobs:
+        key = study_key(spec['label'], md5, pressure, workchain)
+        if is_done(key):
+            print('skipping {} {} {} Pa'.format(workchain,
+                                                os.path.basename(path),
+                                                pressure))
+            continue
+        restart_from = find_failed(key) if restart_failed else None
+        if dry_run:
+            print('would submit {} {} {} Pa{}'.format(
+                workchain, os.path.basename(path), pressure,
+                ' (restart from <{}>)'.format(restart_from)
+                if restart_from is not None else ''))
+            continue
+
+        while max_active is not None:
+            active = get_active(active)
+            if len(active) < max_active:
+                break
+            time.sleep(interval)
+
+        if workchain not in inputs:
+            inputs[workchain] = build_inputs(spec, workchain)
+        workchain_class = getattr(
+            importlib.import_module(WORKCHAINS[workchain]), workchain)
+        workchain_inputs = dict(inputs[workchain])
+        if restart_from is not None:
+            workchain_inputs['_restart_from'] = restart_from
+        if spec.get('helium_void_fraction'):
+            if md5 not in void_fractions:
+                void_fractions[md5] = get_helium_void_fraction(spec, path)
+            workchain_inputs['_helium_void_fraction'] = void_fractions[md5]
+        running = submit(workchain_class,
+                         structure=get_cif(md5, path),
+                         pressure=Float(pressure),
+                         _label=spec['label'],
+                         **workchain_inputs)
+        load_node(running.pid).set_extra(STUDY_EXTRA, key)
+        active.append(running.pid)
+        submitted += 1
+        print('pk: {} | submitted {} {} {} Pa'.format(
+            running.pid, workchain, os.path.basename(path), pressure))
+        time.sleep(interval)
+    return submitted
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='water-isotherm',
+        description='Launch water isotherm studies with AiiDA')
+    subparsers = parser.add_subparsers(dest='command')
+    submit_parser = subparsers.add_parser(
+        'submit', help='submit all missing workchains of a study')
+    submit_parser.add_argument('spec', help='study specification')
+    submit_parser.add_argument('--dry-run',
+                               action='store_true',
+                               help='only print what would be submitted')
+    submit_parser.add_argument('--max-active',
+                               type=int,
+                               help='maximum number of active workchains')
+    submit_parser.add_argument('--interval',
+                               type=float,
+                               help='seconds between two submissions')
+    submit_parser.add_argument(
+        '--order',
+        choices=['lpt', 'spec'],
+        help='submit the most expensive workchains first (lpt) or keep the '
+        'order of the specification (spec)')
+    submit_parser.add_argument(
+        '--fresh',
+        action='store_true',
+        help='rerun failed combinations from scratch instead of adopting the '
+        'successful steps of the failed workchain')
+    rebuild_parser = subparsers.add_parser(
+        'rebuild',
+        help='rebuild the results of finished workchains from their RASPA '
+        'segments')
+    rebuild_parser.add_argument('pks',
+                                nargs='*',
+                                type=int,
+                                help='pks of the workchains')
+    rebuild_parser.add_argument(
+        '--study', help='rebuild all finished workchains of the study label')
+    rebuild_parser.add_argument('--processes',
+                                type=int,
+                                default=4,
+                                help='number of worker processes')
+    void_parser = subparsers.add_parser(
+        'void-fraction',
+        help='compute the helium void fraction of structures on a grid')
+    void_parser.add_argument(
+        'force_field', help='directory with force_field_mixing_rules.def')
+    void_parser.add_argument('structures', nargs='+', help='CIF files')
+    void_parser.add_argument('--spacing',
+                             type=float,
+                             default=0.5,
+                             help='grid spacing in A')
+    void_parser.add_argument('--cutoff',
+                             type=float,
+                             default=12.0,
+                             help='Lennard-Jones cutoff in A')
+    void_parser.add_argument('--processes',
+                             type=int,
+                             help='number of worker processes')
+    block_parser = subparsers.add_parser(
+        'block', help='write the blocking spheres of a structure')
+    block_parser.add_argument('structure', help='CIF file')
+    block_parser.add_argument('radii', help='zeo++ .rad file')
+    block_parser.add_argument('probe_radius',
+                              type=float,
+                              help='probe radius in A')
+    block_parser.add_argument('--spacing',
+                              type=float,
+                              default=0.25,
+                              help='grid spacing in A')
+    block_parser.add_argument('-o',
+                              '--output',
+                              default='out.block',
+                              help='block file to write')
+    args = parser.parse_args(args)
+
+    if args.command not in ('submit', 'rebuild', 'void-fraction', 'block'):
+        parser.print_help()
+        return 1
+
+    if args.command == 'void-fraction':
+        from water_isotherm_workchains.void_fraction import helium_void_fraction
+        for path in args.structures:
+            print('{}: {:.4f}'.format(
+                path,
+                helium_void_fraction(path,
+                                     args.force_field,
+                                     spacing=args.spacing,
+                                     cutoff=args.cutoff,
+                                     processes=args.processes)))
+        return 0
+
+    if args.command == 'block':
+        from water_isotherm_workchains.blocking import block_pockets, write_block_file
+        spheres = block_pockets(args.structure,
+                                args.radii,
+                                args.probe_radius,
+                                spacing=args.spacing)
+        write_block_file(spheres, args.output)
+        print('{} blocking spheres written to {}'.format(
+            len(spheres), args.output))
+        return 0
+
+    from aiida.backends.utils import load_dbenv, is_dbenv_loaded
+    if not is_dbenv_loaded():
+        load_dbenv()
+
+    if args.command == 'rebuild':
+        from water_isotherm_workchains.rebuild import rebuild_many
+        pks = list(args.pks)
+        if args.study:
+            pks += get_finished(args.study)
+        for pk, result in rebuild_many(pks, processes=args.processes):
+            print('{}: {}'.format(pk, result))
+        return 0
+
+    spec = load_spec(args.spec)
+    problems = check_study(spec)
+    if problems:
+        for problem in problems:
+            print(problem)
+        return 1
+    submission = spec.setdefault('submission', {})
+    if args.max_active is not None:
+        submission['max_active'] = args.max_active
+    if args.interval is not None:
+        submission['interval'] = args.interval
+    if args.order is not None:
+        submission['order'] = args.order
+
+    submitted = submit_study(spec,
+                             dry_run=args.dry_run,
+                             restart_failed=not args.fresh)
+    print('submitted {} workchains'.format(submitted))
+    return 0
@@ -0,0 +1,93 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Library of equilibrated configurations (RASPA restart folders) for warm starts.
+
+The retrieved folders of finished workchains are added to a group and indexed with extras by
+structure (content hash), unit cells, adsorbate, temperature and pressure. A new workchain can then
+start from the configuration at the closest pressure for the same framework, supercell, adsorbate and
+temperature, even if force field or cutoff changed.
+"""
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import math
+
+LIBRARY_GROUP = 'water_isotherm_configurations'
+LIBRARY_EXTRA = 'configuration_library'
+
+
+def _adsorbate(parameters):
+    return parameters['Component'][0]['MoleculeName']
+
+
+def _temperature(parameters):
+    return float(parameters['GeneralSettings']['ExternalTemperature'])
+
+
+def _unitcells(parameters):
+    unitcells = parameters['GeneralSettings'].get('UnitCells', '1 1 1')
+    return ' '.join(str(int(n)) for n in str(unitcells).split())
+
+
+def add_to_library(folder, structure, parameters, pressure):
+    """Add the retrieved folder of a finished RASPA run to the library.
+
+    :param folder: retrieved folder with the restart file
+    :param structure: CifData of the framework
+    :param parameters: RASPA parameter dictionary of the run
+    :param pressure: pressure in Pa
+    """
+    from aiida.orm.group import Group
+
+    folder.set_extra(
+        LIBRARY_EXTRA, {
+            'structure': structure.get_attr('md5'),
+            'unitcells': _unitcells(parameters),
+            'adsorbate': _adsorbate(parameters),
+            'temperature': _temperature(parameters),
+            'pressure': float(pressure),
+        })
+    group, _ = Group.get_or_create(name=LIBRARY_GROUP)
+    group.add_nodes(folder)
+
+
+def find_warm_start(structure, parameters, pressure, temperature_tolerance=0.1):
+    """Configuration of the same framework, unit cells, adsorbate and temperature at the closest pressure
+    (on a log scale).
+
+    :return: tuple (folder, pressure) or (None, None) if there is no compatible configuration
+    """
+    from aiida.orm.group import Group
+    from aiida.orm.data.folder import FolderData
+    from aiida.orm.querybuilder import QueryBuilder
+
+    qb = QueryBuilder()
+    qb.append(Group, filters={'name': LIBRARY_GROUP}, tag='group')
+    qb.append(FolderData,
+              member_of='group',
+              filters={
+                  'extras.{}.structure'.format(LIBRARY_EXTRA):
+                  structure.get_attr('md5'),
+                  'extras.{}.unitcells'.format(LIBRARY_EXTRA):
+                  _unitcells(parameters),
+                  'extras.{}.adsorbate'.format(LIBRARY_EXTRA):
+                  _adsorbate(parameters),
+              })
+
+    best = (None, None)
+    best_distance = None
+    for folder, in qb.iterall():
+        entry = folder.get_extra(LIBRARY_EXTRA)
+        if abs(entry['temperature'] -
+               _temperature(parameters)) > temperature_tolerance:
+            continue
+        distance = abs(math.log(entry['pressure'] / float(pressure)))
+        if best_distance is None or distance < best_distance:
+            best = (folder, entry['pressure'])
+            best_distance = distance
+    return best
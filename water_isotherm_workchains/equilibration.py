@@ -0,0 +1,67 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Detection of the equilibrated part of a time series based on the statistical inefficiency,
+following Chodera, J. Chem. Theory Comput. 12, 1799 (2016): the start of the stationary
+regime is the point that maximizes the number of uncorrelated samples after it.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+
+def statistical_inefficiency(series):
+    """Statistical inefficiency g = 1 + 2 * sum_t (1 - t/N) C(t) of a time series,
+    the sum is truncated at the first non-positive value of the autocorrelation function C(t)."""
+    n = len(series)
+    if n < 2:
+        return 1.0
+    mean = sum(series) / n
+    fluctuations = [x - mean for x in series]
+    variance = sum(dx * dx for dx in fluctuations) / n
+    if variance == 0:
+        return 1.0
+
+    g = 1.0
+    for t in range(1, n - 1):
+        correlation = sum(fluctuations[i] * fluctuations[i + t]
+                          for i in range(n - t)) / ((n - t) * variance)
+        if correlation <= 0:
+            break
+        g += 2.0 * correlation * (1.0 - t / n)
+    return max(g, 1.0)
+
+
+def detect_equilibration(series):
+    """Find the start of the stationary regime.
+
+    :param series: list of observations, e.g. block averages of the loading
+    :return: tuple (t0, g, n_effective) with the index of the first equilibrated sample,
+             the statistical inefficiency after it and the number of uncorrelated samples after it
+    """
+    n = len(series)
+    best = (0, 1.0, 0.0)
+    for t0 in range(n - 1):
+        g = statistical_inefficiency(series[t0:])
+        n_effective = (n - t0) / g
+        if n_effective > best[2]:
+            best = (t0, g, n_effective)
+    return best
+
+
+def is_equilibrated(series, min_samples):
+    """The series is equilibrated if the stationary part contains at least min_samples
+    samples and covers at least half of the series.
+
+    :return: tuple (equilibrated, t0)
+    """
+    n = len(series)
+    if n < min_samples:
+        return False, None
+    t0, _, _ = detect_equilibration(series)
+    return (n - t0 >= min_samples and t0 <= n / 2), t0
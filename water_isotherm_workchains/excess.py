@@ -0,0 +1,124 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Recompute excess loadings for a new helium void fraction without rerunning the simulations.
+
+The absolute loading does not depend on the void fraction, RASPA only subtracts the molecules the
+void would hold at bulk density: N_ex = N_abs - phi * rho_bulk * V_cell. With the absolute and excess
+loading and the void fraction of the run the bulk term is rescaled to the new void fraction. If the
+excess loading of the run is not known (or the void fraction was zero) the ideal gas is used for the
+bulk density, which is accurate for water at the pressures of the study.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import numpy as np
+
+BOLTZMANN = 1.380649e-23  # J/K
+AVOGADRO = 6.02214076e23  # 1/mol
+
+
+def ideal_gas_molecules(pressure, temperature, volume):
+    """Number of molecules of an ideal gas.
+
+    :param pressure: in Pa
+    :param temperature: in K
+    :param volume: in A^3
+    """
+    return pressure * volume * 1e-30 / (BOLTZMANN * temperature)
+
+
+def molec_uc_to_mol_kg(density, cell_volume):
+    """Conversion factor from molecules/uc to mol/kg.
+
+    :param density: of the framework in g/cm^3
+    :param cell_volume: in A^3
+    """
+    return 1e27 / (AVOGADRO * density * cell_volume)
+
+
+def excess_loading(absolute, void_fraction, pressure, temperature,
+                   cell_volume, excess=None, old_void_fraction=None):
+    """Excess loading (molecules/uc) for a new void fraction, vectorized over all arguments.
+
+    :param absolute: absolute loading in molecules/uc
+    :param void_fraction: new helium void fraction
+    :param pressure: in Pa
+    :param temperature: in K
+    :param cell_volume: volume of the unit cell in A^3
+    :param excess: excess loading of the run in molecules/uc (NaN if unknown)
+    :param old_void_fraction: void fraction used in the run
+    """
+    absolute = np.asarray(absolute, dtype=float)
+    void_fraction = np.asarray(void_fraction, dtype=float)
+    bulk = ideal_gas_molecules(np.asarray(pressure, dtype=float),
+                               np.asarray(temperature, dtype=float),
+                               np.asarray(cell_volume, dtype=float))
+    if excess is not None and old_void_fraction is not None:
+        excess = np.asarray(excess, dtype=float)
+        old_void_fraction = np.asarray(old_void_fraction, dtype=float)
+        known = np.isfinite(excess) & (old_void_fraction > 0)
+        bulk = np.where(known,
+                        (absolute - excess) / np.where(known,
+                                                       old_void_fraction, 1),
+                        bulk)
+    return absolute - void_fraction * bulk
+
+
+def recompute_excess(results, void_fractions):
+    """Excess loadings of many workchains for new void fractions in one pass.
+
+    :param results: list of results dictionaries of ResubmitGCMC, GCMCMD or GCMCMD2
+    :param void_fractions: dict structure md5 -> new helium void fraction
+    :return: list of dicts run -> excess loading in mol/kg, None for results without the required data
+    """
+    rows = []
+    columns = {
+        key: []
+        for key in [
+            'absolute', 'excess', 'old_void_fraction', 'void_fraction',
+            'pressure', 'temperature', 'cell_volume', 'conversion'
+        ]
+    }
+    for i, result in enumerate(results):
+        try:
+            void_fraction = void_fractions[result['structure_md5']]
+            common = [
+                result['helium_void_fraction'], void_fraction,
+                result['pressure_pa'], result['temperature'],
+                result['cell_volume'],
+                result['conversion_factor_molec_uc_to_mol_kg']
+            ]
+            loadings = result['loading_averages']
+        except KeyError:
+            continue
+        excess = result.get('loading_excess_averages', {})
+        for run, absolute in loadings.items():
+            rows.append((i, run))
+            columns['absolute'].append(absolute)
+            value = excess.get(run)
+            columns['excess'].append(np.nan if value is None else value)
+            for key, value in zip([
+                    'old_void_fraction', 'void_fraction', 'pressure',
+                    'temperature', 'cell_volume', 'conversion'
+            ], common):
+                columns[key].append(value)
+
+    new_excess = excess_loading(columns['absolute'], columns['void_fraction'],
+                                columns['pressure'], columns['temperature'],
+                                columns['cell_volume'], columns['excess'],
+                                columns['old_void_fraction'])
+    new_excess = new_excess * np.asarray(columns['conversion'], dtype=float)
+
+    recomputed = [None] * len(results)
+    for (i, run), value in zip(rows, new_excess):
+        if recomputed[i] is None:
+            recomputed[i] = {}
+        recomputed[i][run] = float(value)
+    return recomputed
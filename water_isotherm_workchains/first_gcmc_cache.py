@@ -0,0 +1,98 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Reuse of the first (initialization) GCMC between workchains that simulate the same structure at the
+same pressure with the same parameters, e.g. ResubmitGCMC, GCMCMD and GCMCMD2 of one study.
+"""
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import copy
+import hashlib
+import json
+
+FIRST_GCMC_HASH_EXTRA = 'first_gcmc_hash'
+FIRST_GCMC_OUTPUTS = [
+    'component_0', 'output_parameters', 'retrieved_parent_folder'
+]
+
+
+def _file_md5(singlefile):
+    with open(singlefile.get_file_abs_path(), 'rb') as fh:
+        return hashlib.md5(fh.read()).hexdigest()
+
+
+def get_first_gcmc_hash(structure, pressure, parameters, block=None):
+    """Content hash of the first GCMC.
+
+    :param structure: CifData of the framework
+    :param pressure: pressure in Pa
+    :param parameters: RASPA parameter dictionary of the first GCMC
+    :param block: SinglefileData with the blocking spheres, hashed by content
+    :return: hex digest
+    """
+    parameters = copy.deepcopy(parameters)
+    parameters['GeneralSettings']['ExternalPressure'] = float(pressure)
+    key = {
+        'structure': structure.get_attr('md5'),
+        'parameters': parameters,
+        'block': _file_md5(block) if block is not None else None,
+    }
+    return hashlib.sha1(json.dumps(key,
+                                   sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def find_cached_first_gcmc(first_gcmc_hash):
+    """Return the most recent successful RaspaConvergeWorkChain (or RaspaCalculation of the lean mode)
+    with the given hash, None if there is none."""
+    from aiida.orm.calculation import Calculation
+    from aiida.orm.querybuilder import QueryBuilder
+
+    qb = QueryBuilder()
+    qb.append(Calculation,
+              filters={'extras.{}'.format(FIRST_GCMC_HASH_EXTRA): first_gcmc_hash},
+              tag='calc')
+    qb.order_by({'calc': {'ctime': 'desc'}})
+    for calc, in qb.iterall():
+        if calc.has_finished_ok():
+            return calc
+    return None
+
+
+def tag_first_gcmc(pk, first_gcmc_hash):
+    """Tag a submitted first GCMC such that later workchains can find it."""
+    from aiida.orm import load_node
+    load_node(pk).set_extra(FIRST_GCMC_HASH_EXTRA, first_gcmc_hash)
+
+
+def get_cached_outputs(calc):
+    """Outputs of a cached first GCMC in the form the workchains keep in self.ctx.raspa_loading."""
+    outputs = calc.get_outputs_dict()
+    if 'retrieved_parent_folder' not in outputs:
+        # RaspaCalculation of the lean mode
+        outputs['retrieved_parent_folder'] = outputs['retrieved']
+    return {key: outputs[key] for key in FIRST_GCMC_OUTPUTS}
+
+
+def reuse_first_gcmc(adopt, find_cached):
+    """Node of a first GCMC that does not need to run.
+
+    The step adopted from the failed workchain a workchain restarts from comes first: the cache usually
+    finds that same calculation (it was tagged at submission) and would leave it at the head of the
+    adoptable steps, such that all later steps are discarded.
+
+    :param adopt: callable returning the adopted node, None if there is nothing to adopt
+    :param find_cached: callable returning a cached first GCMC, None if there is none
+    :return: tuple ('adopted' or 'cached', node), (None, None) if the first GCMC has to run
+    """
+    adopted = adopt()
+    if adopted is not None:
+        return 'adopted', adopted
+    cached = find_cached()
+    if cached is not None:
+        return 'cached', cached
+    return None, None
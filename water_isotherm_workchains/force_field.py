@@ -0,0 +1,244 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Reader for the RASPA force field definitions (force_field_mixing_rules.def, pseudo_atoms.def and the
+molecule definitions) used by the Python tools and the checks at submission.
+
+The files are parsed into NumPy tables once per content: the tables are memoized by the md5 of the file,
+so the void fraction, the blocking and the checks of a study share them.
+"""
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import hashlib
+import os
+import re
+
+import numpy as np
+
+from water_isotherm_workchains.cif import read_cif
+
+MIXING_RULES_FILE = 'force_field_mixing_rules.def'
+PSEUDO_ATOMS_FILE = 'pseudo_atoms.def'
+
+# a molecule with a larger net charge (e) is an error in the definition
+CHARGE_TOLERANCE = 1e-4
+
+_CACHE = {}
+
+
+def parse_cached(path, parser):
+    """Result of parser(path), memoized by the content of the file."""
+    with open(path, 'rb') as fh:
+        md5 = hashlib.md5(fh.read()).hexdigest()
+    key = (parser.__name__, md5)
+    if key not in _CACHE:
+        _CACHE[key] = parser(path)
+    return _CACHE[key]
+
+
+def _data_lines(path):
+    with open(path) as fh:
+        return [
+            line.strip() for line in fh
+            if line.strip() and not line.strip().startswith('#')
+        ]
+
+
+def _parse_mixing_rules(path):
+    lines = _data_lines(path)
+    number_interactions = int(lines[2])
+    names, types, parameters = [], [], []
+    for line in lines[3:3 + number_interactions]:
+        tokens = line.split()
+        names.append(tokens[0])
+        types.append(tokens[1].lower())
+        values = [float(x) for x in tokens[2:4]]
+        parameters.append(values + [0.0] * (2 - len(values)))
+    parameters = np.array(parameters, dtype=float).reshape(-1, 2)
+    return {
+        'shifted': lines[0].lower() == 'shifted',
+        'tail_corrections': lines[1].lower() == 'yes',
+        'names': np.array(names),
+        'types': np.array(types),
+        'epsilon': parameters[:, 0],
+        'sigma': parameters[:, 1],
+        'mixing_rule': lines[3 + number_interactions],
+    }
+
+
+def _parse_pseudo_atoms(path):
+    lines = _data_lines(path)
+    rows = [line.split() for line in lines[1:1 + int(lines[0])]]
+    return {
+        'names': np.array([row[0] for row in rows]),
+        'mass': np.array([float(row[5]) for row in rows]),
+        'charge': np.array([float(row[6]) for row in rows]),
+    }
+
+
+def _parse_molecule(path):
+    lines = _data_lines(path)
+    # critical constants, number of atoms, number of groups, then for every group its type, number of
+    # atoms and the atoms
+    rows = []
+    i = 5
+    for _ in range(int(lines[4])):
+        number_group_atoms = int(lines[i + 1])
+        rows += [
+            line.split() for line in lines[i + 2:i + 2 + number_group_atoms]
+        ]
+        i += 2 + number_group_atoms
+    return {
+        'critical_temperature': float(lines[0]),
+        'critical_pressure': float(lines[1]),
+        'acentric_factor': float(lines[2]),
+        'atoms': np.array([row[1] for row in rows]),
+        'positions': np.array([[float(x) for x in row[2:5]]
+                               if len(row) >= 5 else [np.nan] * 3
+                               for row in rows]),
+    }
+
+
+def read_mixing_rules(force_field_dir):
+    """Read force_field_mixing_rules.def.
+
+    :return: dict with 'shifted' (bool), 'tail_corrections' (bool), 'mixing_rule' and the arrays 'names',
+             'types', 'epsilon' (K) and 'sigma' (A) of the interactions in the order of the file
+    """
+    return parse_cached(os.path.join(force_field_dir, MIXING_RULES_FILE),
+                        _parse_mixing_rules)
+
+
+def read_pseudo_atoms(force_field_dir):
+    """Read pseudo_atoms.def.
+
+    :return: dict with the arrays 'names', 'mass' and 'charge'
+    """
+    return parse_cached(os.path.join(force_field_dir, PSEUDO_ATOMS_FILE),
+                        _parse_pseudo_atoms)
+
+
+def read_molecule(path):
+    """Read a RASPA molecule definition.
+
+    :return: dict with the critical constants, the array 'atoms' of pseudo atoms and their 'positions'
+    """
+    return parse_cached(path, _parse_molecule)
+
+
+def pseudo_atom_name(label):
+    """Pseudo atom of a CIF atom label, RASPA with RemoveAtomNumberCodeFromLabel ('Zr1' -> 'Zr')."""
+    return re.match(r'[^\d]*', label).group(0)
+
+
+def matches(name, pseudo_atom):
+    """Check if an interaction name matches a pseudo atom, a trailing '_' is a wildcard."""
+    if name.endswith('_'):
+        return pseudo_atom.startswith(name[:-1])
+    return name == pseudo_atom
+
+
+def interaction_index(mixing_rules, pseudo_atom):
+    """Index of the interaction of a pseudo atom, later matches override earlier ones, None if none matches."""
+    for i in range(len(mixing_rules['names']) - 1, -1, -1):
+        if matches(mixing_rules['names'][i], pseudo_atom):
+            return i
+    return None
+
+
+def lennard_jones(mixing_rules, pseudo_atom):
+    """Lennard-Jones epsilon (K) and sigma (A) of a pseudo atom.
+
+    :return: tuple (epsilon, sigma), (0, 0) for 'none', None if no interaction matches
+    """
+    i = interaction_index(mixing_rules, pseudo_atom)
+    if i is None:
+        return None
+    if mixing_rules['types'][i] == 'none':
+        return 0.0, 0.0
+    if mixing_rules['types'][i] != 'lennard-jones':
+        raise ValueError('interaction {} of {} is not supported'.format(
+            mixing_rules['types'][i], mixing_rules['names'][i]))
+    return mixing_rules['epsilon'][i], mixing_rules['sigma'][i]
+
+
+def lennard_jones_table(mixing_rules, pseudo_atoms):
+    """Lennard-Jones parameters of many pseudo atoms.
+
+    :return: arrays epsilon (K) and sigma (A)
+    :raises ValueError: if a pseudo atom has no parameters
+    """
+    unique = sorted(set(pseudo_atoms))
+    parameters = {name: lennard_jones(mixing_rules, name) for name in unique}
+    missing = [name for name in unique if parameters[name] is None]
+    if missing:
+        raise ValueError('no Lennard-Jones parameters for {}'.format(
+            ', '.join(missing)))
+    table = np.array([parameters[name] for name in pseudo_atoms],
+                     dtype=float).reshape(-1, 2)
+    return table[:, 0], table[:, 1]
+
+
+def lorentz_berthelot(epsilon_i, sigma_i, epsilon_j, sigma_j):
+    """Mixed Lennard-Jones parameters."""
+    return np.sqrt(epsilon_i * epsilon_j), (sigma_i + sigma_j) / 2.0
+
+
+def net_charge(molecule, pseudo_atoms):
+    """Net charge (e) of a molecule from the charges of its pseudo atoms."""
+    names = list(pseudo_atoms['names'])
+    return float(
+        sum(pseudo_atoms['charge'][names.index(atom)]
+            for atom in molecule['atoms']))
+
+
+def check_force_field(force_field_dir, cif_paths=(), molecule_paths=()):
+    """Check that the force field has parameters for all atoms of the structures and molecules.
+
+    :param force_field_dir: directory with force_field_mixing_rules.def and pseudo_atoms.def
+    :param cif_paths: CIF files of the frameworks
+    :param molecule_paths: molecule definitions of the adsorbates
+    :return: list of problems, empty if everything is defined
+    """
+    mixing_rules = read_mixing_rules(force_field_dir)
+    pseudo_atoms = read_pseudo_atoms(force_field_dir)
+    problems = []
+
+    for path in cif_paths:
+        framework_atoms = set(
+            pseudo_atom_name(atom['label'])
+            for atom in parse_cached(path, read_cif)['atoms'])
+        missing = sorted(atom for atom in framework_atoms
+                         if interaction_index(mixing_rules, atom) is None)
+        if missing:
+            problems.append('{}: no interactions for {}'.format(
+                os.path.basename(path), ', '.join(missing)))
+
+    for path in molecule_paths:
+        molecule = read_molecule(path)
+        atoms = sorted(set(molecule['atoms']))
+        undefined = [
+            atom for atom in atoms if atom not in pseudo_atoms['names']
+        ]
+        no_interaction = [
+            atom for atom in atoms
+            if interaction_index(mixing_rules, atom) is None
+        ]
+        if undefined:
+            problems.append('{}: {} not in {}'.format(
+                os.path.basename(path), ', '.join(undefined),
+                PSEUDO_ATOMS_FILE))
+        if no_interaction:
+            problems.append('{}: no interactions for {}'.format(
+                os.path.basename(path), ', '.join(no_interaction)))
+        if not undefined:
+            charge = net_charge(molecule, pseudo_atoms)
+            if abs(charge) > CHARGE_TOLERANCE:
+                problems.append('{}: net charge {:.4f} e'.format(
+                    os.path.basename(path), charge))
+    return problems
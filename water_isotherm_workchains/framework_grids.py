@@ -0,0 +1,137 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Helpers for precomputing RASPA tabulated framework grids.
+
+The framework is rigid, hence the host-adsorbate interactions can be tabulated once per
+structure, force field and cutoff (RASPA SimulationType MakeGrid) and every later GCMC/MD
+run can use them with UseTabularGrid. Note that RASPA stores the grids in its share
+directory on the remote, i.e. all runs using the grids need to use the same RASPA installation.
+
+RASPA writes the grids to share/raspa/grids/<Forcefield>/<FrameworkName>/<spacing> and aiida-raspa
+names every framework 'framework', so the grids of different structures would overwrite each other.
+The runs using a grid therefore use a force field name unique to the grid hash, a symbolic link to
+the actual force field directory that is created in the job script before RASPA starts.
+"""
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import copy
+import hashlib
+import json
+
+GRID_HASH_EXTRA = 'framework_grid_hash'
+
+# the force field of a grid is <Forcefield>_grid_<first characters of the hash>
+GRID_FORCEFIELD_SEPARATOR = '_grid_'
+
+
+def get_grid_hash(structure, parameters, spacing, pseudo_atoms, code):
+    """Content hash of everything that determines the framework grid.
+
+    :param structure: CifData of the framework
+    :param parameters: RASPA parameter dictionary (with GeneralSettings)
+    :param spacing: grid spacing in Angstrom
+    :param pseudo_atoms: list of pseudo atoms for which grids are computed
+    :param code: RASPA code, the grids only exist in the share directory of its installation
+    :return: hex digest
+    """
+    general_settings = parameters['GeneralSettings']
+    key = {
+        'structure': structure.get_attr('md5'),
+        'forcefield': general_settings.get('Forcefield'),
+        'cutoff': general_settings.get('CutOff'),
+        'charges': general_settings.get('UseChargesFromCIFFile', 'no'),
+        'unitcells': general_settings.get('UnitCells', '1 1 1'),
+        'spacing': float(spacing),
+        'pseudo_atoms': sorted(pseudo_atoms),
+        'code': code.uuid,
+    }
+    return hashlib.sha1(json.dumps(key,
+                                   sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def find_cached_grid(grid_hash):
+    """Return the most recent finished grid calculation with the given hash, None if there is none."""
+    from aiida.orm.calculation.job import JobCalculation
+    from aiida.orm.querybuilder import QueryBuilder
+
+    qb = QueryBuilder()
+    qb.append(JobCalculation,
+              filters={'extras.{}'.format(GRID_HASH_EXTRA): grid_hash},
+              tag='calc')
+    qb.order_by({'calc': {'ctime': 'desc'}})
+    for calc, in qb.iterall():
+        if grid_calc_ok(calc):
+            return calc
+    return None
+
+
+def grid_calc_ok(calc):
+    """Check if RASPA wrote the grids.
+
+    The RASPA parser does not know about MakeGrid output, hence a failed parsing is fine
+    as long as the calculation itself finished."""
+    from aiida.common.datastructures import calc_states
+    return calc.get_state() in (calc_states.FINISHED,
+                                calc_states.PARSINGFAILED)
+
+
+def grid_forcefield(forcefield, grid_hash):
+    """Force field name under which the grids of a hash are stored."""
+    forcefield = forcefield.rsplit(GRID_FORCEFIELD_SEPARATOR, 1)[0]
+    return '{}{}{}'.format(forcefield, GRID_FORCEFIELD_SEPARATOR,
+                           grid_hash[:16])
+
+
+def grid_options(options, parameters):
+    """Scheduler options of a RASPA run, with the link of the grid force field name to the actual
+    force field prepended to the job script if the run uses one.
+
+    RASPA finds its share directory with the RASPA_DIR environment variable, the link is created there.
+    """
+    forcefield = parameters['GeneralSettings'].get('Forcefield', '')
+    if GRID_FORCEFIELD_SEPARATOR not in forcefield:
+        return options
+    base = forcefield.rsplit(GRID_FORCEFIELD_SEPARATOR, 1)[0]
+    link = 'ln -sfn "$RASPA_DIR/share/raspa/forcefield/{}" ' \
+        '"$RASPA_DIR/share/raspa/forcefield/{}"'.format(base, forcefield)
+    options = copy.deepcopy(options) or {}
+    options['prepend_text'] = '\n'.join(
+        text for text in [options.get('prepend_text'), link] if text)
+    return options
+
+
+def make_grid_parameters(parameters, spacing, pseudo_atoms, grid_hash):
+    """Turn GCMC parameters into the input of a RASPA MakeGrid calculation."""
+    grid_parameters = copy.deepcopy(parameters)
+    general_settings = grid_parameters['GeneralSettings']
+    general_settings['Forcefield'] = grid_forcefield(
+        general_settings['Forcefield'], grid_hash)
+    general_settings['SimulationType'] = 'MakeGrid'
+    general_settings['NumberOfCycles'] = 0
+    general_settings['NumberOfInitializationCycles'] = 0
+    general_settings['ComputeRDF'] = 'no'
+    general_settings.pop('WriteRDFEvery', None)
+    general_settings['SpacingVDWGrid'] = spacing
+    general_settings['SpacingCoulombGrid'] = spacing
+    general_settings['NumberOfGrids'] = len(pseudo_atoms)
+    general_settings['GridTypes'] = ' '.join(pseudo_atoms)
+    # the grid is a property of the framework only
+    grid_parameters['Component'] = []
+    return grid_parameters
+
+
+def use_grid_parameters(parameters, spacing, grid_hash):
+    """Instruct RASPA to use the tabulated framework grids of a hash."""
+    general_settings = parameters['GeneralSettings']
+    general_settings['Forcefield'] = grid_forcefield(
+        general_settings['Forcefield'], grid_hash)
+    general_settings['UseTabularGrid'] = 'yes'
+    general_settings['SpacingVDWGrid'] = spacing
+    general_settings['SpacingCoulombGrid'] = spacing
+    return parameters
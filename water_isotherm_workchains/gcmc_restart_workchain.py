@@ -7,14 +7,39 @@ __email__ = 'kevin.jablonka@epfl.ch'
 __version__ = '0.1.0'
 __status__ = 'Dev'
 
-from aiida.orm import CalculationFactory, DataFactory
+import copy
+
+from aiida.orm import CalculationFactory, DataFactory, load_node
 from aiida.orm.code import Code
 from aiida.orm.data.base import Float
 from aiida.work.run import submit
-from aiida.work.workchain import WorkChain, ToContext, while_, Outputs
+from aiida.work.workchain import WorkChain, ToContext, while_, if_, Outputs
 from aiida_raspa.workflows import RaspaConvergeWorkChain
+from water_isotherm_workchains.framework_grids import GRID_HASH_EXTRA, get_grid_hash, find_cached_grid, \
+    grid_calc_ok, make_grid_parameters, use_grid_parameters, grid_options
+from water_isotherm_workchains.widom import widom_parameters, number_unitcells, henry_loading, \
+    enthalpy_at_infinite_dilution
+from water_isotherm_workchains.equilibration import is_equilibrated
+from water_isotherm_workchains.raspa_output import get_output_content, parse_lambda_histogram, parse_histogram
+from water_isotherm_workchains.cfcmc import cfcmc_parameters, set_biasing_factors, update_biasing_factors
+from water_isotherm_workchains.reweighting import HISTOGRAM_RETRIEVE_LIST, histogram_parameters
+from water_isotherm_workchains.first_gcmc_cache import FIRST_GCMC_HASH_EXTRA, get_first_gcmc_hash, \
+    find_cached_first_gcmc, tag_first_gcmc, get_cached_outputs, reuse_first_gcmc
+from water_isotherm_workchains.configuration_library import add_to_library, find_warm_start
+from water_isotherm_workchains.walltime import get_training_data, fit_walltime_model, features, \
+    predicted_options
+from water_isotherm_workchains.cif import read_cif, cell_volume
+from water_isotherm_workchains.excess import molec_uc_to_mol_kg
+from water_isotherm_workchains.recovery import RASPA_OUTPUTS, raspa_outputs, hit_walltime, increase_walltime, \
+    get_adoptable, RESTART_EXTRA, DISCARDED_EXTRA
+from water_isotherm_workchains.void_fraction import helium_void_fraction
+from water_isotherm_workchains.blocking import block_pockets, make_block_node
+from water_isotherm_workchains.segments import get_segment_times, next_segment_cycles
+from water_isotherm_workchains.move_tuning import get_moves, extract_acceptance, parse_move_timings, \
+    tune_move_probabilities
 
 ZeoppCalculation = CalculationFactory('zeopp.network')
+RaspaCalculation = CalculationFactory('raspa')
 
 # data objects
 ArrayData = DataFactory('array')
@@ -56,6 +81,15 @@ class ResubmitGCMC(WorkChain):
                    valid_type=dict,
                    default=None,
                    required=False)
+        # options of the stages, _raspa_options if not given
+        spec.input("_raspa_first_gcmc_options",
+                   valid_type=dict,
+                   default=None,
+                   required=False)
+        spec.input("_raspa_gcmc_options",
+                   valid_type=dict,
+                   default=None,
+                   required=False)
 
         # settings
         spec.input("_usecharges",
@@ -63,17 +97,194 @@ class ResubmitGCMC(WorkChain):
                    default=True,
                    required=False)
 
+        # precomputed framework grids
+        spec.input("_usegrids",
+                   valid_type=bool,
+                   default=False,
+                   required=False)
+        spec.input("_grid_spacing",
+                   valid_type=float,
+                   default=0.1,
+                   required=False)
+        spec.input("_grid_pseudo_atoms",
+                   valid_type=list,
+                   default=['Ow', 'Hw', 'Mw'],
+                   required=False)
+
+        # Widom insertion before the GCMC
+        spec.input("_usewidom",
+                   valid_type=bool,
+                   default=False,
+                   required=False)
+        spec.input("_widom_cycles",
+                   valid_type=int,
+                   default=2000,
+                   required=False)
+        # skip the GCMC if the Henry loading (molecules/uc) is below this value
+        spec.input("_henry_loading_threshold",
+                   valid_type=float,
+                   default=0.0,
+                   required=False)
+        # maximum number of molecules to seed the first GCMC with
+        spec.input("_henry_max_seed",
+                   valid_type=int,
+                   default=100,
+                   required=False)
+
+        # equilibrate in chunks instead of a fixed number of initialization cycles
+        spec.input("_auto_equilibration",
+                   valid_type=bool,
+                   default=False,
+                   required=False)
+        spec.input("_equilibration_chunk_cycles",
+                   valid_type=int,
+                   default=1000,
+                   required=False)
+        spec.input("_equilibration_min_chunks",
+                   valid_type=int,
+                   default=4,
+                   required=False)
+        spec.input("_equilibration_max_chunks",
+                   valid_type=int,
+                   default=40,
+                   required=False)
+
+        # continuous fractional component insertions of the adsorbate
+        spec.input("_usecfcmc",
+                   valid_type=bool,
+                   default=False,
+                   required=False)
+        spec.input("_cfcmc_lambda_bins",
+                   valid_type=int,
+                   default=10,
+                   required=False)
+
+        # tune the MC move probabilities between the GCMC runs
+        spec.input("_tune_moves",
+                   valid_type=bool,
+                   default=False,
+                   required=False)
+
+        # number-of-molecules and energy histograms for histogram reweighting
+        spec.input("_compute_histograms",
+                   valid_type=bool,
+                   default=False,
+                   required=False)
+        spec.input("_histogram_max_molecules",
+                   valid_type=int,
+                   default=1000,
+                   required=False)
+
+        # reuse an identical first GCMC of another workchain
+        spec.input("_cache_first_gcmc",
+                   valid_type=bool,
+                   default=False,
+                   required=False)
+
+        # library of equilibrated configurations
+        spec.input("_warm_start",
+                   valid_type=bool,
+                   default=False,
+                   required=False)
+        spec.input("_warm_start_initialization_cycles",
+                   valid_type=int,
+                   default=2000,
+                   required=False)
+        spec.input("_store_configuration",
+                   valid_type=bool,
+                   default=False,
+                   required=False)
+
+        # request the predicted wall time of every RASPA run instead of a fixed one
+        spec.input("_predict_walltime",
+                   valid_type=bool,
+                   default=False,
+                   required=False)
+        spec.input("_walltime_safety_factor",
+                   valid_type=float,
+                   default=1.5,
+                   required=False)
+
+        # submit the GCMC and MD segments as RaspaCalculation instead of RaspaConvergeWorkChain
+        spec.input("_lean_raspa",
+                   valid_type=bool,
+                   default=False,
+                   required=False)
+        spec.input("_raspa_max_attempts",
+                   valid_type=int,
+                   default=2,
+                   required=False)
+
+        # compute the blocking spheres with NumPy instead of zeo++ (needs zeopp_atomic_radii)
+        spec.input("_python_block",
+                   valid_type=bool,
+                   default=False,
+                   required=False)
+
+        # directory with the force_field_mixing_rules.def of the force field, if given the helium void
+        # fraction is computed on a grid instead of using POAV
+        spec.input("_helium_force_field_dir",
+                   valid_type=str,
+                   default=None,
+                   required=False)
+        # precomputed helium void fraction (e.g. by water-isotherm submit), used instead of POAV
+        spec.input("_helium_void_fraction",
+                   valid_type=float,
+                   default=None,
+                   required=False)
+
+        # pk of a failed workchain with the same inputs, its successful steps are adopted
+        spec.input("_restart_from",
+                   valid_type=int,
+                   default=None,
+                   required=False)
+
+        # adapt the length of the GCMC segments to the queue wait
+        spec.input("_adaptive_segments",
+                   valid_type=bool,
+                   default=False,
+                   required=False)
+        # runtime of a segment / queue wait we aim for
+        spec.input("_segment_wait_ratio",
+                   valid_type=float,
+                   default=2.0,
+                   required=False)
+        spec.input("_min_segment_cycles",
+                   valid_type=int,
+                   default=200,
+                   required=False)
+        spec.input("_max_segment_cycles",
+                   valid_type=int,
+                   default=20000,
+                   required=False)
+
         # workflow
         spec.outline(
             cls.init,
             cls.run_zeopp,  # computes volpo and block pockets
             cls.init_raspa_calc,  # assign HeliumVoidFraction=POAV
-            cls.run_first_gcmc,
-            cls.parse_loading_raspa,
-            while_(cls.should_run_loading_raspa)(
-                cls.
-                run_loading_raspa,  # for each run, recover the last snapshot of the previous and run GCMC
+            if_(cls.should_make_grid)(
+                cls.run_make_grid,  # tabulate the framework once per structure, force field and cutoff
+                cls.inspect_make_grid,
+            ),
+            if_(cls.should_run_widom)(
+                cls.run_widom,  # Henry coefficient and enthalpy at infinite dilution
+                cls.parse_widom,
+            ),
+            if_(cls.should_run_gcmc)(
+                while_(cls.should_run_equilibration)(
+                    cls.run_equilibration,  # short GCMC chunks until the loading is stationary
+                    cls.inspect_equilibration,
+                ),
+                cls.run_first_gcmc,
+                while_(cls.should_retry_raspa)(cls.retry_raspa),
                 cls.parse_loading_raspa,
+                while_(cls.should_run_loading_raspa)(
+                    cls.
+                    run_loading_raspa,  # for each run, recover the last snapshot of the previous and run GCMC
+                    while_(cls.should_retry_raspa)(cls.retry_raspa),
+                    cls.parse_loading_raspa,
+                ),
             ),
             cls.return_results,
         )
@@ -87,6 +298,7 @@ class ResubmitGCMC(WorkChain):
         self.ctx.number_runs = self.inputs.number_runs
         self.ctx.current_run = -1  # start at minus one for the first GCMC with initalization cycle
         self.ctx.loading = {}
+        self.ctx.loading_excess = {}
         self.ctx.loading_dev = {}
         self.ctx.enthalpy_of_adsorption = {}
         self.ctx.enthalpy_of_adsorption_dev = {}
@@ -133,10 +345,66 @@ class ResubmitGCMC(WorkChain):
             self.ctx.raspa_parameters_gcmc_0['GeneralSettings'][
                 'UseChargesFromCIFFile'] = "no"
 
+        if self.inputs._usecfcmc:
+            self.ctx.cf_biasing_factors = [0.0
+                                           ] * self.inputs._cfcmc_lambda_bins
+            cfcmc_parameters(self.ctx.raspa_parameters_gcmc,
+                             self.inputs._cfcmc_lambda_bins)
+            cfcmc_parameters(self.ctx.raspa_parameters_gcmc_0,
+                             self.inputs._cfcmc_lambda_bins)
+        else:
+            self.ctx.cf_biasing_factors = None
+
+        if self.inputs._compute_histograms:
+            histogram_parameters(self.ctx.raspa_parameters_gcmc,
+                                 self.inputs._histogram_max_molecules)
+            histogram_parameters(self.ctx.raspa_parameters_gcmc_0,
+                                 self.inputs._histogram_max_molecules)
+        self.ctx.number_of_molecules_histograms = {}
+        self.ctx.energy_histograms = {}
+
         self.ctx.restart_raspa_calc = None
+        # only configurations of our own GCMC runs go into the library, not a warm start
+        self.ctx.own_configuration = False
+        self.ctx.henry_coefficient = None
+        self.ctx.first_gcmc_hash = None
+        self.ctx.move_probabilities = {}
+        self.ctx.henry_regime = False
+        self.ctx.inaccessible = False
+        self.ctx.equilibration_loading = []
+        self.ctx.equilibrated = False
+        self.ctx.equilibration_start = None
+
+        self.ctx.number_atoms = len(
+            read_cif(self.ctx.structure.get_file_abs_path())['atoms'])
+        self.ctx.adoptable = []
+        if self.inputs._restart_from is not None:
+            self.calc.set_extra(RESTART_EXTRA, self.inputs._restart_from)
+            self.ctx.adoptable = get_adoptable(self.inputs._restart_from)
+            self.report(
+                "Restarting from workchain <{}>, {} successful steps to adopt".
+                format(self.inputs._restart_from, len(self.ctx.adoptable)))
+        self.ctx.walltime_model = None
+        if self.inputs._predict_walltime:
+            self.ctx.walltime_model = fit_walltime_model(*get_training_data())
+            if self.ctx.walltime_model is None:
+                self.report(
+                    "Not enough finished RASPA calculations to predict the wall time"
+                )
+
+        self.ctx.remaining_cycles = None
+        self.ctx.next_segment_cycles = self.ctx.raspa_parameters_gcmc[
+            'GeneralSettings']['NumberOfCycles']
+        self.ctx.segment_cycles = {}
+        self.ctx.segment_times = {}
 
     def run_zeopp(self):
         """Main function that performs zeo++ VOLPO and block calculations."""
+        adopted = self._adopt("ZeoppVolpoBlock")
+        if adopted is not None:
+            self.ctx.zeopp = adopted.get_outputs_dict()
+            return
+
         params = {
             'ha':
             True,
@@ -148,6 +416,9 @@ class ResubmitGCMC(WorkChain):
                 self.inputs.zeopp_probe_radius.value, 100000
             ]
         }
+        if self._python_block():
+            # the blocking spheres are computed in init_raspa_calc
+            del params['block']
 
         inputs = {
             'code': self.inputs.zeopp_code,
@@ -171,15 +442,185 @@ class ResubmitGCMC(WorkChain):
                 running.pid))
         return ToContext(zeopp=Outputs(running))
 
+    def _python_block(self):
+        """Check if the blocking spheres are computed with NumPy instead of zeo++."""
+        return self.inputs._python_block and 'zeopp_atomic_radii' in self.inputs
+
     def init_raspa_calc(self):
         """Parse the output of Zeo++ and instruct the input for Raspa. """
+        # Nothing can adsorb without probe-accessible volume, skip all RASPA runs
+        if self.ctx.zeopp['output_parameters'].get_dict(
+        )['POAV_Volume_fraction'] == 0:
+            self.ctx.inaccessible = True
+            self.report(
+                "No probe-accessible volume, returning zero loading without RASPA"
+            )
+            return
+
+        if self._python_block():
+            spheres = block_pockets(
+                self.ctx.structure.get_file_abs_path(),
+                self.inputs.zeopp_atomic_radii.get_file_abs_path(),
+                self.inputs.zeopp_probe_radius.value)
+            self.ctx.zeopp['block'] = make_block_node(spheres)
+            self.ctx.number_blocking_spheres = len(spheres)
+            self.report(
+                "pk: {} | {} blocking spheres computed with NumPy".format(
+                    self.ctx.zeopp['block'].pk, len(spheres)))
+
         # Use probe-occupiable available void fraction as the helium void fraction (for excess uptake)
+        poav = self.ctx.zeopp['output_parameters'].get_dict(
+        )['POAV_Volume_fraction']
+        void_fraction = poav
+        if self.inputs._helium_void_fraction is not None:
+            void_fraction = self.inputs._helium_void_fraction
+        elif self.inputs._helium_force_field_dir is not None:
+            # no process pool inside the daemon
+            void_fraction = helium_void_fraction(
+                self.ctx.structure.get_file_abs_path(),
+                self.inputs._helium_force_field_dir,
+                cutoff=self.ctx.raspa_parameters_gcmc['GeneralSettings'].get(
+                    'CutOff', 12.0),
+                processes=1)
+        if void_fraction != poav:
+            self.report("Helium void fraction {:.4f} (POAV {:.4f})".format(
+                void_fraction, poav))
         self.ctx.raspa_parameters_gcmc_0['GeneralSettings'][
-            'HeliumVoidFraction'] = self.ctx.zeopp[
-                'output_parameters'].get_dict()['POAV_Volume_fraction']
+            'HeliumVoidFraction'] = void_fraction
         self.ctx.raspa_parameters_gcmc['GeneralSettings'][
-            'HeliumVoidFraction'] = self.ctx.zeopp[
-                'output_parameters'].get_dict()['POAV_Volume_fraction']
+            'HeliumVoidFraction'] = void_fraction
+
+        if self.inputs._warm_start:
+            folder, pressure = find_warm_start(
+                self.ctx.structure, self.ctx.raspa_parameters_gcmc_0,
+                self.ctx.pressure.value)
+            if folder is not None:
+                self.ctx.restart_raspa_calc = folder
+                self.ctx.raspa_parameters_gcmc_0['GeneralSettings'][
+                    'NumberOfInitializationCycles'] = self.inputs._warm_start_initialization_cycles
+                self.report(
+                    "Warm start from the configuration at {} Pa <{}>".format(
+                        pressure, folder.pk))
+
+    def should_make_grid(self):
+        """Check if we need to compute the framework grids or if we can reuse cached ones."""
+        if not self.inputs._usegrids or self.ctx.inaccessible:
+            return False
+
+        self.ctx.grid_hash = get_grid_hash(self.ctx.structure,
+                                           self.ctx.raspa_parameters_gcmc_0,
+                                           self.inputs._grid_spacing,
+                                           self.inputs._grid_pseudo_atoms,
+                                           self.inputs.raspa_code)
+        cached_grid = find_cached_grid(self.ctx.grid_hash)
+        if cached_grid is not None:
+            self.report("Reusing framework grids from calculation <{}>".format(
+                cached_grid.pk))
+            self._use_grids()
+            return False
+        return True
+
+    def run_make_grid(self):
+        """Run RASPA MakeGrid for the framework."""
+        parameters = ParameterData(dict=make_grid_parameters(
+            self.ctx.raspa_parameters_gcmc_0, self.inputs._grid_spacing,
+            self.inputs._grid_pseudo_atoms, self.ctx.grid_hash)).store()
+        inputs = {
+            'code': self.inputs.raspa_code,
+            'structure': self.ctx.structure,
+            'parameters': parameters,
+            '_options': grid_options(self.inputs._raspa_options,
+                                     parameters.get_dict()),
+            '_label': "make_grid_raspa",
+        }
+
+        running = submit(RaspaCalculation.process(), **inputs)
+        self.report("pk: {} | Running RASPA MakeGrid".format(running.pid))
+        return ToContext(make_grid=running)
+
+    def inspect_make_grid(self):
+        """Tag the grid calculation with its hash such that later runs can reuse it."""
+        if grid_calc_ok(self.ctx.make_grid):
+            self.ctx.make_grid.set_extra(GRID_HASH_EXTRA, self.ctx.grid_hash)
+            self._use_grids()
+        else:
+            self.report(
+                "RASPA MakeGrid <{}> failed, continuing without framework grids"
+                .format(self.ctx.make_grid.pk))
+
+    def _use_grids(self):
+        """Switch all RASPA runs to the tabulated framework grids."""
+        use_grid_parameters(self.ctx.raspa_parameters_gcmc,
+                            self.inputs._grid_spacing, self.ctx.grid_hash)
+        use_grid_parameters(self.ctx.raspa_parameters_gcmc_0,
+                            self.inputs._grid_spacing, self.ctx.grid_hash)
+
+    def should_run_widom(self):
+        """Run the Widom insertion only if requested."""
+        return self.inputs._usewidom and not self.ctx.inaccessible
+
+    def run_widom(self):
+        """Run a Widom insertion to get the Henry coefficient of the adsorbate."""
+        adopted = self._adopt("run_widom_raspa")
+        if adopted is not None:
+            self.ctx.raspa_widom = adopted.get_outputs_dict()
+            return
+
+        parameters = ParameterData(dict=widom_parameters(
+            self.ctx.raspa_parameters_gcmc_0, self.inputs._widom_cycles)).store()
+        inputs = {
+            'code': self.inputs.raspa_code,
+            'structure': self.ctx.structure,
+            'parameters': parameters,
+            '_options': self._get_raspa_options(parameters.get_dict(), 'gcmc'),
+            '_label': "run_widom_raspa",
+        }
+        # Check if there are pocket blocks to be loaded
+        try:
+            inputs['block_component_0'] = self.ctx.zeopp['block']
+        except Exception:
+            pass
+
+        running = submit(RaspaConvergeWorkChain, **inputs)
+        self.report("pk: {} | Running RASPA Widom insertion".format(
+            running.pid))
+        return ToContext(raspa_widom=Outputs(running))
+
+    def parse_widom(self):
+        """Predict the loading from the Henry coefficient. Skip the GCMC in the Henry regime,
+        otherwise seed the first GCMC with the predicted number of molecules."""
+        component = self.ctx.raspa_widom['component_0'].get_dict()
+        self.ctx.henry_coefficient = component['henry_coefficient_average']
+        self.ctx.henry_coefficient_dev = component['henry_coefficient_dev']
+        self.ctx.enthalpy_of_adsorption_widom = enthalpy_at_infinite_dilution(
+            component['adsorption_energy_widom_average'],
+            self.ctx.raspa_parameters_gcmc_0['GeneralSettings']
+            ['ExternalTemperature'])
+        self.ctx.conversion_factor_molec_uc_to_mol_kg = component[
+            'conversion_factor_molec_uc_to_mol_kg']
+        self.ctx.henry_loading = henry_loading(
+            self.ctx.henry_coefficient, self.ctx.pressure.value,
+            self.ctx.conversion_factor_molec_uc_to_mol_kg)
+
+        if self.ctx.henry_loading < self.inputs._henry_loading_threshold:
+            self.ctx.henry_regime = True
+            self.report(
+                "Henry loading {} molecules/uc is below the threshold, skipping GCMC"
+                .format(self.ctx.henry_loading))
+        elif self.ctx.restart_raspa_calc is None:
+            seed = min(
+                int(
+                    round(self.ctx.henry_loading *
+                          number_unitcells(self.ctx.raspa_parameters_gcmc_0))),
+                self.inputs._henry_max_seed)
+            self.ctx.raspa_parameters_gcmc_0['Component'][0][
+                'CreateNumberOfMolecules'] = seed
+            self.report(
+                "Seeding the first GCMC with {} molecules".format(seed))
+
+    def should_run_gcmc(self):
+        """Run the GCMC unless the Widom insertion showed that we are in the Henry regime."""
+        return not self.ctx.henry_regime and not self.ctx.inaccessible
 
     def should_run_loading_raspa(self):
         """We run another raspa calculation only if the current iteration is smaller than
@@ -187,8 +628,82 @@ class ResubmitGCMC(WorkChain):
         self.report(
             'checking if need to run more cycle. Total number of runs {}, current run {}'
             .format(self.ctx.number_runs, self.ctx.current_run))
+        if self.inputs._adaptive_segments:
+            return self.ctx.remaining_cycles > 0
         return self.ctx.current_run < self.ctx.number_runs
 
+    def should_run_equilibration(self):
+        """Run another equilibration chunk until the loading is stationary or the budget is used."""
+        if not self.inputs._auto_equilibration or self.ctx.equilibrated:
+            return False
+        if len(self.ctx.equilibration_loading
+               ) >= self.inputs._equilibration_max_chunks:
+            self.report(
+                "Loading not stationary after {} equilibration chunks, continuing anyway"
+                .format(len(self.ctx.equilibration_loading)))
+            return False
+        return True
+
+    def run_equilibration(self):
+        """Run a short GCMC chunk without initialization cycles, restarting from the previous one."""
+        parameters = copy.deepcopy(self.ctx.raspa_parameters_gcmc_0)
+        parameters['GeneralSettings']['ExternalPressure'] = self.ctx.pressure
+        parameters['GeneralSettings']["NumberOfInitializationCycles"] = 0
+        parameters['GeneralSettings'][
+            "NumberOfCycles"] = self.inputs._equilibration_chunk_cycles
+        parameters['GeneralSettings']['ComputeRDF'] = 'no'
+        parameters['GeneralSettings'].pop('WriteRDFEvery', None)
+
+        inputs = {
+            'code': self.inputs.raspa_code,
+            'structure': self.ctx.structure,
+            'parameters': ParameterData(dict=parameters).store(),
+            '_options': self._get_raspa_options(parameters, 'gcmc'),
+            '_label': "run_equilibration_raspa",
+        }
+        # Check if there are pocket blocks to be loaded
+        try:
+            inputs['block_component_0'] = self.ctx.zeopp['block']
+        except Exception:
+            pass
+
+        if self.ctx.restart_raspa_calc is not None:
+            inputs['retrieved_parent_folder'] = self.ctx.restart_raspa_calc
+
+        adopted = self._adopt(inputs['_label'])
+        if adopted is not None:
+            self.ctx.raspa_equilibration = adopted.get_outputs_dict()
+            return
+
+        running = submit(RaspaConvergeWorkChain, **inputs)
+        self.report("pk: {} | Running RASPA equilibration chunk {}".format(
+            running.pid, len(self.ctx.equilibration_loading)))
+        return ToContext(raspa_equilibration=Outputs(running))
+
+    def inspect_equilibration(self):
+        """Append the loading of the last chunk and detect the start of the stationary regime."""
+        self.ctx.restart_raspa_calc = self.ctx.raspa_equilibration[
+            'retrieved_parent_folder']
+        self.ctx.equilibration_loading.append(self.ctx.raspa_equilibration[
+            "component_0"].dict.loading_absolute_average)
+        # the molecules are in the restart file from now on
+        for component in self.ctx.raspa_parameters_gcmc_0['Component']:
+            component['CreateNumberOfMolecules'] = 0
+
+        if self.ctx.cf_biasing_factors is not None:
+            self._update_cfcmc_bias()
+
+        self.ctx.equilibrated, self.ctx.equilibration_start = is_equilibrated(
+            self.ctx.equilibration_loading,
+            self.inputs._equilibration_min_chunks)
+        if self.ctx.equilibrated:
+            # no initialization needed for the first GCMC anymore
+            self.ctx.raspa_parameters_gcmc_0['GeneralSettings'][
+                "NumberOfInitializationCycles"] = 0
+            self.report("Loading stationary after chunk {} of {}".format(
+                self.ctx.equilibration_start,
+                len(self.ctx.equilibration_loading)))
+
     def run_first_gcmc(self):
         """This function will run RaspaConvergeWorkChain for the current pressure"""
         self.ctx.raspa_parameters_gcmc_0['GeneralSettings'][
@@ -201,9 +716,14 @@ class ResubmitGCMC(WorkChain):
             'code': self.inputs.raspa_code,
             'structure': self.ctx.structure,
             'parameters': parameters,
-            '_options': self.inputs._raspa_options,
+            '_options':
+            self._get_raspa_options(self.ctx.raspa_parameters_gcmc_0,
+                                    'first_gcmc'),
             '_label': "run_first_loading_raspa",
         }
+        if self.inputs._compute_histograms:
+            self._retrieve_histograms(inputs)
+
         # Check if there are pocket blocks to be loaded
         try:
             inputs['block_component_0'] = self.ctx.zeopp['block']
@@ -213,13 +733,32 @@ class ResubmitGCMC(WorkChain):
         if self.ctx.restart_raspa_calc is not None:
             inputs['retrieved_parent_folder'] = self.ctx.restart_raspa_calc
 
-        # Create the calculation process and launch it
-        running = submit(RaspaConvergeWorkChain, **inputs)
         self.ctx.current_run += 1
+        source, reused = reuse_first_gcmc(
+            lambda: self._adopt_raspa(inputs['_label']),
+            lambda: self._find_cached_first_gcmc(inputs))
+        if source == 'cached':
+            self.ctx.raspa_loading = get_cached_outputs(reused)
+            self.report("Reusing the first GCMC <{}>".format(reused.pk))
+        if source is not None:
+            return
+        # Create the calculation process and launch it
+        running = self._submit_raspa(inputs)
         self.report("pk: {} | Running RASPA  for the {} time".format(
             running.pid, self.ctx.current_run))
+        if self.ctx.first_gcmc_hash is not None:
+            tag_first_gcmc(running.pid, self.ctx.first_gcmc_hash)
+
+        return ToContext(raspa_loading=self._raspa_future(running))
 
-        return ToContext(raspa_loading=Outputs(running))
+    def _find_cached_first_gcmc(self, inputs):
+        """An identical first GCMC (not after equilibration chunks) of another workchain, None if there is none."""
+        if not self.inputs._cache_first_gcmc or self.ctx.restart_raspa_calc is not None:
+            return None
+        self.ctx.first_gcmc_hash = get_first_gcmc_hash(
+            self.ctx.structure, self.ctx.pressure.value,
+            self.ctx.raspa_parameters_gcmc_0, inputs.get('block_component_0'))
+        return find_cached_first_gcmc(self.ctx.first_gcmc_hash)
 
     def run_loading_raspa(self):
         """This function will run RaspaConvergeWorkChain for the current pressure"""
@@ -227,6 +766,9 @@ class ResubmitGCMC(WorkChain):
             "NumberOfInitializationCycles"] = 0
         self.ctx.raspa_parameters_gcmc['GeneralSettings'][
             'ExternalPressure'] = self.ctx.pressure
+        if self.inputs._adaptive_segments:
+            self.ctx.raspa_parameters_gcmc['GeneralSettings'][
+                "NumberOfCycles"] = self.ctx.next_segment_cycles
 
         parameters = ParameterData(dict=self.ctx.raspa_parameters_gcmc).store()
         # Create the input dictionary
@@ -234,9 +776,14 @@ class ResubmitGCMC(WorkChain):
             'code': self.inputs.raspa_code,
             'structure': self.ctx.structure,
             'parameters': parameters,
-            '_options': self.inputs._raspa_options,
+            '_options':
+            self._get_raspa_options(self.ctx.raspa_parameters_gcmc,
+                                    'gcmc'),
             '_label': "run_loading_raspa",
         }
+        if self.inputs._compute_histograms:
+            self._retrieve_histograms(inputs)
+
         # Check if there are pocket blocks to be loaded
         try:
             inputs['block_component_0'] = self.ctx.zeopp['block']
@@ -246,18 +793,21 @@ class ResubmitGCMC(WorkChain):
         if self.ctx.restart_raspa_calc is not None:
             inputs['retrieved_parent_folder'] = self.ctx.restart_raspa_calc
 
-        # Create the calculation process and launch it
-        running = submit(RaspaConvergeWorkChain, **inputs)
         self.ctx.current_run += 1
+        if self._adopt_raspa(inputs['_label']) is not None:
+            return
+        # Create the calculation process and launch it
+        running = self._submit_raspa(inputs)
         self.report("pk: {} | Running RASPA  for the {} time".format(
             running.pid, self.ctx.current_run))
 
-        return ToContext(raspa_loading=Outputs(running))
+        return ToContext(raspa_loading=self._raspa_future(running))
 
     def parse_loading_raspa(self):
         """Extract the pressure and loading average of the last completed raspa calculation"""
         self.ctx.restart_raspa_calc = self.ctx.raspa_loading[
             'retrieved_parent_folder']
+        self.ctx.own_configuration = True
         loading_average = self.ctx.raspa_loading[
             "component_0"].dict.loading_absolute_average
         loading_dev = self.ctx.raspa_loading[
@@ -313,7 +863,24 @@ class ResubmitGCMC(WorkChain):
             curr_run] = tail_correction_energy_dev
         self.ctx.raspa_warnings[curr_run] = raspa_warnings
         self.ctx.loading[curr_run] = loading_average
+        self.ctx.loading_excess[curr_run] = self.ctx.raspa_loading[
+            "component_0"].get_dict().get('loading_excess_average')
         self.ctx.mc_statistics[curr_run] = mc_statistics
+        if self.ctx.cf_biasing_factors is not None and not curr_run.startswith(
+                'md'):
+            self.ctx.mc_statistics[curr_run] = dict(
+                mc_statistics or {}, cfcmc=self._update_cfcmc_bias())
+        if self.inputs._tune_moves and not curr_run.startswith('md'):
+            self._tune_moves(curr_run, mc_statistics)
+        if self.inputs._compute_histograms and not curr_run.startswith('md'):
+            n_histogram = parse_histogram(self.ctx.restart_raspa_calc,
+                                          'NumberOfMoleculesHistograms')
+            self.ctx.number_of_molecules_histograms[curr_run] = {
+                'n': [row[0] for row in n_histogram],
+                'counts': [row[1] for row in n_histogram],
+            }
+            self.ctx.energy_histograms[curr_run] = parse_histogram(
+                self.ctx.restart_raspa_calc, 'EnergyHistograms')
 
         self.ctx.loading_dev[curr_run] = loading_dev
         self.ctx.enthalpy_of_adsorption[curr_run] = enthalpy_of_adsorption
@@ -345,6 +912,192 @@ class ResubmitGCMC(WorkChain):
         self.ctx.total_energy_average[curr_run] = total_energy_average
         self.ctx.total_energy_dev[curr_run] = total_energy_dev
 
+        if self.inputs._adaptive_segments:
+            self._adapt_segments(curr_run)
+
+    def _adapt_segments(self, curr_run):
+        """Size the next GCMC segment from queue wait and speed of the last run, keeping the total
+        number of production cycles."""
+        if self.ctx.remaining_cycles is None:
+            # first GCMC, the production cycles start afterwards
+            general_settings = self.ctx.raspa_parameters_gcmc_0['GeneralSettings']
+            cycles = general_settings.get('NumberOfInitializationCycles',
+                                          0) + general_settings['NumberOfCycles']
+            self.ctx.remaining_cycles = int(
+                self.ctx.number_runs.value) * self.ctx.next_segment_cycles
+        else:
+            cycles = self.ctx.next_segment_cycles
+            self.ctx.remaining_cycles -= cycles
+            self.ctx.segment_cycles[curr_run] = cycles
+
+        queue_wait, runtime = get_segment_times(self.ctx.restart_raspa_calc)
+        self.ctx.segment_times[curr_run] = {
+            'queue_wait': queue_wait,
+            'runtime': runtime,
+        }
+        if self.ctx.remaining_cycles <= 0:
+            return
+        self.ctx.next_segment_cycles = next_segment_cycles(
+            self.ctx.next_segment_cycles,
+            float(cycles) / runtime if runtime else None,
+            queue_wait, self.ctx.remaining_cycles,
+            self.inputs._segment_wait_ratio, self.inputs._min_segment_cycles,
+            self.inputs._max_segment_cycles)
+        self.report(
+            "Queue wait {} s, runtime {} s: next segment with {} of {} remaining cycles"
+            .format(queue_wait, runtime, self.ctx.next_segment_cycles,
+                    self.ctx.remaining_cycles))
+
+    def _update_cfcmc_bias(self):
+        """Flatten the lambda histogram of the last GCMC in the next ones and return the lambda statistics."""
+        histogram = parse_lambda_histogram(
+            get_output_content(self.ctx.restart_raspa_calc))
+        statistics = {
+            'lambda_histogram': histogram,
+            'biasing_factors': self.ctx.cf_biasing_factors,
+        }
+        self.ctx.cf_biasing_factors = update_biasing_factors(
+            self.ctx.cf_biasing_factors, histogram)
+        set_biasing_factors(self.ctx.raspa_parameters_gcmc,
+                            self.ctx.cf_biasing_factors)
+        set_biasing_factors(self.ctx.raspa_parameters_gcmc_0,
+                            self.ctx.cf_biasing_factors)
+        return statistics
+
+    def _tune_moves(self, curr_run, mc_statistics):
+        """Adjust the move probabilities of the next GCMC from the acceptance and CPU time of the moves."""
+        component = self.ctx.raspa_parameters_gcmc['Component'][0]
+        moves = get_moves(component)
+        # keyed by the probability keyword, the swap moves share their name in the output
+        probabilities = {key: component[key] for _, key in moves}
+        acceptance = {
+            key: extract_acceptance(mc_statistics, name)
+            for name, key in moves
+        }
+        timings = parse_move_timings(
+            get_output_content(self.ctx.restart_raspa_calc), moves)
+        tuned = tune_move_probabilities(probabilities, acceptance, timings)
+        for _, key in moves:
+            component[key] = tuned[key]
+        self.ctx.move_probabilities[curr_run] = tuned
+
+    def _retrieve_histograms(self, inputs):
+        """Add the histograms to the files retrieved by RASPA."""
+        try:
+            settings = inputs['settings'].get_dict()
+        except KeyError:
+            settings = {}
+        settings['additional_retrieve_list'] = settings.get(
+            'additional_retrieve_list', []) + HISTOGRAM_RETRIEVE_LIST
+        inputs['settings'] = ParameterData(dict=settings)
+
+    def _submit_raspa(self, inputs):
+        """Submit a GCMC or MD segment, as RaspaCalculation in the lean mode."""
+        self.ctx.raspa_inputs = inputs
+        self.ctx.raspa_attempts = 1
+        return self._launch_raspa(inputs)
+
+    def _launch_raspa(self, inputs):
+        if self.inputs._lean_raspa:
+            running = submit(RaspaCalculation.process(), **inputs)
+        else:
+            running = submit(RaspaConvergeWorkChain, **inputs)
+        self.ctx.raspa_pk = running.pid
+        return running
+
+    def _raspa_future(self, running):
+        """What to wait for: the calculation node in the lean mode, the outputs of the workchain otherwise."""
+        if self.inputs._lean_raspa:
+            return running
+        return Outputs(running)
+
+    def should_retry_raspa(self):
+        """Check the last segment, resubmit it from the last good restart folder if it failed."""
+        if isinstance(self.ctx.raspa_loading, dict):
+            # outputs of a RaspaConvergeWorkChain, of the first GCMC cache or adopted
+            outputs = self.ctx.raspa_loading
+            if all(key in outputs for key in RASPA_OUTPUTS):
+                return False
+        else:
+            outputs = raspa_outputs(self.ctx.raspa_loading)
+            if self.ctx.raspa_loading.has_finished_ok() and outputs is not None:
+                self.ctx.raspa_loading = outputs
+                return False
+
+        if self.ctx.raspa_attempts >= self.inputs._raspa_max_attempts:
+            raise RuntimeError(
+                "RASPA segment <{}> failed {} times".format(
+                    self.ctx.raspa_pk, self.ctx.raspa_attempts))
+        return True
+
+    def retry_raspa(self):
+        """Resubmit the failed segment, with twice the wall time if it was killed at the limit."""
+        failed = load_node(self.ctx.raspa_pk)
+        inputs = dict(self.ctx.raspa_inputs)
+        if hit_walltime(failed, inputs['_options']):
+            inputs['_options'] = increase_walltime(inputs['_options'])
+            self.ctx.raspa_inputs = inputs
+            self.report(
+                "RASPA segment <{}> hit the wall time, resubmitting with {} s".
+                format(failed.pk, inputs['_options']['max_wallclock_seconds']))
+        else:
+            self.report("RASPA segment <{}> failed, resubmitting".format(
+                failed.pk))
+
+        running = self._launch_raspa(inputs)
+        self.ctx.raspa_attempts += 1
+        self.report("pk: {} | Running RASPA, attempt {}".format(
+            running.pid, self.ctx.raspa_attempts))
+        first_gcmc_hash = failed.get_extra(FIRST_GCMC_HASH_EXTRA, None)
+        if first_gcmc_hash is not None:
+            tag_first_gcmc(running.pid, first_gcmc_hash)
+        return ToContext(raspa_loading=self._raspa_future(running))
+
+    def _adopt(self, label):
+        """Next successful step of the failed workchain we restart from, if it is the one we are about to run."""
+        if not self.ctx.adoptable:
+            return None
+        adopted_label, pk = self.ctx.adoptable[0]
+        if adopted_label != label:
+            self.report(
+                "Expected {} but the next step to adopt is {} <{}>, running everything from here"
+                .format(label, adopted_label, pk))
+            self.calc.set_extra(DISCARDED_EXTRA, len(self.ctx.adoptable))
+            self.ctx.adoptable = []
+            return None
+        self.ctx.adoptable = self.ctx.adoptable[1:]
+        self.report("Adopting {} <{}>".format(label, pk))
+        return load_node(pk)
+
+    def _adopt_raspa(self, label):
+        """Adopt the outputs of a segment of the failed workchain, return the adopted node or None."""
+        adopted = self._adopt(label)
+        if adopted is not None:
+            self.ctx.raspa_loading = raspa_outputs(adopted)
+        return adopted
+
+    def _get_raspa_options(self, parameters, stage):
+        """Scheduler options of a RASPA run of a stage ('first_gcmc', 'gcmc' or 'md'),
+        with the predicted wall time if requested."""
+        options = getattr(self.inputs, '_raspa_{}_options'.format(stage),
+                          None)
+        if options is None:
+            options = self.inputs._raspa_options
+        options = grid_options(options, parameters)
+        if self.ctx.walltime_model is None:
+            return options
+        try:
+            number_molecules = self.ctx.raspa_loading["component_0"].get_dict(
+            )['loading_absolute_average'] * number_unitcells(parameters)
+        except AttributeError:
+            number_molecules = sum(
+                component.get('CreateNumberOfMolecules', 0)
+                for component in parameters['Component'])
+        return predicted_options(
+            options, self.ctx.walltime_model,
+            features(parameters, self.ctx.number_atoms, number_molecules),
+            self.inputs._walltime_safety_factor)
+
     def return_results(self):
         """Attach the results to the output."""
 
@@ -360,6 +1113,10 @@ class ResubmitGCMC(WorkChain):
             'output_parameters'].get_dict()['PONAV_Volume_fraction']
         result_dict['POAV_cm^3/g'] = self.ctx.zeopp[
             'output_parameters'].get_dict()['POAV_cm^3/g']
+        result_dict['structure_md5'] = self.ctx.structure.get_attr('md5')
+        result_dict['cell_volume'] = cell_volume(
+            read_cif(self.ctx.structure.get_file_abs_path())['cell'])
+        result_dict['cell_volume_unit'] = "A^3"
         try:
             result_dict[
                 'number_blocking_spheres'] = self.ctx.number_blocking_spheres
@@ -369,69 +1126,138 @@ class ResubmitGCMC(WorkChain):
             )
             pass
 
-        # Raspa loading
-        try:
+        # Framework without probe-accessible volume, no RASPA calculation ran
+        if self.ctx.inaccessible:
+            result_dict['inaccessible'] = True
             result_dict['pressure_pa'] = self.ctx.pressure
             result_dict[
-                'conversion_factor_molec_uc_to_cm3stp_cm3'] = self.ctx.raspa_loading[
-                    "component_0"].get_dict(
-                    )['conversion_factor_molec_uc_to_cm3stp_cm3']
-            result_dict[
-                'conversion_factor_molec_uc_to_gr_gr'] = self.ctx.raspa_loading[
-                    "component_0"].get_dict(
-                    )['conversion_factor_molec_uc_to_gr_gr']
+                'conversion_factor_molec_uc_to_mol_kg'] = molec_uc_to_mol_kg(
+                    result_dict['Density'], result_dict['cell_volume'])
+            result_dict['loading_averages'] = {'inaccessible': 0.0}
+            result_dict['loading_dev'] = {'inaccessible': 0.0}
+            result_dict['loading_excess_averages'] = {'inaccessible': 0.0}
+            # the POAV fraction, like HeliumVoidFraction of an accessible framework
+            result_dict['helium_void_fraction'] = 0.0
+            result_dict['temperature'] = self.ctx.raspa_parameters_gcmc[
+                'GeneralSettings']['ExternalTemperature']
+        # Henry regime, the loading follows from the Widom insertion and no GCMC ran
+        elif self.ctx.henry_regime:
+            result_dict['pressure_pa'] = self.ctx.pressure
             result_dict[
-                'conversion_factor_molec_uc_to_mol_kg'] = self.ctx.raspa_loading[
-                    "component_0"].get_dict(
-                    )['conversion_factor_molec_uc_to_mol_kg']
+                'conversion_factor_molec_uc_to_mol_kg'] = self.ctx.conversion_factor_molec_uc_to_mol_kg
+            result_dict['loading_averages'] = {'henry': self.ctx.henry_loading}
+            result_dict['helium_void_fraction'] = self.ctx.raspa_parameters_gcmc[
+                'GeneralSettings']['HeliumVoidFraction']
+            result_dict['temperature'] = self.ctx.raspa_parameters_gcmc[
+                'GeneralSettings']['ExternalTemperature']
+        else:
+            # Raspa loading
+            try:
+                result_dict['pressure_pa'] = self.ctx.pressure
+                result_dict[
+                    'conversion_factor_molec_uc_to_cm3stp_cm3'] = self.ctx.raspa_loading[
+                        "component_0"].get_dict(
+                        )['conversion_factor_molec_uc_to_cm3stp_cm3']
+                result_dict[
+                    'conversion_factor_molec_uc_to_gr_gr'] = self.ctx.raspa_loading[
+                        "component_0"].get_dict(
+                        )['conversion_factor_molec_uc_to_gr_gr']
+                result_dict[
+                    'conversion_factor_molec_uc_to_mol_kg'] = self.ctx.raspa_loading[
+                        "component_0"].get_dict(
+                        )['conversion_factor_molec_uc_to_mol_kg']
 
-            result_dict['rdfs'] = self.ctx.rdfs
-            result_dict['mc_statistics'] = self.ctx.mc_statistics
-            result_dict['warnings'] = self.ctx.raspa_warnings
+                result_dict['rdfs'] = self.ctx.rdfs
+                result_dict['mc_statistics'] = self.ctx.mc_statistics
+                if self.ctx.number_of_molecules_histograms:
+                    result_dict[
+                        'number_of_molecules_histograms'] = self.ctx.number_of_molecules_histograms
+                    result_dict['energy_histograms'] = self.ctx.energy_histograms
+                if self.ctx.move_probabilities:
+                    result_dict[
+                        'move_probabilities'] = self.ctx.move_probabilities
+                result_dict['warnings'] = self.ctx.raspa_warnings
 
-            result_dict['loading_averages'] = self.ctx.loading
-            result_dict['loading_dev'] = self.ctx.loading_dev
-            result_dict[
-                'enthalpy_of_adsorption'] = self.ctx.enthalpy_of_adsorption
-            result_dict[
-                'enthalpy_of_adsorption_dev'] = self.ctx.enthalpy_of_adsorption_dev
+                result_dict['loading_averages'] = self.ctx.loading
+                result_dict['loading_dev'] = self.ctx.loading_dev
+                # everything needed to recompute the excess loading for another void fraction
+                result_dict['loading_excess_averages'] = self.ctx.loading_excess
+                result_dict['helium_void_fraction'] = self.ctx.raspa_parameters_gcmc[
+                    'GeneralSettings']['HeliumVoidFraction']
+                result_dict['temperature'] = self.ctx.raspa_parameters_gcmc[
+                    'GeneralSettings']['ExternalTemperature']
+                result_dict[
+                    'enthalpy_of_adsorption'] = self.ctx.enthalpy_of_adsorption
+                result_dict[
+                    'enthalpy_of_adsorption_dev'] = self.ctx.enthalpy_of_adsorption_dev
 
-            result_dict[
-                'ads_ads_coulomb_energy_average'] = self.ctx.ads_ads_coulomb_energy_average
-            result_dict[
-                'ads_ads_coulomb_energy_dev'] = self.ctx.ads_ads_coulomb_energy_dev
-            result_dict[
-                'ads_ads_total_energy_average'] = self.ctx.ads_ads_total_energy_average
-            result_dict[
-                'ads_ads_total_energy_dev'] = self.ctx.ads_ads_total_energy_dev
-            result_dict[
-                'ads_ads_vdw_energy_average'] = self.ctx.ads_ads_vdw_energy_average
-            result_dict[
-                'ads_ads_vdw_energy_dev'] = self.ctx.ads_ads_vdw_energy_dev
+                result_dict[
+                    'ads_ads_coulomb_energy_average'] = self.ctx.ads_ads_coulomb_energy_average
+                result_dict[
+                    'ads_ads_coulomb_energy_dev'] = self.ctx.ads_ads_coulomb_energy_dev
+                result_dict[
+                    'ads_ads_total_energy_average'] = self.ctx.ads_ads_total_energy_average
+                result_dict[
+                    'ads_ads_total_energy_dev'] = self.ctx.ads_ads_total_energy_dev
+                result_dict[
+                    'ads_ads_vdw_energy_average'] = self.ctx.ads_ads_vdw_energy_average
+                result_dict[
+                    'ads_ads_vdw_energy_dev'] = self.ctx.ads_ads_vdw_energy_dev
 
+                result_dict[
+                    'host_ads_coulomb_energy_average'] = self.ctx.host_ads_coulomb_energy_average
+                result_dict[
+                    'host_ads_coulomb_energy_dev'] = self.ctx.host_ads_coulomb_energy_dev
+                result_dict[
+                    'host_ads_total_energy_average'] = self.ctx.host_ads_total_energy_average
+                result_dict[
+                    'host_ads_total_energy_dev'] = self.ctx.host_ads_total_energy_dev
+                result_dict[
+                    'host_ads_vdw_energy_average'] = self.ctx.host_ads_vdw_energy_average
+                result_dict[
+                    'host_ads_vdw_energy_dev'] = self.ctx.host_ads_vdw_energy_dev
+                result_dict['total_energy_average'] = self.ctx.total_energy_average
+                result_dict['total_energy_dev'] = self.ctx.total_energy_dev
+                if self.ctx.segment_cycles:
+                    result_dict['segment_cycles'] = self.ctx.segment_cycles
+                    result_dict['segment_times'] = self.ctx.segment_times
+
+            except AttributeError:
+                self.report(
+                    'Problems with returning the results dictionary for the RASPA part.'
+                )
+                pass
+
+        # Widom insertion
+        if self.ctx.henry_coefficient is not None:
+            result_dict['henry_coefficient_average'] = self.ctx.henry_coefficient
+            result_dict['henry_coefficient_dev'] = self.ctx.henry_coefficient_dev
+            result_dict['henry_coefficient_unit'] = "mol/kg/Pa"
             result_dict[
-                'host_ads_coulomb_energy_average'] = self.ctx.host_ads_coulomb_energy_average
-            result_dict[
-                'host_ads_coulomb_energy_dev'] = self.ctx.host_ads_coulomb_energy_dev
-            result_dict[
-                'host_ads_total_energy_average'] = self.ctx.host_ads_total_energy_average
-            result_dict[
-                'host_ads_total_energy_dev'] = self.ctx.host_ads_total_energy_dev
+                'enthalpy_of_adsorption_infinite_dilution'] = self.ctx.enthalpy_of_adsorption_widom
+            result_dict['henry_loading'] = self.ctx.henry_loading
+            result_dict['henry_regime'] = self.ctx.henry_regime
+
+        # Equilibration
+        if self.ctx.equilibration_loading:
             result_dict[
-                'host_ads_vdw_energy_average'] = self.ctx.host_ads_vdw_energy_average
+                'equilibration_loading'] = self.ctx.equilibration_loading
+            result_dict['equilibration_start_chunk'] = self.ctx.equilibration_start
+            result_dict['equilibrated'] = self.ctx.equilibrated
             result_dict[
-                'host_ads_vdw_energy_dev'] = self.ctx.host_ads_vdw_energy_dev
-            result_dict['total_energy_average'] = self.ctx.total_energy_average
-            result_dict['total_energy_dev'] = self.ctx.total_energy_dev
+                'equilibration_chunk_cycles'] = self.inputs._equilibration_chunk_cycles
 
-        except AttributeError:
-            self.report(
-                'Problems with returning the results dictionary for the RASPA part.'
-            )
-            pass
+        if self.inputs._restart_from is not None:
+            result_dict['restarted_from'] = self.inputs._restart_from
+
+        if self.inputs._store_configuration and self.ctx.own_configuration:
+            add_to_library(self.ctx.restart_raspa_calc, self.ctx.structure,
+                           self.ctx.raspa_parameters_gcmc,
+                           self.ctx.pressure.value)
 
         self.out("results", ParameterData(dict=result_dict).store())
-        self.out('blocking_spheres', self.ctx.zeopp['block'])
+        if 'block' in self.ctx.zeopp:
+            self.out('blocking_spheres', self.ctx.zeopp['block'])
         self.report("Workchain <{}> completed successfully".format(
             self.calc.pk))
 
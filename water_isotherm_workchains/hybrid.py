@@ -0,0 +1,84 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Helpers for running the GCMC/MD cycles as hybrid MC/MD moves within a single RASPA run and for
+reconstructing per-segment statistics from the periodic output RASPA prints every PrintEvery cycles.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import copy
+import re
+
+CYCLE_RE = re.compile(r'^Current cycle:\s+(\d+)\s+out of')
+ABSOLUTE_ADSORPTION_RE = re.compile(
+    r'^\s*absolute adsorption:\s+\S+\s+\(avg\.\s+(\S+)\)\s+\[mol/uc\]')
+
+
+def hybrid_parameters(gcmc_parameters, md_parameters, number_segments,
+                      probability, number_steps):
+    """Merge the GCMC and MD settings into one GCMC run with hybrid NVE MC/MD moves.
+
+    Every segment has the length of one short GCMC and the periodic output is printed once per segment
+    such that the segment statistics can be reconstructed.
+    """
+    parameters = copy.deepcopy(gcmc_parameters)
+    general_settings = parameters['GeneralSettings']
+    segment_cycles = general_settings['NumberOfCycles']
+
+    general_settings['NumberOfCycles'] = segment_cycles * number_segments
+    general_settings['NumberOfInitializationCycles'] = 0
+    general_settings['PrintEvery'] = segment_cycles
+    general_settings['WriteRDFEvery'] = segment_cycles * number_segments
+    general_settings['HybridNVEMoveProbability'] = probability
+    general_settings['NumberOfHybridNVESteps'] = number_steps
+    general_settings['TimeStep'] = md_parameters['GeneralSettings']['TimeStep']
+    return parameters
+
+
+def parse_segment_loading(output_content, segment_cycles, number_segments,
+                          final_average):
+    """Reconstruct the average absolute loading (molecules/uc) of the first component for each segment.
+
+    RASPA prints running averages every PrintEvery cycles, the average of a segment is the difference
+    of the weighted running averages at its boundaries. The periodic output of the last cycle is not
+    printed, the last segment follows from the overall average of the run.
+
+    Only the loading is reconstructed, the energies and the enthalpy of adsorption are averages over
+    the whole run.
+
+    :param output_content: RASPA output file
+    :param segment_cycles: cycles per segment (PrintEvery)
+    :param number_segments: number of segments of the run
+    :param final_average: overall average absolute loading of the run (molecules/uc)
+    :return: list with the average loading of every segment
+    """
+    running_averages = []
+    cycle = None
+    for line in output_content.splitlines():
+        match = CYCLE_RE.match(line)
+        if match:
+            cycle = int(match.group(1))
+            continue
+        match = ABSOLUTE_ADSORPTION_RE.match(line)
+        if match and cycle is not None:
+            running_averages.append((cycle, float(match.group(1))))
+            # only the first component
+            cycle = None
+    running_averages.append((segment_cycles * number_segments, final_average))
+
+    segments = []
+    previous_cycle, previous_average = 0, 0.0
+    for cycle, average in running_averages:
+        if cycle - previous_cycle < segment_cycles:
+            continue
+        segments.append((cycle * average - previous_cycle * previous_average) /
+                        (cycle - previous_cycle))
+        previous_cycle, previous_average = cycle, average
+    return segments
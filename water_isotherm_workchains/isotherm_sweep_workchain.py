@@ -0,0 +1,218 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+from aiida.common.exceptions import NotExistent
+from aiida.orm import DataFactory
+from aiida.orm.code import Code
+from aiida.orm.data.base import Float
+from aiida.work.run import submit
+from aiida.work.workchain import WorkChain, ToContext, while_
+from water_isotherm_workchains.gcmc_restart_workchain import ResubmitGCMC
+from water_isotherm_workchains.gcmc_md_workchain import GCMCMD
+from water_isotherm_workchains.gcmc_md_cycle_dist_workchain import GCMCMD2
+from water_isotherm_workchains.pressure_grid import loading_from_results, refine_pressure_grid
+
+# data objects
+CifData = DataFactory('cif')
+ParameterData = DataFactory('parameter')
+SinglefileData = DataFactory('singlefile')
+
+WORKCHAINS = {
+    'ResubmitGCMC': ResubmitGCMC,
+    'GCMCMD': GCMCMD,
+    'GCMCMD2': GCMCMD2,
+}
+
+
+class IsothermSweep(WorkChain):
+    """Computes an isotherm starting from a coarse pressure grid. After every iteration new pressures
+    are inserted where the loading changes sharply or the uncertainty is large, until the budget of
+    pressure points is used."""
+
+    @classmethod
+    def define(cls, spec):
+        super(IsothermSweep, cls).define(spec)
+
+        # structure, adsorbant, pressures
+        spec.input('structure', valid_type=CifData)
+        spec.input("number_runs", valid_type=Float)
+        spec.input("_pressures", valid_type=list)
+        spec.input("_workchain",
+                   valid_type=str,
+                   default='ResubmitGCMC',
+                   required=False)
+
+        # zeopp
+        spec.input('zeopp_code', valid_type=Code)
+        spec.input("_zeopp_options",
+                   valid_type=dict,
+                   default=None,
+                   required=False)
+        spec.input("zeopp_probe_radius", valid_type=Float)
+        spec.input("zeopp_atomic_radii",
+                   valid_type=SinglefileData,
+                   default=None,
+                   required=False)
+
+        # raspa
+        spec.input("raspa_code", valid_type=Code)
+        spec.input("raspa_parameters_gcmc", valid_type=ParameterData)
+        spec.input("raspa_parameters_gcmc_0", valid_type=ParameterData)
+        spec.input("raspa_parameters_md",
+                   valid_type=ParameterData,
+                   required=False)
+        spec.input("_raspa_options",
+                   valid_type=dict,
+                   default=None,
+                   required=False)
+
+        # settings
+        spec.input("_usecharges",
+                   valid_type=bool,
+                   default=True,
+                   required=False)
+        # further options passed to every workchain, e.g. {'_usegrids': True}
+        spec.input("_workchain_options",
+                   valid_type=dict,
+                   default=None,
+                   required=False)
+
+        # refinement
+        spec.input("_max_points", valid_type=int, default=16, required=False)
+        spec.input("_points_per_iteration",
+                   valid_type=int,
+                   default=4,
+                   required=False)
+        spec.input("_loading_tolerance",
+                   valid_type=float,
+                   default=0.1,
+                   required=False)
+        spec.input("_dev_tolerance",
+                   valid_type=float,
+                   default=0.05,
+                   required=False)
+
+        # workflow
+        spec.outline(
+            cls.init,
+            while_(cls.should_run_points)(
+                cls.run_points,  # one workchain per new pressure
+                cls.inspect_points,  # insert pressures where the isotherm is not resolved
+            ),
+            cls.return_results,
+        )
+
+        spec.dynamic_output()
+
+    def init(self):
+        """Initialize variables and the coarse pressure grid"""
+        self.ctx.pending_pressures = sorted(
+            self.inputs._pressures)[:self.inputs._max_points]
+        self.ctx.running = []
+        self.ctx.pressures = []
+        self.ctx.loading = []
+        self.ctx.loading_dev = []
+        self.ctx.workchains = []
+        self.ctx.number_submitted = 0
+
+    def should_run_points(self):
+        """Run as long as there are new pressures."""
+        return len(self.ctx.pending_pressures) > 0
+
+    def run_points(self):
+        """Submit one workchain for each new pressure."""
+        inputs = {
+            'structure': self.inputs.structure,
+            'number_runs': self.inputs.number_runs,
+            'zeopp_code': self.inputs.zeopp_code,
+            '_zeopp_options': self.inputs._zeopp_options,
+            'zeopp_probe_radius': self.inputs.zeopp_probe_radius,
+            'raspa_code': self.inputs.raspa_code,
+            'raspa_parameters_gcmc': self.inputs.raspa_parameters_gcmc,
+            'raspa_parameters_gcmc_0': self.inputs.raspa_parameters_gcmc_0,
+            '_raspa_options': self.inputs._raspa_options,
+            '_usecharges': self.inputs._usecharges,
+        }
+        try:
+            if self.inputs.zeopp_atomic_radii is not None:
+                inputs['zeopp_atomic_radii'] = self.inputs.zeopp_atomic_radii
+        except AttributeError:
+            pass
+        if self.inputs._workchain != 'ResubmitGCMC':
+            inputs['raspa_parameters_md'] = self.inputs.raspa_parameters_md
+        if self.inputs._workchain_options is not None:
+            inputs.update(self.inputs._workchain_options)
+
+        futures = {}
+        self.ctx.running = []
+        for pressure in self.ctx.pending_pressures:
+            key = 'point_{}'.format(self.ctx.number_submitted +
+                                    len(self.ctx.running))
+            running = submit(WORKCHAINS[self.inputs._workchain],
+                             pressure=Float(pressure),
+                             _label='isotherm_sweep_{}'.format(pressure),
+                             **inputs)
+            self.report("pk: {} | Running {} at {} Pa".format(
+                running.pid, self.inputs._workchain, pressure))
+            futures[key] = running
+            self.ctx.running.append((key, pressure))
+        self.ctx.number_submitted += len(self.ctx.running)
+        self.ctx.pending_pressures = []
+
+        return ToContext(**futures)
+
+    def inspect_points(self):
+        """Collect the loading of the finished points and choose new pressures."""
+        for key, pressure in self.ctx.running:
+            workchain = self.ctx[key]
+            try:
+                results = workchain.out.results.get_dict()
+            except (AttributeError, NotExistent):
+                self.report("No results for {} Pa, workchain <{}> failed".format(
+                    pressure, workchain.pk))
+                continue
+            loading, loading_dev = loading_from_results(results)
+            if loading is None:
+                self.report("No loading for {} Pa, workchain <{}>".format(
+                    pressure, workchain.pk))
+                continue
+            self.ctx.pressures.append(pressure)
+            self.ctx.loading.append(loading)
+            self.ctx.loading_dev.append(loading_dev)
+            self.ctx.workchains.append(workchain.pk)
+
+        budget = self.inputs._max_points - self.ctx.number_submitted
+        self.ctx.pending_pressures = refine_pressure_grid(
+            self.ctx.pressures,
+            self.ctx.loading,
+            self.ctx.loading_dev,
+            min(budget, self.inputs._points_per_iteration),
+            loading_tolerance=self.inputs._loading_tolerance,
+            dev_tolerance=self.inputs._dev_tolerance)
+        self.report("Refining the isotherm at {}".format(
+            self.ctx.pending_pressures))
+
+    def return_results(self):
+        """Attach the isotherm to the output."""
+        points = sorted(
+            zip(self.ctx.pressures, self.ctx.loading, self.ctx.loading_dev,
+                self.ctx.workchains))
+        result_dict = {
+            'pressure_pa': [p[0] for p in points],
+            'loading_average': [p[1] for p in points],
+            'loading_dev': [p[2] for p in points],
+            'loading_unit': 'molecules/uc',
+            'workchains': [p[3] for p in points],
+        }
+
+        self.out("results", ParameterData(dict=result_dict).store())
+        self.report("Workchain <{}> completed successfully".format(
+            self.calc.pk))
+
+        return
@@ -0,0 +1,110 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Tuning of the MC move probabilities between GCMC runs from the acceptance ratios of the moves
+and their CPU time per attempt.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import math
+import re
+
+# move name in the RASPA output -> probability keyword of the component
+MOVES = [
+    ('Translation', 'TranslationProbability'),
+    ('Rotation', 'RotationProbability'),
+    ('Reinsertion', 'ReinsertionProbability'),
+    ('Swap', 'SwapProbability'),
+    ('Swap', 'CFCMC_CBMC_SwapProbability'),
+]
+
+# the parser reports the acceptance ratios of the MC move statistics in percent
+ACCEPTANCE_UNIT = 0.01
+
+
+def get_moves(component):
+    """Moves (name, probability keyword) with a non-zero probability in a RASPA component."""
+    return [(name, key) for name, key in MOVES if component.get(key, 0) > 0]
+
+
+def _flatten(statistics, path=''):
+    """Yield (path, value) for all numbers in nested dictionaries."""
+    if isinstance(statistics, dict):
+        for key, value in statistics.items():
+            for item in _flatten(value, path + '/' + str(key).lower()):
+                yield item
+    elif isinstance(statistics, (int, float)):
+        yield path, statistics
+
+
+def extract_acceptance(mc_statistics, move):
+    """Acceptance ratio of a move from the parsed MC move statistics, None if it is not there."""
+    for path, value in _flatten(mc_statistics):
+        if move.lower() in path and 'accept' in path:
+            return value * ACCEPTANCE_UNIT
+    return None
+
+
+def parse_move_timings(output_content, moves):
+    """CPU time (s) spent in every move from the timing section of the RASPA output.
+
+    :param moves: list of (name, probability keyword)
+    :return: dict probability keyword -> CPU time
+    """
+    timings = {}
+    for name, key in moves:
+        match = re.search(
+            r'^\s*{}[^:\n]*:\s*([-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)\s*\[s\]'.
+            format(name), output_content, re.MULTILINE)
+        if match:
+            timings[key] = float(match.group(1))
+    return timings
+
+
+def tune_move_probabilities(probabilities,
+                            acceptance,
+                            timings,
+                            damping=0.5,
+                            floor=0.05):
+    """New move probabilities that favor moves with many accepted moves per CPU second.
+
+    The cost per attempt of a move is its CPU time divided by its probability, the target probability
+    is proportional to sqrt(acceptance / cost). The target is mixed with the old probabilities
+    (damping) and no move drops below floor times the total such that the sampling stays ergodic.
+
+    :param probabilities: dict move -> probability
+    :param acceptance: dict move -> acceptance ratio
+    :param timings: dict move -> CPU time in s
+    :return: dict move -> probability, with the same total as the input
+    """
+    total = sum(probabilities.values())
+    target = {}
+    for move, probability in probabilities.items():
+        if acceptance.get(move) is None or not timings.get(move):
+            target[move] = probability / total
+            continue
+        cost = timings[move] / probability
+        target[move] = math.sqrt(max(acceptance[move], 1e-6) / cost)
+
+    # moves we do not know anything about keep their share
+    known = [m for m in target if acceptance.get(m) is not None and timings.get(m)]
+    if not known:
+        return dict(probabilities)
+    known_share = sum(probabilities[m] for m in known) / total
+    known_norm = sum(target[m] for m in known)
+    for move in known:
+        target[move] = target[move] / known_norm * known_share
+
+    tuned = {}
+    for move, probability in probabilities.items():
+        mixed = (1 - damping) * target[move] + damping * probability / total
+        tuned[move] = max(mixed, floor)
+    norm = sum(tuned.values())
+    return {move: p / norm * total for move, p in tuned.items()}
@@ -0,0 +1,61 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Configuration swaps between GCMC replicas at neighbouring chemical potentials (hyper-parallel tempering
+in the chemical potential at constant temperature).
+
+For two replicas at the same temperature the energies cancel in the acceptance rule and a swap of the
+configurations with N_i and N_j molecules is accepted with min(1, exp(beta * (mu_i - mu_j) * (N_j - N_i))).
+With an ideal gas reservoir beta * mu = ln(P) + const, i.e. the acceptance is (P_i / P_j)^(N_j - N_i).
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import math
+
+
+def swap_acceptance(pressure_i, pressure_j, molecules_i, molecules_j):
+    """Acceptance probability of swapping the configurations of two replicas."""
+    exponent = math.log(pressure_i / pressure_j) * (molecules_j - molecules_i)
+    if exponent >= 0:
+        return 1.0
+    return math.exp(exponent)
+
+
+def attempt_swaps(pressures, molecules, exchange_round, rng):
+    """Attempt swaps between neighbouring pressures, alternating between even and odd pairs.
+
+    :param pressures: pressures of the replicas, sorted
+    :param molecules: number of molecules in the configuration of every replica
+    :param exchange_round: counter of the exchange rounds, selects even or odd pairs
+    :param rng: random.Random instance
+    :return: list of (i, j, acceptance, accepted) for all attempted pairs
+    """
+    attempts = []
+    for i in range(exchange_round % 2, len(pressures) - 1, 2):
+        j = i + 1
+        acceptance = swap_acceptance(pressures[i], pressures[j], molecules[i],
+                                     molecules[j])
+        attempts.append((i, j, acceptance, rng.random() < acceptance))
+    return attempts
+
+
+def apply_swaps(configurations, attempts):
+    """Exchange the configurations (e.g. restart folders) of the replicas of the accepted swaps.
+
+    :param configurations: list with the configuration of every replica
+    :param attempts: output of attempt_swaps
+    :return: new list, the configuration of replica i is at index j and vice versa for accepted swaps
+    """
+    configurations = list(configurations)
+    for i, j, _, accepted in attempts:
+        if accepted:
+            configurations[i], configurations[j] = configurations[
+                j], configurations[i]
+    return configurations
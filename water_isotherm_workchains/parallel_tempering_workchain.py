@@ -0,0 +1,311 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import copy
+import random
+
+from aiida.orm import CalculationFactory, DataFactory
+from aiida.orm.code import Code
+from aiida.orm.data.base import Float
+from aiida.work.run import submit
+from aiida.work.workchain import WorkChain, ToContext, while_, Outputs
+from aiida_raspa.workflows import RaspaConvergeWorkChain
+from water_isotherm_workchains.parallel_tempering import attempt_swaps, apply_swaps
+from water_isotherm_workchains.raspa_output import parse_restart_number_of_molecules
+
+ZeoppCalculation = CalculationFactory('zeopp.network')
+
+# data objects
+CifData = DataFactory('cif')
+NetworkParameters = DataFactory('zeopp.parameters')
+ParameterData = DataFactory('parameter')
+SinglefileData = DataFactory('singlefile')
+
+
+class HyperParallelTempering(WorkChain):
+    """Runs the GCMC segments of all pressures of an isotherm concurrently and attempts swaps of the
+    configurations between neighbouring pressures after every segment."""
+
+    @classmethod
+    def define(cls, spec):
+        super(HyperParallelTempering, cls).define(spec)
+
+        # structure, adsorbant, pressures
+        spec.input('structure', valid_type=CifData)
+        spec.input("zeopp_probe_radius", valid_type=Float)
+        spec.input("_pressures", valid_type=list)
+        spec.input("number_runs", valid_type=Float)
+        spec.input("_seed", valid_type=int, default=42, required=False)
+
+        # zeopp
+        spec.input('zeopp_code', valid_type=Code)
+        spec.input("_zeopp_options",
+                   valid_type=dict,
+                   default=None,
+                   required=False)
+        spec.input("zeopp_atomic_radii",
+                   valid_type=SinglefileData,
+                   default=None,
+                   required=False)
+
+        # raspa
+        spec.input("raspa_code", valid_type=Code)
+        spec.input("raspa_parameters_gcmc", valid_type=ParameterData)
+        spec.input("raspa_parameters_gcmc_0", valid_type=ParameterData)
+        spec.input("_raspa_options",
+                   valid_type=dict,
+                   default=None,
+                   required=False)
+
+        # settings
+        spec.input("_usecharges",
+                   valid_type=bool,
+                   default=True,
+                   required=False)
+
+        # workflow
+        spec.outline(
+            cls.init,
+            cls.run_zeopp,  # computes volpo and block pockets
+            cls.init_raspa_calc,  # assign HeliumVoidFraction=POAV
+            cls.run_first_gcmc,  # all pressures concurrently, with initialization
+            cls.parse_loading_raspa,
+            while_(cls.should_run_loading_raspa)(
+                cls.attempt_swaps,  # exchange configurations between neighbouring pressures
+                cls.run_loading_raspa,
+                cls.parse_loading_raspa,
+            ),
+            cls.return_results,
+        )
+
+        spec.dynamic_output()
+
+    def init(self):
+        """Initialize variables and the pressures we want to compute"""
+        self.ctx.structure = self.inputs.structure
+        self.ctx.pressures = sorted(self.inputs._pressures)
+        self.ctx.number_runs = self.inputs.number_runs
+        self.ctx.current_run = -1  # start at minus one for the first GCMC with initalization cycle
+
+        # one dictionary run -> value for every pressure
+        self.ctx.loading = [{} for _ in self.ctx.pressures]
+        self.ctx.loading_dev = [{} for _ in self.ctx.pressures]
+        self.ctx.enthalpy_of_adsorption = [{} for _ in self.ctx.pressures]
+        self.ctx.enthalpy_of_adsorption_dev = [{} for _ in self.ctx.pressures]
+        self.ctx.total_energy_average = [{} for _ in self.ctx.pressures]
+        self.ctx.total_energy_dev = [{} for _ in self.ctx.pressures]
+        self.ctx.swaps = []
+
+        self.ctx.raspa_parameters_gcmc = self.inputs.raspa_parameters_gcmc.get_dict(
+        )
+        self.ctx.raspa_parameters_gcmc_0 = self.inputs.raspa_parameters_gcmc_0.get_dict(
+        )
+
+        if self.inputs._usecharges:
+            self.ctx.raspa_parameters_gcmc['ChargeMethod'] = "Ewald"
+            self.ctx.raspa_parameters_gcmc['EwaldPrecision'] = 1e-6
+            self.ctx.raspa_parameters_gcmc['GeneralSettings'][
+                'UseChargesFromCIFFile'] = "yes"
+
+            self.ctx.raspa_parameters_gcmc_0['ChargeMethod'] = "Ewald"
+            self.ctx.raspa_parameters_gcmc_0['EwaldPrecision'] = 1e-6
+            self.ctx.raspa_parameters_gcmc_0['GeneralSettings'][
+                'UseChargesFromCIFFile'] = "yes"
+        else:
+            self.ctx.raspa_parameters_gcmc['GeneralSettings'][
+                'UseChargesFromCIFFile'] = "no"
+
+            self.ctx.raspa_parameters_gcmc_0['GeneralSettings'][
+                'UseChargesFromCIFFile'] = "no"
+
+        self.ctx.restart_raspa_calc = [None for _ in self.ctx.pressures]
+
+    def run_zeopp(self):
+        """Main function that performs zeo++ VOLPO and block calculations."""
+        params = {
+            'ha':
+            True,
+            # 100 samples / Ang^3: accurate for all the structures
+            'block': [self.inputs.zeopp_probe_radius.value, 100],
+            # 100k samples, may need more for structures bigger than 30x30x30
+            'volpo': [
+                self.inputs.zeopp_probe_radius.value,
+                self.inputs.zeopp_probe_radius.value, 100000
+            ]
+        }
+
+        inputs = {
+            'code': self.inputs.zeopp_code,
+            'structure': self.inputs.structure,
+            'parameters': NetworkParameters(dict=params).store(),
+            '_options': self.inputs._zeopp_options,
+            '_label': "ZeoppVolpoBlock",
+        }
+
+        # Use default zeopp atomic radii only if a .rad file is not specified
+        try:
+            inputs['atomic_radii'] = self.inputs.zeopp_atomic_radii
+            self.report("Zeopp will use atomic radii from the .rad file")
+        except:
+            self.report("Zeopp will use default atomic radii")
+
+        # Create the calculation process and launch it
+        running = submit(ZeoppCalculation.process(), **inputs)
+        self.report(
+            "pk: {} | Running zeo++ volpo and block calculations".format(
+                running.pid))
+        return ToContext(zeopp=Outputs(running))
+
+    def init_raspa_calc(self):
+        """Parse the output of Zeo++ and instruct the input for Raspa. """
+        # Use probe-occupiable available void fraction as the helium void fraction (for excess uptake)
+        self.ctx.raspa_parameters_gcmc_0['GeneralSettings'][
+            'HeliumVoidFraction'] = self.ctx.zeopp[
+                'output_parameters'].get_dict()['POAV_Volume_fraction']
+        self.ctx.raspa_parameters_gcmc['GeneralSettings'][
+            'HeliumVoidFraction'] = self.ctx.zeopp[
+                'output_parameters'].get_dict()['POAV_Volume_fraction']
+
+    def should_run_loading_raspa(self):
+        """We run another round of segments only if the current iteration is smaller than
+        the total number of runs."""
+        self.report(
+            'checking if need to run more cycle. Total number of runs {}, current run {}'
+            .format(self.ctx.number_runs, self.ctx.current_run))
+        return self.ctx.current_run < self.ctx.number_runs
+
+    def _submit_replicas(self, raspa_parameters, label):
+        """Submit one RaspaConvergeWorkChain per pressure, restarting from its current configuration."""
+        futures = {}
+        for i, pressure in enumerate(self.ctx.pressures):
+            parameters = copy.deepcopy(raspa_parameters)
+            parameters['GeneralSettings']['ExternalPressure'] = pressure
+
+            inputs = {
+                'code': self.inputs.raspa_code,
+                'structure': self.ctx.structure,
+                'parameters': ParameterData(dict=parameters).store(),
+                '_options': self.inputs._raspa_options,
+                '_label': label,
+            }
+            # Check if there are pocket blocks to be loaded
+            try:
+                inputs['block_component_0'] = self.ctx.zeopp['block']
+            except Exception:
+                pass
+
+            if self.ctx.restart_raspa_calc[i] is not None:
+                inputs['retrieved_parent_folder'] = self.ctx.restart_raspa_calc[
+                    i]
+
+            running = submit(RaspaConvergeWorkChain, **inputs)
+            futures['raspa_loading_{}'.format(i)] = Outputs(running)
+
+        self.ctx.current_run += 1
+        self.report("Running RASPA at {} pressures for the {} time".format(
+            len(self.ctx.pressures), self.ctx.current_run))
+        return ToContext(**futures)
+
+    def run_first_gcmc(self):
+        """Run the first GCMC, with initialization, at all pressures"""
+        return self._submit_replicas(self.ctx.raspa_parameters_gcmc_0,
+                                     "run_first_loading_raspa")
+
+    def run_loading_raspa(self):
+        """Run the next segment at all pressures"""
+        self.ctx.raspa_parameters_gcmc['GeneralSettings'][
+            "NumberOfInitializationCycles"] = 0
+        return self._submit_replicas(self.ctx.raspa_parameters_gcmc,
+                                     "run_loading_raspa")
+
+    def parse_loading_raspa(self):
+        """Extract the loading and energies of the last segment at every pressure"""
+        curr_run = str(self.ctx.current_run)
+        for i, _ in enumerate(self.ctx.pressures):
+            raspa_loading = self.ctx['raspa_loading_{}'.format(i)]
+            self.ctx.restart_raspa_calc[i] = raspa_loading[
+                'retrieved_parent_folder']
+            self.ctx.loading[i][curr_run] = raspa_loading[
+                "component_0"].dict.loading_absolute_average
+            self.ctx.loading_dev[i][curr_run] = raspa_loading[
+                "component_0"].dict.loading_absolute_dev
+            self.ctx.enthalpy_of_adsorption[i][curr_run] = raspa_loading[
+                "output_parameters"].dict.enthalpy_of_adsorption_average
+            self.ctx.enthalpy_of_adsorption_dev[i][curr_run] = raspa_loading[
+                "output_parameters"].dict.enthalpy_of_adsorption_dev
+            self.ctx.total_energy_average[i][curr_run] = raspa_loading[
+                "output_parameters"].dict.total_energy_average
+            self.ctx.total_energy_dev[i][curr_run] = raspa_loading[
+                "output_parameters"].dict.total_energy_dev
+
+    def attempt_swaps(self):
+        """Swap the configurations (i.e. the restart folders) of neighbouring pressures."""
+        molecules = [
+            parse_restart_number_of_molecules(folder)
+            for folder in self.ctx.restart_raspa_calc
+        ]
+        attempts = attempt_swaps(
+            self.ctx.pressures, molecules, self.ctx.current_run,
+            random.Random(self.inputs._seed + self.ctx.current_run))
+        self.ctx.restart_raspa_calc = apply_swaps(self.ctx.restart_raspa_calc,
+                                                  attempts)
+        for i, j, acceptance, accepted in attempts:
+            self.ctx.swaps.append({
+                'run': self.ctx.current_run,
+                'pressures': [self.ctx.pressures[i], self.ctx.pressures[j]],
+                'molecules': [molecules[i], molecules[j]],
+                'acceptance': acceptance,
+                'accepted': accepted,
+            })
+        self.report("Accepted {} of {} swaps".format(
+            sum(1 for a in attempts if a[3]), len(attempts)))
+
+    def return_results(self):
+        """Attach the results to the output."""
+
+        result_dict = {}
+
+        # Zeopp section
+        result_dict['Density'] = self.ctx.zeopp['output_parameters'].get_dict(
+        )['Density']
+        result_dict['Density_unit'] = "g/cm^3"
+        result_dict['POAV_Volume_fraction'] = self.ctx.zeopp[
+            'output_parameters'].get_dict()['POAV_Volume_fraction']
+        result_dict['PONAV_Volume_fraction'] = self.ctx.zeopp[
+            'output_parameters'].get_dict()['PONAV_Volume_fraction']
+        result_dict['POAV_cm^3/g'] = self.ctx.zeopp[
+            'output_parameters'].get_dict()['POAV_cm^3/g']
+
+        # Raspa loading, one entry per pressure
+        result_dict['pressure_pa'] = self.ctx.pressures
+        result_dict['loading_averages'] = self.ctx.loading
+        result_dict['loading_dev'] = self.ctx.loading_dev
+        result_dict['enthalpy_of_adsorption'] = self.ctx.enthalpy_of_adsorption
+        result_dict[
+            'enthalpy_of_adsorption_dev'] = self.ctx.enthalpy_of_adsorption_dev
+        result_dict['total_energy_average'] = self.ctx.total_energy_average
+        result_dict['total_energy_dev'] = self.ctx.total_energy_dev
+        result_dict['swaps'] = self.ctx.swaps
+        result_dict['swap_acceptance_ratio'] = float(
+            sum(1 for s in self.ctx.swaps if s['accepted'])) / max(
+                len(self.ctx.swaps), 1)
+        try:
+            result_dict[
+                'conversion_factor_molec_uc_to_mol_kg'] = self.ctx.raspa_loading_0[
+                    "component_0"].get_dict(
+                    )['conversion_factor_molec_uc_to_mol_kg']
+        except AttributeError:
+            pass
+
+        self.out("results", ParameterData(dict=result_dict).store())
+        self.out('blocking_spheres', self.ctx.zeopp['block'])
+        self.report("Workchain <{}> completed successfully".format(
+            self.calc.pk))
+
+        return
@@ -0,0 +1,58 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Helpers of the two-tier screening: charge-free parameters for the prescreen and the selection of the
+frameworks with the largest uptake.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import copy
+import math
+
+from water_isotherm_workchains.pressure_grid import loading_from_results
+
+
+def charge_free_parameters(parameters, cycles, initialization_cycles):
+    """Copy of RASPA parameters without any electrostatics and with a shorter run."""
+    parameters = copy.deepcopy(parameters)
+    parameters.pop('EwaldPrecision', None)
+    parameters['ChargeMethod'] = 'None'
+    general = parameters['GeneralSettings']
+    general['ChargeMethod'] = 'None'
+    general['UseChargesFromCIFFile'] = 'no'
+    general.pop('EwaldPrecision', None)
+    general['NumberOfCycles'] = cycles
+    general['NumberOfInitializationCycles'] = initialization_cycles
+    return parameters
+
+
+def uptake_from_results(result_dict):
+    """Uptake in mol/kg of a ResubmitGCMC (GCMC or Henry regime), None if it has no loading."""
+    loading, _ = loading_from_results(result_dict)
+    conversion = result_dict.get('conversion_factor_molec_uc_to_mol_kg')
+    if loading is None or conversion is None:
+        return None
+    return loading * conversion
+
+
+def select_top(uptakes, fraction, min_selected=1):
+    """Keys with the largest uptake.
+
+    :param uptakes: dict key -> uptake, None for failed prescreens (never selected)
+    :param fraction: fraction of the keys with an uptake to select
+    :param min_selected: select at least this many keys (if available)
+    :return: list of keys, largest uptake first
+    """
+    ranked = sorted(
+        [key for key, uptake in uptakes.items() if uptake is not None],
+        key=lambda key: uptakes[key],
+        reverse=True)
+    number = max(int(math.ceil(fraction * len(ranked))), min_selected)
+    return ranked[:number]
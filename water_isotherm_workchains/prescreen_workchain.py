@@ -0,0 +1,272 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+from aiida.orm import DataFactory, load_node
+from aiida.orm.code import Code
+from aiida.orm.data.base import Float
+from aiida.work.run import submit
+from aiida.work.workchain import WorkChain, ToContext, if_
+from water_isotherm_workchains.gcmc_restart_workchain import ResubmitGCMC
+from water_isotherm_workchains.gcmc_md_workchain import GCMCMD
+from water_isotherm_workchains.gcmc_md_cycle_dist_workchain import GCMCMD2
+from water_isotherm_workchains.prescreen import charge_free_parameters, uptake_from_results, \
+    select_top
+
+# data objects
+ParameterData = DataFactory('parameter')
+SinglefileData = DataFactory('singlefile')
+
+WORKCHAINS = {
+    'ResubmitGCMC': ResubmitGCMC,
+    'GCMCMD': GCMCMD,
+    'GCMCMD2': GCMCMD2,
+}
+
+
+class Prescreen(WorkChain):
+    """Two-tier screening of many frameworks. A short, charge-free ResubmitGCMC (or only a Widom
+    insertion) at the target pressure ranks all structures by uptake, the full isotherm with charges
+    is only computed for the best fraction of them."""
+
+    @classmethod
+    def define(cls, spec):
+        super(Prescreen, cls).define(spec)
+
+        # pks of the CifData of the structures, pressures of the full isotherm
+        spec.input("_structures", valid_type=list)
+        spec.input("_target_pressure", valid_type=float)
+        spec.input("_pressures", valid_type=list)
+        spec.input("number_runs", valid_type=Float)
+        spec.input("_workchain",
+                   valid_type=str,
+                   default='ResubmitGCMC',
+                   required=False)
+
+        # zeopp
+        spec.input('zeopp_code', valid_type=Code)
+        spec.input("_zeopp_options",
+                   valid_type=dict,
+                   default=None,
+                   required=False)
+        spec.input("zeopp_probe_radius", valid_type=Float)
+        spec.input("zeopp_atomic_radii",
+                   valid_type=SinglefileData,
+                   default=None,
+                   required=False)
+
+        # raspa
+        spec.input("raspa_code", valid_type=Code)
+        spec.input("raspa_parameters_gcmc", valid_type=ParameterData)
+        spec.input("raspa_parameters_gcmc_0", valid_type=ParameterData)
+        spec.input("raspa_parameters_md",
+                   valid_type=ParameterData,
+                   required=False)
+        spec.input("_raspa_options",
+                   valid_type=dict,
+                   default=None,
+                   required=False)
+        # further options passed to every workchain, e.g. {'_usegrids': True}
+        spec.input("_workchain_options",
+                   valid_type=dict,
+                   default=None,
+                   required=False)
+
+        # prescreen: 'gcmc' or 'widom' (the loading predicted from the Henry coefficient)
+        spec.input("_prescreen",
+                   valid_type=str,
+                   default='gcmc',
+                   required=False)
+        spec.input("_prescreen_runs",
+                   valid_type=int,
+                   default=1,
+                   required=False)
+        spec.input("_prescreen_cycles",
+                   valid_type=int,
+                   default=1000,
+                   required=False)
+        spec.input("_prescreen_initialization_cycles",
+                   valid_type=int,
+                   default=2000,
+                   required=False)
+
+        # selection for the full isotherm
+        spec.input("_top_fraction",
+                   valid_type=float,
+                   default=0.1,
+                   required=False)
+        spec.input("_min_selected",
+                   valid_type=int,
+                   default=1,
+                   required=False)
+        spec.input("_wait_for_isotherms",
+                   valid_type=bool,
+                   default=True,
+                   required=False)
+
+        # workflow
+        spec.outline(
+            cls.init,
+            cls.run_prescreen,  # charge-free workchain at the target pressure for every structure
+            cls.rank_structures,  # select the structures with the largest uptake
+            cls.run_isotherms,  # full isotherms with charges for the selected structures
+            if_(cls.should_wait_for_isotherms)(cls.collect_isotherms),
+            cls.return_results,
+        )
+
+        spec.dynamic_output()
+
+    def init(self):
+        """Initialize variables."""
+        self.ctx.uptakes = {}
+        self.ctx.prescreen_workchains = {}
+        self.ctx.selected = []
+        self.ctx.isotherm_workchains = {}
+        self.ctx.isotherms = {}
+
+    def _common_inputs(self):
+        """Inputs shared by the prescreen and the full workchains."""
+        inputs = {
+            'zeopp_code': self.inputs.zeopp_code,
+            '_zeopp_options': self.inputs._zeopp_options,
+            'zeopp_probe_radius': self.inputs.zeopp_probe_radius,
+            'raspa_code': self.inputs.raspa_code,
+            '_raspa_options': self.inputs._raspa_options,
+        }
+        try:
+            if self.inputs.zeopp_atomic_radii is not None:
+                inputs['zeopp_atomic_radii'] = self.inputs.zeopp_atomic_radii
+        except AttributeError:
+            pass
+        if self.inputs._workchain_options is not None:
+            inputs.update(self.inputs._workchain_options)
+        return inputs
+
+    def run_prescreen(self):
+        """Submit a short charge-free ResubmitGCMC at the target pressure for every structure."""
+        inputs = self._common_inputs()
+        inputs.update({
+            'number_runs':
+            Float(self.inputs._prescreen_runs),
+            'raspa_parameters_gcmc':
+            ParameterData(dict=charge_free_parameters(
+                self.inputs.raspa_parameters_gcmc.get_dict(),
+                self.inputs._prescreen_cycles, 0)),
+            'raspa_parameters_gcmc_0':
+            ParameterData(dict=charge_free_parameters(
+                self.inputs.raspa_parameters_gcmc_0.get_dict(),
+                self.inputs._prescreen_cycles,
+                self.inputs._prescreen_initialization_cycles)),
+            '_usecharges':
+            False,
+        })
+        if self.inputs._prescreen == 'widom':
+            # stop after the Widom insertion, the results contain the Henry loading
+            inputs['_usewidom'] = True
+            inputs['_henry_loading_threshold'] = float('inf')
+        elif self.inputs._prescreen != 'gcmc':
+            raise ValueError('unknown prescreen {}'.format(
+                self.inputs._prescreen))
+
+        futures = {}
+        for pk in self.inputs._structures:
+            key = 'prescreen_{}'.format(pk)
+            running = submit(ResubmitGCMC,
+                             structure=load_node(pk),
+                             pressure=Float(self.inputs._target_pressure),
+                             _label='prescreen',
+                             **inputs)
+            self.report("pk: {} | Prescreening <{}> ({})".format(
+                running.pid, pk, self.inputs._prescreen))
+            futures[key] = running
+        return ToContext(**futures)
+
+    def rank_structures(self):
+        """Rank the structures by the uptake (mol/kg) of the prescreen."""
+        for pk in self.inputs._structures:
+            workchain = self.ctx['prescreen_{}'.format(pk)]
+            self.ctx.prescreen_workchains[str(pk)] = workchain.pk
+            try:
+                uptake = uptake_from_results(workchain.out.results.get_dict())
+            except AttributeError:
+                uptake = None
+            if uptake is None:
+                self.report("No uptake from the prescreen of <{}>".format(pk))
+            self.ctx.uptakes[str(pk)] = uptake
+
+        self.ctx.selected = select_top(self.ctx.uptakes,
+                                       self.inputs._top_fraction,
+                                       self.inputs._min_selected)
+        self.report("Computing the isotherms of {}".format(
+            self.ctx.selected))
+
+    def run_isotherms(self):
+        """Submit the full workchain with charges at every pressure for the selected structures."""
+        inputs = self._common_inputs()
+        inputs.update({
+            'number_runs': self.inputs.number_runs,
+            'raspa_parameters_gcmc': self.inputs.raspa_parameters_gcmc,
+            'raspa_parameters_gcmc_0': self.inputs.raspa_parameters_gcmc_0,
+            '_usecharges': True,
+        })
+        if self.inputs._workchain != 'ResubmitGCMC':
+            inputs['raspa_parameters_md'] = self.inputs.raspa_parameters_md
+
+        futures = {}
+        for pk in self.ctx.selected:
+            self.ctx.isotherm_workchains[pk] = {}
+            for pressure in self.inputs._pressures:
+                running = submit(WORKCHAINS[self.inputs._workchain],
+                                 structure=load_node(int(pk)),
+                                 pressure=Float(pressure),
+                                 _label='prescreen_isotherm_{}'.format(
+                                     pressure),
+                                 **inputs)
+                self.report("pk: {} | Running {} for <{}> at {} Pa".format(
+                    running.pid, self.inputs._workchain, pk, pressure))
+                self.ctx.isotherm_workchains[pk][str(pressure)] = running.pid
+                futures['isotherm_{}_{}'.format(pk, pressure)] = running
+        if self.inputs._wait_for_isotherms:
+            return ToContext(**futures)
+
+    def should_wait_for_isotherms(self):
+        """Collect the isotherms or return as soon as they are submitted."""
+        return self.inputs._wait_for_isotherms
+
+    def collect_isotherms(self):
+        """Loading of the selected structures at every pressure."""
+        for pk in self.ctx.selected:
+            self.ctx.isotherms[pk] = {}
+            for pressure in self.inputs._pressures:
+                workchain = self.ctx['isotherm_{}_{}'.format(pk, pressure)]
+                try:
+                    uptake = uptake_from_results(
+                        workchain.out.results.get_dict())
+                except AttributeError:
+                    uptake = None
+                self.ctx.isotherms[pk][str(pressure)] = uptake
+
+    def return_results(self):
+        """Attach the ranking and the isotherms to the output."""
+        result_dict = {
+            'target_pressure_pa': self.inputs._target_pressure,
+            'prescreen': self.inputs._prescreen,
+            'prescreen_uptake': self.ctx.uptakes,
+            'prescreen_workchains': self.ctx.prescreen_workchains,
+            'uptake_unit': 'mol/kg',
+            'selected': self.ctx.selected,
+            'isotherm_workchains': self.ctx.isotherm_workchains,
+        }
+        if self.ctx.isotherms:
+            result_dict['isotherms'] = self.ctx.isotherms
+
+        self.out("results", ParameterData(dict=result_dict).store())
+        self.report("Workchain <{}> completed successfully".format(
+            self.calc.pk))
+
+        return
@@ -0,0 +1,76 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Adaptive refinement of the pressure grid of an isotherm: new points are inserted where the loading
+changes sharply between neighbouring pressures or where the uncertainty is large.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import math
+
+
+def loading_from_results(result_dict):
+    """Average loading (molecules/uc) and its standard error over the GCMC runs of a workchain.
+
+    A hybrid MC/MD run has a single loading average, the reconstructed loadings of its segments are
+    used instead.
+    """
+    if result_dict.get('segment_loading_averages'):
+        loadings = list(result_dict['segment_loading_averages'].values())
+    else:
+        loadings = [
+            v for k, v in result_dict.get('loading_averages', {}).items()
+            if not str(k).startswith('md')
+        ]
+    if not loadings:
+        return None, None
+    mean = sum(loadings) / len(loadings)
+    if len(loadings) < 2:
+        return mean, max(result_dict.get('loading_dev', {}).values() or [0.0])
+    variance = sum((x - mean)**2 for x in loadings) / (len(loadings) - 1)
+    return mean, math.sqrt(variance / len(loadings))
+
+
+def refine_pressure_grid(pressures,
+                         loadings,
+                         loading_devs,
+                         max_new_points,
+                         loading_tolerance=0.1,
+                         dev_tolerance=0.05,
+                         min_ratio=1.05):
+    """Pressures to add to the grid.
+
+    An interval between neighbouring pressures is refined (at its geometric mean) if the change in
+    loading is larger than loading_tolerance, or the sum of the uncertainties larger than dev_tolerance,
+    times the total loading range. Intervals with the largest sum of both are refined first.
+
+    :param pressures: simulated pressures
+    :param loadings: loading at each pressure
+    :param loading_devs: uncertainty of the loading at each pressure
+    :param max_new_points: maximum number of pressures to add
+    :param min_ratio: do not refine intervals with p_upper / p_lower below this value
+    :return: sorted list of new pressures
+    """
+    points = sorted(zip(pressures, loadings, loading_devs))
+    loading_range = max(loadings) - min(loadings)
+    if max_new_points <= 0 or len(points) < 2 or loading_range <= 0:
+        return []
+
+    candidates = []
+    for (p_0, n_0, dev_0), (p_1, n_1, dev_1) in zip(points[:-1], points[1:]):
+        if p_1 / p_0 < min_ratio:
+            continue
+        change = abs(n_1 - n_0) / loading_range
+        uncertainty = (dev_0 + dev_1) / loading_range
+        if change > loading_tolerance or uncertainty > dev_tolerance:
+            candidates.append((change + uncertainty, math.sqrt(p_0 * p_1)))
+
+    candidates.sort(reverse=True)
+    return sorted(p for _, p in candidates[:max_new_points])
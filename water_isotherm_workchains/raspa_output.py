@@ -0,0 +1,78 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Helpers to read quantities from the RASPA output file that the RASPA parser does not provide.
+"""
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import os
+import re
+
+NUMBER_RE = re.compile(r'[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?')
+
+
+def get_output_content(folder):
+    """Read the RASPA output file from a retrieved folder."""
+    output_dir = folder.get_abs_path(os.path.join('Output', 'System_0'))
+    output_file = sorted(os.listdir(output_dir))[0]
+    with open(os.path.join(output_dir, output_file)) as fh:
+        return fh.read()
+
+
+def parse_lambda_histogram(output_content):
+    """Parse the CFCMC lambda histogram of the first component.
+
+    We take the first block following a line containing 'lambda histogram', every row of the
+    block starts with the bin index and ends with the number of counts in the bin.
+
+    :return: list of counts, empty if there is no histogram in the output
+    """
+    histogram = []
+    in_block = False
+    for line in output_content.splitlines():
+        if not in_block:
+            in_block = 'lambda histogram' in line.lower()
+            continue
+        numbers = NUMBER_RE.findall(line)
+        if len(numbers) < 2 or not line.strip()[0].isdigit():
+            if histogram:
+                break
+            continue
+        histogram.append(float(numbers[-1]))
+    return histogram
+
+
+def parse_histogram(folder, directory):
+    """Read the histogram RASPA wrote into directory/System_0 of a retrieved folder.
+
+    :return: list of rows (lists of floats), empty if the histogram was not retrieved
+    """
+    try:
+        histogram_dir = folder.get_abs_path(os.path.join(directory, 'System_0'))
+        histogram_files = sorted(os.listdir(histogram_dir))
+    except (OSError, IOError, ValueError):
+        return []
+    if not histogram_files:
+        return []
+
+    rows = []
+    with open(os.path.join(histogram_dir, histogram_files[0])) as fh:
+        for line in fh:
+            if line.startswith('#') or not line.strip():
+                continue
+            rows.append([float(x) for x in NUMBER_RE.findall(line)])
+    return rows
+
+
+def parse_restart_number_of_molecules(folder):
+    """Number of adsorbate molecules in the final configuration, read from the RASPA restart file."""
+    restart_dir = folder.get_abs_path(os.path.join('Restart', 'System_0'))
+    restart_file = sorted(os.listdir(restart_dir))[0]
+    with open(os.path.join(restart_dir, restart_file)) as fh:
+        match = re.search(r'Adsorbates\s+(\d+)', fh.read())
+    return int(match.group(1))
@@ -0,0 +1,193 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Rebuild the results of finished ResubmitGCMC, GCMCMD and GCMCMD2 workchains from the outputs of their
+RASPA segments, e.g. to add a quantity to the results without running the simulations again.
+
+The per-segment quantities are read from the segment outputs as in parse_loading_raspa, entries of the
+original results that are not rebuilt (zeo++, Widom, histograms, ...) are kept. The new results node is
+created by an inline calculation with the original results and the segment outputs as inputs, and the
+workchain gets its pk as extra.
+"""
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+from aiida.orm import DataFactory
+from aiida.orm.calculation.inline import make_inline
+
+from water_isotherm_workchains.recovery import get_adoptable
+
+ParameterData = DataFactory('parameter')
+
+REBUILT_EXTRA = 'rebuilt_results'
+
+SEGMENT_LABELS = [
+    'run_first_loading_raspa', 'run_hybrid_raspa', 'run_md_raspa',
+    'run_loading_raspa'
+]
+
+# key in the results -> (output of the segment, key in the output)
+SEGMENT_QUANTITIES = {
+    'loading_averages': ('component_0', 'loading_absolute_average'),
+    'loading_dev': ('component_0', 'loading_absolute_dev'),
+    'loading_excess_averages': ('component_0', 'loading_excess_average'),
+    'enthalpy_of_adsorption':
+    ('output_parameters', 'enthalpy_of_adsorption_average'),
+    'enthalpy_of_adsorption_dev':
+    ('output_parameters', 'enthalpy_of_adsorption_dev'),
+    'ads_ads_coulomb_energy_average':
+    ('output_parameters', 'ads_ads_coulomb_energy_average'),
+    'ads_ads_coulomb_energy_dev':
+    ('output_parameters', 'ads_ads_coulomb_energy_dev'),
+    'ads_ads_total_energy_average':
+    ('output_parameters', 'ads_ads_total_energy_average'),
+    'ads_ads_total_energy_dev': ('output_parameters',
+                                 'ads_ads_total_energy_dev'),
+    'ads_ads_vdw_energy_average': ('output_parameters',
+                                   'ads_ads_vdw_energy_average'),
+    'ads_ads_vdw_energy_dev': ('output_parameters', 'ads_ads_vdw_energy_dev'),
+    'host_ads_coulomb_energy_average':
+    ('output_parameters', 'host_ads_coulomb_energy_average'),
+    'host_ads_coulomb_energy_dev':
+    ('output_parameters', 'host_ads_coulomb_energy_dev'),
+    'host_ads_total_energy_average':
+    ('output_parameters', 'host_ads_total_energy_average'),
+    'host_ads_total_energy_dev': ('output_parameters',
+                                  'host_ads_total_energy_dev'),
+    'host_ads_vdw_energy_average': ('output_parameters',
+                                    'host_ads_vdw_energy_average'),
+    'host_ads_vdw_energy_dev': ('output_parameters',
+                                'host_ads_vdw_energy_dev'),
+    'total_energy_average': ('output_parameters', 'total_energy_average'),
+    'total_energy_dev': ('output_parameters', 'total_energy_dev'),
+    'rdfs': ('output_parameters', 'rdfs'),
+    'mc_statistics': ('output_parameters', 'mc_move_statistics'),
+    'warnings': ('output_parameters', 'warnings'),
+}
+
+
+def run_names(gcmc_md, labels):
+    """Names of the runs in the results, as the workchains number them.
+
+    :param gcmc_md: True for GCMCMD and GCMCMD2, False for ResubmitGCMC
+    :param labels: labels of the segments in the order they were run
+    """
+    names = []
+    counter = 0
+    for label in labels:
+        if label == 'run_first_loading_raspa':
+            names.append('-1' if gcmc_md else '0')
+        elif label == 'run_hybrid_raspa':
+            names.append('hybrid')
+        elif label == 'run_md_raspa':
+            counter += 1
+            names.append('md{}'.format(counter))
+        elif gcmc_md:
+            names.append('gcmc{}'.format(counter))
+        else:
+            counter += 1
+            names.append(str(counter))
+    return names
+
+
+def get_segments(node):
+    """Successful segments of a workchain, including the ones it adopted (recursively) from failed workchains,
+    oldest first."""
+    from aiida.orm import load_node
+    return [
+        load_node(pk) for label, pk in get_adoptable(node.pk)
+        if label in SEGMENT_LABELS
+    ]
+
+
+def _segment_outputs(segment):
+    outputs = segment.get_outputs_dict()
+    return {key: outputs[key] for key in ['component_0', 'output_parameters']}
+
+
+@make_inline
+def rebuild_results_inline(results, names, quantities, **segments):
+    """New results from the original ones and the outputs of the segments.
+
+    :param segments: outputs of the segments, 'segment_<i>_<output>'
+    """
+    results = results.get_dict()
+    names = names.get_dict()['names']
+    for key, (output, output_key) in quantities.get_dict().items():
+        values = dict(results.get(key) or {})
+        for i, name in enumerate(names):
+            value = segments['segment_{}_{}'.format(i, output)].get_dict().get(
+                output_key)
+            if key == 'mc_statistics' and isinstance(values.get(name), dict) \
+                    and 'cfcmc' in values[name]:
+                # keep the lambda statistics the workchain added
+                value = dict(value or {}, cfcmc=values[name]['cfcmc'])
+            values[name] = value
+        results[key] = values
+    return {'results': ParameterData(dict=results)}
+
+
+def rebuild_results(node, quantities=None):
+    """Rebuild the results of a finished workchain.
+
+    :param node: WorkCalculation of a finished ResubmitGCMC, GCMCMD or GCMCMD2
+    :param quantities: dict result key -> (output, key), SEGMENT_QUANTITIES by default
+    :return: the new results ParameterData
+    """
+    segments = get_segments(node)
+    if not segments:
+        raise ValueError(
+            'workchain <{}> has no finished RASPA segments'.format(node.pk))
+
+    inputs = {}
+    for i, segment in enumerate(segments):
+        for output, data in _segment_outputs(segment).items():
+            inputs['segment_{}_{}'.format(i, output)] = data
+    names = run_names('raspa_parameters_md' in node.get_inputs_dict(),
+                      [segment.label for segment in segments])
+
+    _, outputs = rebuild_results_inline(
+        results=node.out.results,
+        names=ParameterData(dict={'names': names}),
+        quantities=ParameterData(dict=quantities or SEGMENT_QUANTITIES),
+        **inputs)
+    node.set_extra(REBUILT_EXTRA, outputs['results'].pk)
+    return outputs['results']
+
+
+def _init_worker():
+    from aiida.backends.utils import load_dbenv, is_dbenv_loaded
+    if not is_dbenv_loaded():
+        load_dbenv()
+    try:
+        # do not share the database connection of the parent process
+        from django.db import connections
+        connections.close_all()
+    except ImportError:
+        pass
+
+
+def _rebuild_pk(pk):
+    from aiida.orm import load_node
+    try:
+        return pk, rebuild_results(load_node(pk)).pk
+    except Exception as exception:  # pylint: disable=broad-except
+        return pk, str(exception)
+
+
+def rebuild_many(pks, processes=4):
+    """Rebuild the results of many workchains in a process pool.
+
+    :return: list of (pk, pk of the new results or the error message)
+    """
+    from multiprocessing import Pool
+    pool = Pool(processes, initializer=_init_worker)
+    try:
+        return pool.map(_rebuild_pk, pks)
+    finally:
+        pool.close()
+        pool.join()
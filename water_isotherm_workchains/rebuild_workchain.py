@@ -0,0 +1,41 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+from aiida.orm import load_node
+from aiida.work.workchain import WorkChain
+from water_isotherm_workchains.rebuild import rebuild_results
+
+
+class RebuildResults(WorkChain):
+    """Rebuild the results of finished ResubmitGCMC, GCMCMD and GCMCMD2 workchains from their RASPA
+    segments, without running any simulation."""
+
+    @classmethod
+    def define(cls, spec):
+        super(RebuildResults, cls).define(spec)
+
+        # pks of the finished workchains
+        spec.input("_workchains", valid_type=list, required=True)
+
+        spec.outline(cls.rebuild)
+
+        spec.dynamic_output()
+
+    def rebuild(self):
+        """Rebuild the results of every workchain, failures are reported and skipped."""
+        for pk in self.inputs._workchains:
+            try:
+                results = rebuild_results(load_node(pk))
+            except Exception as exception:  # pylint: disable=broad-except
+                self.report("Could not rebuild the results of <{}>: {}".format(
+                    pk, exception))
+                continue
+            self.out("results_{}".format(pk), results)
+            self.report("Rebuilt the results of <{}>: <{}>".format(
+                pk, results.pk))
@@ -0,0 +1,107 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Recovery of failed RASPA segments and restart of a failed workchain from its successful children.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import copy
+
+from water_isotherm_workchains.walltime import get_job_times
+
+RASPA_OUTPUTS = ['component_0', 'output_parameters', 'retrieved_parent_folder']
+
+# labels of the steps a restarted workchain replays, in the order they are run
+ADOPTABLE_LABELS = [
+    'ZeoppVolpoBlock', 'run_widom_raspa', 'run_equilibration_raspa',
+    'run_first_loading_raspa', 'run_hybrid_raspa', 'run_md_raspa',
+    'run_loading_raspa'
+]
+
+# pk of the workchain a restarted workchain adopts from, and the number of adoptable steps it discarded
+RESTART_EXTRA = 'restarted_from'
+DISCARDED_EXTRA = 'discarded_steps'
+
+# a calculation that ran longer than this fraction of the requested wall time was probably killed
+WALLTIME_FRACTION = 0.95
+
+
+def raspa_outputs(node):
+    """Outputs of a RaspaConvergeWorkChain or RaspaCalculation in the form the workchains keep in the context.
+
+    :return: dict, None if an output is missing
+    """
+    outputs = node.get_outputs_dict()
+    if 'retrieved_parent_folder' not in outputs and 'retrieved' in outputs:
+        outputs['retrieved_parent_folder'] = outputs['retrieved']
+    if any(key not in outputs for key in RASPA_OUTPUTS):
+        return None
+    return {key: outputs[key] for key in RASPA_OUTPUTS}
+
+
+def get_called(node):
+    """Processes called by a workchain, oldest first."""
+    from aiida.common.links import LinkType
+    return sorted(node.get_outputs(link_type=LinkType.CALL),
+                  key=lambda called: called.ctime)
+
+
+def get_last_calculation(node):
+    """The node itself if it is a calculation, otherwise the last calculation called (recursively) by it."""
+    from aiida.orm.calculation.job import JobCalculation
+    if isinstance(node, JobCalculation):
+        return node
+    for called in reversed(get_called(node)):
+        calc = get_last_calculation(called)
+        if calc is not None:
+            return calc
+    return None
+
+
+def hit_walltime(node, options):
+    """Check if the (last) calculation of a failed process was killed at the wall time limit."""
+    if not options or 'max_wallclock_seconds' not in options:
+        return False
+    calc = get_last_calculation(node)
+    if calc is None:
+        return False
+    _, runtime = get_job_times(calc)
+    return runtime is not None and runtime >= WALLTIME_FRACTION * options[
+        'max_wallclock_seconds']
+
+
+def increase_walltime(options, factor=2.0):
+    """Copy of the scheduler options with a longer wall time."""
+    options = copy.deepcopy(options)
+    options['max_wallclock_seconds'] = int(options['max_wallclock_seconds'] *
+                                           factor)
+    return options
+
+
+def get_adoptable(pk):
+    """Successful steps of a failed workchain that a restarted one can adopt, oldest first.
+
+    If the workchain was itself restarted, the steps it adopted (recursively) come first: all steps of
+    the workchain it restarted from except the ones it discarded, then its own successful children.
+
+    :return: list of (label, pk)
+    """
+    from aiida.orm import load_node
+    node = load_node(pk)
+    adoptable = []
+    restarted_from = node.get_extra(RESTART_EXTRA, None)
+    if restarted_from is not None:
+        adoptable = get_adoptable(restarted_from)
+        adoptable = adoptable[:len(adoptable) -
+                              node.get_extra(DISCARDED_EXTRA, 0)]
+    return adoptable + [
+        (called.label, called.pk) for called in get_called(node)
+        if called.label in ADOPTABLE_LABELS and called.has_finished_ok()
+    ]
@@ -0,0 +1,153 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Multiple-histogram reweighting of the number-of-molecules histograms of GCMC runs of one structure
+at different pressures (same temperature) into a continuous isotherm.
+
+The gas phase is treated as ideal, i.e. beta * mu = ln(P) + const. The constant cancels, hence the
+histograms at pressure P_k are p_k(N) ~ Omega(N) * P_k^N and the density of states Omega(N) is
+obtained self-consistently (Ferrenberg and Swendsen, Phys. Rev. Lett. 63, 1195 (1989)).
+Reweighting is only meaningful for pressures whose histograms overlap with the simulated ones.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import numpy as np
+
+HISTOGRAM_RETRIEVE_LIST = [
+    'NumberOfMoleculesHistograms/System_0/*', 'EnergyHistograms/System_0/*'
+]
+
+
+def histogram_parameters(parameters, max_molecules):
+    """Instruct RASPA to write the number-of-molecules and energy histograms once per run."""
+    general_settings = parameters['GeneralSettings']
+    general_settings['ComputeNumberOfMoleculesHistogram'] = 'yes'
+    general_settings['WriteNumberOfMoleculesHistogramEvery'] = general_settings[
+        'NumberOfCycles']
+    general_settings['NumberOfMoleculesHistogramSize'] = max_molecules
+    general_settings['NumberOfMoleculesRange'] = max_molecules
+    general_settings['ComputeEnergyHistogram'] = 'yes'
+    general_settings['WriteEnergyHistogramEvery'] = general_settings[
+        'NumberOfCycles']
+    return parameters
+
+
+def _logsumexp(a, axis=None):
+    a_max = np.max(a, axis=axis, keepdims=True)
+    a_max = np.where(np.isfinite(a_max), a_max, 0)
+    with np.errstate(divide='ignore'):
+        out = np.log(np.sum(np.exp(a - a_max), axis=axis, keepdims=True))
+    out += a_max
+    if axis is None:
+        return out.item()
+    return np.squeeze(out, axis=axis)
+
+
+def histograms_from_results(results):
+    """Collect the number-of-molecules histograms from the results dictionaries of several workchains.
+
+    :param results: list of results dictionaries (output 'results' of the workchains)
+    :return: tuple (pressures, segment_histograms) with an array of pressures and, for every pressure,
+             an array of shape (number of segments, N_max + 1) with the counts of every segment
+    """
+    pressures = []
+    collected = []
+    for result in results:
+        histograms = result.get('number_of_molecules_histograms', {})
+        if not histograms:
+            continue
+        pressures.append(float(result['pressure_pa']))
+        collected.append(list(histograms.values()))
+
+    n_max = max(
+        int(max(h['n'])) for segments in collected for h in segments
+        if h['n'])
+    segment_histograms = []
+    for segments in collected:
+        counts = np.zeros((len(segments), n_max + 1))
+        for i, histogram in enumerate(segments):
+            for n, count in zip(histogram['n'], histogram['counts']):
+                counts[i, int(n)] += count
+        segment_histograms.append(counts)
+    return np.array(pressures), segment_histograms
+
+
+def multiple_histogram_reweighting(pressures,
+                                   histograms,
+                                   tolerance=1e-8,
+                                   max_iterations=100000):
+    """Solve the multiple-histogram equations.
+
+    :param pressures: array of K pressures
+    :param histograms: array of shape (K, N_max + 1) with the counts of N at every pressure
+    :return: array ln Omega(N) (up to a constant), -inf for N that were never sampled
+    """
+    histograms = np.asarray(histograms, dtype=float)
+    ln_p = np.log(np.asarray(pressures, dtype=float))
+    n_values = np.arange(histograms.shape[1])
+    n_samples = histograms.sum(axis=1)
+    with np.errstate(divide='ignore'):
+        ln_counts = np.log(histograms.sum(axis=0))
+        ln_samples = np.log(n_samples)
+
+    # N * ln(P_k), shape (K, N)
+    ln_weights = np.outer(ln_p, n_values)
+    free_energies = np.zeros(len(ln_p))
+    for _ in range(max_iterations):
+        ln_omega = ln_counts - _logsumexp(
+            ln_samples[:, None] + ln_weights - free_energies[:, None], axis=0)
+        new_free_energies = _logsumexp(ln_omega[None, :] + ln_weights, axis=1)
+        new_free_energies -= new_free_energies[0]
+        converged = np.max(np.abs(new_free_energies - free_energies)) < tolerance
+        free_energies = new_free_energies
+        if converged:
+            break
+    return ln_omega
+
+
+def reweighted_loading(ln_omega, pressures):
+    """Average number of molecules at the given pressures from the density of states."""
+    n_values = np.arange(len(ln_omega))
+    ln_p = np.log(np.atleast_1d(np.asarray(pressures, dtype=float)))
+    ln_probability = ln_omega[None, :] + np.outer(ln_p, n_values)
+    ln_probability -= _logsumexp(ln_probability, axis=1)[:, None]
+    return np.exp(ln_probability).dot(n_values)
+
+
+def reweighted_isotherm(pressures,
+                        segment_histograms,
+                        new_pressures,
+                        number_bootstrap=100,
+                        seed=42):
+    """Continuous isotherm with bootstrap errors.
+
+    The segments of every pressure are resampled with replacement to estimate the error.
+
+    :param pressures: array of K simulated pressures
+    :param segment_histograms: list of K arrays of shape (number of segments, N_max + 1)
+    :param new_pressures: pressures at which the loading is computed
+    :return: tuple (loading, loading_dev) in molecules per simulation box
+    """
+    rng = np.random.RandomState(seed)
+    histograms = np.array([h.sum(axis=0) for h in segment_histograms])
+    loading = reweighted_loading(
+        multiple_histogram_reweighting(pressures, histograms), new_pressures)
+
+    bootstrap = []
+    for _ in range(number_bootstrap):
+        resampled = np.array([
+            h[rng.randint(0, len(h), len(h))].sum(axis=0)
+            for h in segment_histograms
+        ])
+        bootstrap.append(
+            reweighted_loading(
+                multiple_histogram_reweighting(pressures, resampled),
+                new_pressures))
+    return loading, np.std(bootstrap, axis=0)
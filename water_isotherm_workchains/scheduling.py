@@ -0,0 +1,97 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Cost estimates for the workchains of a study and longest-processing-time-first (LPT) ordering, such
+that the expensive high-loading points do not form a long tail at the end of the study.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import math
+
+# pressure at which the water loading becomes significant, in Pa
+REFERENCE_PRESSURE = 1000.0
+
+
+def total_cycles(spec, workchain):
+    """Number of RASPA cycles of a workchain, MD steps are counted as cycles."""
+    gcmc_0 = spec['raspa_parameters_gcmc_0']['GeneralSettings']
+    gcmc = spec['raspa_parameters_gcmc']['GeneralSettings']
+    number_runs = spec['number_runs']
+
+    cycles = gcmc_0['NumberOfInitializationCycles'] + gcmc_0['NumberOfCycles']
+    cycles += number_runs * gcmc['NumberOfCycles']
+    if workchain == 'GCMCMD':
+        md = spec['raspa_parameters_md']['GeneralSettings']
+        cycles += number_runs * md['NumberOfCycles']
+    elif workchain == 'GCMCMD2':
+        inputs = spec.get('workchain_inputs', {}).get(workchain, {})
+        cycles += number_runs * (inputs.get('number_cycles_lower', 1) +
+                                 inputs.get('number_cycles_upper', 100000)) / 2
+    return cycles
+
+
+def estimate_cost(cycles, number_atoms, pressure):
+    """Heuristic cost (arbitrary units): the cost of a cycle grows with the size of the framework
+    and with the number of adsorbed molecules, which increases with the pressure."""
+    return cycles * number_atoms * (1 + pressure / REFERENCE_PRESSURE)
+
+
+def calibrate(estimates, runtimes):
+    """Factor to convert heuristic costs into seconds, median over previous runs (None if there are none)."""
+    ratios = sorted(runtimes[key] / estimates[key] for key in runtimes
+                    if key in estimates and estimates[key] > 0)
+    if not ratios:
+        return None
+    return ratios[len(ratios) // 2]
+
+
+def predict_runtimes(estimates, runtimes):
+    """Runtime of every job: measured if it ran before, the closest pressure of the same structure and
+    workchain scaled with the heuristic if available, otherwise the calibrated heuristic.
+
+    :param estimates: dict (workchain, md5, pressure) -> heuristic cost
+    :param runtimes: dict (workchain, md5, pressure) -> runtime in s of previous runs
+    :return: dict (workchain, md5, pressure) -> predicted cost
+    """
+    factor = calibrate(estimates, runtimes)
+    predictions = {}
+    for key, estimate in estimates.items():
+        if key in runtimes:
+            predictions[key] = runtimes[key]
+            continue
+        workchain, md5, pressure = key
+        neighbours = [
+            other for other in runtimes
+            if other[0] == workchain and other[1] == md5 and other in estimates
+        ]
+        if neighbours:
+            closest = min(neighbours,
+                          key=lambda other: abs(
+                              math.log(other[2] / pressure)))
+            predictions[key] = runtimes[closest] * estimate / estimates[closest]
+        elif factor is not None:
+            predictions[key] = factor * estimate
+        else:
+            predictions[key] = estimate
+    return predictions
+
+
+def lpt_order(jobs, costs):
+    """Order jobs by decreasing cost (longest processing time first)."""
+    return sorted(jobs, key=lambda job: costs[job], reverse=True)
+
+
+def makespan(costs, number_workers):
+    """Makespan of a greedy list schedule of costs (in the given order) on number_workers workers."""
+    workers = [0.0] * number_workers
+    for cost in costs:
+        i = workers.index(min(workers))
+        workers[i] += cost
+    return max(workers)
@@ -0,0 +1,58 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Queue-aware length of the GCMC segments: when the queue wait of a segment is long compared to its
+runtime the remaining production cycles are merged into fewer, longer segments, when the queue is
+idle they are split into more, shorter ones.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+from water_isotherm_workchains.walltime import get_job_times
+
+# maximum change of the segment length from one segment to the next
+MAX_CHANGE = 4.0
+
+
+def get_creator(folder):
+    """Calculation that created a retrieved folder, None if there is none."""
+    from aiida.common.links import LinkType
+    creators = folder.get_inputs(link_type=LinkType.CREATE)
+    return creators[0] if creators else None
+
+
+def get_segment_times(folder):
+    """Queue wait and runtime (s) of the calculation that produced the retrieved folder."""
+    calc = get_creator(folder)
+    if calc is None:
+        return None, None
+    return get_job_times(calc)
+
+
+def next_segment_cycles(cycles, cycles_per_second, queue_wait, remaining,
+                        wait_ratio, min_cycles, max_cycles):
+    """Number of cycles of the next segment.
+
+    The segment is sized such that its runtime is wait_ratio times the queue wait of the last one.
+
+    :param cycles: number of cycles of the current segments
+    :param cycles_per_second: speed measured in the last segment, None if unknown
+    :param queue_wait: queue wait of the last segment in s, None if unknown
+    :param remaining: production cycles that are left
+    :return: number of cycles, all remaining cycles if the rest would be shorter than min_cycles
+    """
+    if queue_wait is None or not cycles_per_second:
+        target = cycles
+    else:
+        target = cycles_per_second * wait_ratio * queue_wait
+        target = min(max(target, cycles / MAX_CHANGE), cycles * MAX_CHANGE)
+    target = int(round(min(max(target, min_cycles), max_cycles)))
+    if remaining - target < min_cycles:
+        return remaining
+    return target
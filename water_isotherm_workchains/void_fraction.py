@@ -0,0 +1,198 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Helium void fraction on a grid, as RASPA computes it with Widom insertions of a helium probe: the
+average Boltzmann factor exp(-U/kT) of the probe in the framework at 298 K. The framework atoms are read
+from the CIF, their Lennard-Jones parameters from force_field_mixing_rules.def.
+
+The periodic images within the cutoff of the unit cell are generated explicitly and sorted into a cell
+list, so every grid point only sees the atoms in the neighbouring bins. The grid is split into chunks of
+points of one bin that are evaluated in a process pool. A spacing of 0.5 A is accurate to about 0.005 and
+takes tens of seconds for large cells, the workchains therefore get the void fraction precomputed at
+submission or evaluate it in process.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import itertools
+import math
+
+import numpy as np
+
+from water_isotherm_workchains.cif import read_cif, cell_matrix
+from water_isotherm_workchains.force_field import parse_cached, read_mixing_rules, \
+    pseudo_atom_name, lennard_jones_table, lorentz_berthelot
+
+# helium probe as defined in RASPA (epsilon in K, sigma in A)
+HELIUM_EPSILON = 10.9
+HELIUM_SIGMA = 2.64
+
+CHUNK_SIZE = 512
+
+_GRID = {}
+
+
+def perpendicular_widths(matrix):
+    """Distances between opposite faces of the cell."""
+    matrix = np.asarray(matrix, dtype=float)
+    volume = abs(np.linalg.det(matrix))
+    return np.array([
+        volume / np.linalg.norm(np.cross(matrix[(i + 1) % 3],
+                                         matrix[(i + 2) % 3]))
+        for i in range(3)
+    ])
+
+
+def periodic_images(fract, matrix, cutoff):
+    """Atoms of the cell and all their images within the cutoff of the cell.
+
+    :return: cartesian positions and index of the atom in the cell of every image
+    """
+    fract = np.asarray(fract, dtype=float) % 1.0
+    pad = cutoff / perpendicular_widths(matrix)
+    shifts = np.array(
+        list(
+            itertools.product(
+                *[range(-int(math.ceil(p)),
+                        int(math.ceil(p)) + 1) for p in pad])))
+    images = (fract[None, :, :] + shifts[:, None, :]).reshape(-1, 3)
+    index = np.tile(np.arange(len(fract)), len(shifts))
+    keep = np.all((images >= -pad) & (images < 1 + pad), axis=1)
+    return images[keep].dot(matrix), index[keep]
+
+
+def grid_points(matrix, spacing):
+    """Fractional coordinates of a grid with about the given spacing (A) in the cell."""
+    matrix = np.asarray(matrix, dtype=float)
+    shape = [
+        max(int(math.ceil(np.linalg.norm(vector) / spacing)), 1)
+        for vector in matrix
+    ]
+    axes = [(np.arange(n) + 0.5) / n for n in shape]
+    return np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+
+
+class CellList(object):
+    """Atoms sorted into cubic bins of half the cutoff."""
+
+    def __init__(self, positions, cutoff):
+        self.bin_size = cutoff / 2.0
+        self.origin = positions.min(axis=0)
+        bins = self.bins(positions)
+        self.shape = bins.max(axis=0) + 1
+        ids = np.ravel_multi_index(bins.T, self.shape)
+        self.order = np.argsort(ids, kind='mergesort')
+        self.starts = np.searchsorted(ids[self.order],
+                                      np.arange(np.prod(self.shape) + 1))
+
+    def bins(self, positions):
+        return np.floor(
+            (positions - self.origin) / self.bin_size).astype(int)
+
+    def neighbours(self, bin_index):
+        """Indices of the atoms in the bins within the cutoff of a bin."""
+        ranges = [
+            range(max(i - 2, 0), min(i + 3, n))
+            for i, n in zip(bin_index, self.shape)
+        ]
+        members = [
+            self.order[self.starts[j]:self.starts[j + 1]]
+            for j in (np.ravel_multi_index(b, self.shape)
+                      for b in itertools.product(*ranges))
+        ]
+        return np.concatenate(members) if members else np.zeros(0, int)
+
+
+def _init_worker(positions, epsilon, sigma, cutoff, temperature):
+    _GRID.update(positions=positions,
+                 epsilon4=4.0 * epsilon,
+                 sigma2=sigma * sigma,
+                 cutoff=cutoff,
+                 temperature=temperature)
+
+
+def boltzmann_factors(points, neighbours):
+    """Sum of exp(-U/kT) of the helium probe at the points, truncated Lennard-Jones.
+
+    :param points: cartesian positions of the probe
+    :param neighbours: indices of the atoms within the cutoff of all points
+    """
+    if not len(neighbours):
+        return float(len(points))
+    atoms = _GRID['positions'][neighbours]
+    r2 = (points * points).sum(axis=1)[:, None] + (
+        atoms * atoms).sum(axis=1)[None, :] - 2.0 * points.dot(atoms.T)
+    s6 = _GRID['sigma2'][neighbours] / np.maximum(r2, 1e-4)
+    s6 *= s6 * s6
+    s6 *= s6 - 1.0
+    s6[r2 >= _GRID['cutoff']**2] = 0.0
+    energy = s6.dot(_GRID['epsilon4'][neighbours])
+    return float(
+        np.exp(-np.minimum(energy / _GRID['temperature'], 700.0)).sum())
+
+
+def _evaluate(task):
+    return boltzmann_factors(*task)
+
+
+def helium_void_fraction(cif_path,
+                         force_field_dir,
+                         spacing=0.5,
+                         cutoff=12.0,
+                         temperature=298.0,
+                         processes=None):
+    """Helium void fraction of a framework.
+
+    :param cif_path: path of the (P1) CIF file
+    :param force_field_dir: directory with force_field_mixing_rules.def
+    :param spacing: grid spacing in A
+    :param cutoff: Lennard-Jones cutoff in A
+    :param temperature: in K
+    :param processes: size of the process pool, the number of CPUs by default, 1 runs in process
+    """
+    cif = parse_cached(cif_path, read_cif)
+    matrix = np.array(cell_matrix(cif['cell']))
+    epsilon, sigma = lennard_jones_table(
+        read_mixing_rules(force_field_dir),
+        [pseudo_atom_name(atom['label']) for atom in cif['atoms']])
+    epsilon, sigma = lorentz_berthelot(epsilon, sigma, HELIUM_EPSILON,
+                                       HELIUM_SIGMA)
+
+    positions, index = periodic_images([atom['fract'] for atom in cif['atoms']],
+                                       matrix, cutoff)
+    cell_list = CellList(positions, cutoff)
+
+    points = grid_points(matrix, spacing).dot(matrix)
+    # points outside the box of the images (sparse cells) go to the closest bin, its neighbours still
+    # contain all atoms within the cutoff
+    point_bins = np.clip(cell_list.bins(points), 0, cell_list.shape - 1)
+    point_ids = np.ravel_multi_index(point_bins.T, cell_list.shape)
+    order = np.argsort(point_ids, kind='mergesort')
+    bin_ids, starts = np.unique(point_ids[order], return_index=True)
+    tasks = []
+    for bin_id, members in zip(bin_ids, np.split(order, starts[1:])):
+        neighbours = cell_list.neighbours(
+            np.unravel_index(bin_id, cell_list.shape))
+        for start in range(0, len(members), CHUNK_SIZE):
+            tasks.append(
+                (points[members[start:start + CHUNK_SIZE]], neighbours))
+
+    initargs = (positions, epsilon[index], sigma[index], cutoff, temperature)
+    if processes == 1:
+        _init_worker(*initargs)
+        total = sum(_evaluate(task) for task in tasks)
+    else:
+        from multiprocessing import Pool
+        pool = Pool(processes, initializer=_init_worker, initargs=initargs)
+        try:
+            total = sum(pool.imap_unordered(_evaluate, tasks))
+        finally:
+            pool.close()
+            pool.join()
+    return total / len(points)
@@ -0,0 +1,160 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Wall-clock predictor for RASPA calculations, such that every submission requests a tight
+max_wallclock_seconds instead of the 24 h of the longest stage and short segments can be backfilled.
+
+The model is a least-squares fit of log(runtime) to log(cycles), log(framework atoms in the box),
+log(1 + adsorbed molecules), charges on/off and MD/MC, trained on finished RASPA calculations.
+"""
+from __future__ import division
+
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import copy
+import math
+
+import numpy as np
+
+from water_isotherm_workchains.cif import read_cif
+from water_isotherm_workchains.widom import number_unitcells
+
+NUMBER_FEATURES = 6
+
+
+def features(parameters, number_atoms, number_molecules):
+    """Feature vector of a RASPA run.
+
+    :param parameters: RASPA parameter dictionary
+    :param number_atoms: number of framework atoms in the unit cell
+    :param number_molecules: (expected) number of adsorbed molecules in the box
+    """
+    general_settings = parameters['GeneralSettings']
+    cycles = general_settings.get('NumberOfInitializationCycles',
+                                  0) + general_settings['NumberOfCycles']
+    charges = str(general_settings.get('UseChargesFromCIFFile',
+                                       'no')).lower() == 'yes'
+    md = general_settings.get('SimulationType') == 'MolecularDynamics'
+    return [
+        1.0,
+        math.log(max(cycles, 1)),
+        math.log(max(number_atoms * number_unitcells(parameters), 1)),
+        math.log(1 + max(number_molecules, 0)),
+        float(charges),
+        float(md),
+    ]
+
+
+def get_job_times(calc):
+    """Queue wait and runtime (s) of a finished calculation from the last job info of the scheduler.
+
+    :return: tuple (queue_wait, runtime), entries are None if the scheduler did not report them
+    """
+    try:
+        jobinfo = calc.get_last_jobinfo()
+    except Exception:
+        jobinfo = None
+    if jobinfo is None:
+        return None, None
+
+    runtime = getattr(jobinfo, 'wallclock_time_seconds', None)
+    submission_time = getattr(jobinfo, 'submission_time', None)
+    dispatch_time = getattr(jobinfo, 'dispatch_time', None)
+    queue_wait = None
+    if submission_time is not None and dispatch_time is not None:
+        queue_wait = (dispatch_time - submission_time).total_seconds()
+    return queue_wait, runtime
+
+
+def get_training_data(max_samples=1000):
+    """Features and runtimes of the most recent finished RASPA calculations.
+
+    :return: tuple (X, y) of lists, y is the runtime in s
+    """
+    from aiida.orm import CalculationFactory, DataFactory
+    from aiida.orm.querybuilder import QueryBuilder
+    RaspaCalculation = CalculationFactory('raspa')
+    CifData = DataFactory('cif')
+    ParameterData = DataFactory('parameter')
+
+    qb = QueryBuilder()
+    qb.append(RaspaCalculation, filters={'state': 'FINISHED'}, tag='calc')
+    qb.append(ParameterData,
+              input_of='calc',
+              edge_filters={'label': 'parameters'})
+    qb.append(CifData, input_of='calc')
+    qb.append(ParameterData,
+              output_of='calc',
+              edge_filters={'label': 'component_0'})
+    qb.order_by({'calc': {'ctime': 'desc'}})
+    qb.limit(max_samples)
+
+    number_atoms = {}
+    X = []
+    y = []
+    for calc, parameters, structure, component in qb.iterall():
+        _, runtime = get_job_times(calc)
+        if not runtime:
+            continue
+        md5 = structure.get_attr('md5')
+        if md5 not in number_atoms:
+            number_atoms[md5] = len(
+                read_cif(structure.get_file_abs_path())['atoms'])
+        parameters = parameters.get_dict()
+        number_molecules = component.get_dict().get(
+            'loading_absolute_average', 0) * number_unitcells(parameters)
+        X.append(features(parameters, number_atoms[md5], number_molecules))
+        y.append(runtime)
+    return X, y
+
+
+def fit_walltime_model(X, y, quantile=95):
+    """Fit the log-linear runtime model.
+
+    :return: dict with the 'coefficients' and the 'margin' (quantile of the log residuals),
+             None if there are not enough samples
+    """
+    if len(y) < 2 * NUMBER_FEATURES:
+        return None
+    X = np.array(X)
+    log_y = np.log(np.array(y))
+    # features that do not vary in the training data (e.g. no MD runs yet) keep a zero coefficient
+    used = np.ptp(X, axis=0) > 0
+    used[0] = True
+    coefficients = np.zeros(X.shape[1])
+    coefficients[used] = np.linalg.lstsq(X[:, used], log_y, rcond=None)[0]
+    residuals = log_y - X.dot(coefficients)
+    return {
+        'coefficients': coefficients.tolist(),
+        'margin': max(float(np.percentile(residuals, quantile)), 0.0),
+        'number_samples': len(y),
+    }
+
+
+def predict_walltime(model, feature_vector, safety_factor=1.5, minimum=600):
+    """Runtime (s) to request: the prediction times the residual quantile and the safety factor."""
+    log_runtime = sum(
+        c * x for c, x in zip(model['coefficients'], feature_vector))
+    walltime = math.exp(log_runtime + model['margin']) * safety_factor
+    return max(int(math.ceil(walltime / 60.0)) * 60, minimum)
+
+
+def predicted_options(options, model, feature_vector, safety_factor=1.5):
+    """Copy of the scheduler options with the predicted max_wallclock_seconds.
+
+    The configured max_wallclock_seconds stays an upper bound, the options are returned
+    unchanged if there is no model.
+    """
+    options = copy.deepcopy(options) if options is not None else {}
+    if model is None:
+        return options
+    walltime = predict_walltime(model, feature_vector, safety_factor)
+    if 'max_wallclock_seconds' in options:
+        walltime = min(walltime, options['max_wallclock_seconds'])
+    options['max_wallclock_seconds'] = walltime
+    return options
@@ -0,0 +1,62 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+"""
+Helpers for the Widom insertion stage that computes the Henry coefficient and the
+adsorption enthalpy at infinite dilution before any GCMC is run.
+"""
+__author__ = 'Kevin M. Jablonka'
+__copyright__ = 'MIT License'
+__maintainer__ = 'Kevin M. Jablonka'
+__email__ = 'kevin.jablonka@epfl.ch'
+__version__ = '0.1.0'
+__status__ = 'Dev'
+
+import copy
+
+GAS_CONSTANT = 8.3144626e-3  # kJ/mol/K
+
+MOVE_PROBABILITIES = [
+    'TranslationProbability', 'RotationProbability', 'ReinsertionProbability',
+    'SwapProbability', 'CFCMC_CBMC_SwapProbability', 'CFSwapLambdaProbability'
+]
+
+
+def widom_parameters(parameters, number_cycles):
+    """Turn GCMC parameters into the input of a Widom insertion run."""
+    widom = copy.deepcopy(parameters)
+    general_settings = widom['GeneralSettings']
+    general_settings['NumberOfCycles'] = number_cycles
+    general_settings['NumberOfInitializationCycles'] = 0
+    general_settings['ComputeRDF'] = 'no'
+    general_settings.pop('WriteRDFEvery', None)
+
+    for component in widom['Component']:
+        for move in MOVE_PROBABILITIES:
+            component.pop(move, None)
+        component['WidomProbability'] = 1.0
+        component['CreateNumberOfMolecules'] = 0
+    return widom
+
+
+def number_unitcells(parameters):
+    """Number of unit cells in the simulation box."""
+    unitcells = [
+        int(x)
+        for x in str(parameters['GeneralSettings'].get('UnitCells',
+                                                       '1 1 1')).split()
+    ]
+    number = 1
+    for x in unitcells:
+        number *= x
+    return number
+
+
+def henry_loading(henry_coefficient, pressure,
+                  conversion_factor_molec_uc_to_mol_kg):
+    """Loading in molecules/unit cell predicted from the Henry coefficient (mol/kg/Pa)."""
+    return henry_coefficient * pressure / conversion_factor_molec_uc_to_mol_kg
+
+
+def enthalpy_at_infinite_dilution(adsorption_energy, temperature):
+    """Adsorption enthalpy (kJ/mol) from the Widom adsorption energy <U_gh> - <U_h> (kJ/mol)."""
+    return adsorption_energy - GAS_CONSTANT * temperature